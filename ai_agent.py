@@ -3,30 +3,75 @@ import json
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import re
 import time
+import threading
+import httpx
+import openai
+
+import json_scanner
+import model_router
+import telemetry
+from model_router import ModelTimeoutError
+from retry_policy import CIRCUIT_BREAKER, DEFAULT_POLICY, THROTTLE, CircuitOpenError, error_status, is_retryable, retry_after_seconds
+
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+MODEL_NAME = model_router.DEFAULT_MODEL
+
+HEADERS = {
+    "HTTP-Referer": "http://localhost:5000",
+    "X-Title": "AI Bank Ingestion"
+}
+
+# Size of the keep-alive pool shared by every in-process call.
+MAX_CONNECTIONS = int(os.getenv("AI_AGENT_MAX_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("AI_AGENT_KEEPALIVE_EXPIRY", "60"))
+
+# Finder calls only need a YES/NO, so they are streamed and cut off as soon
+# as a decisive answer appears. Every prompt type has its own token cap.
+FINDER_PROMPT_TYPES = ("find", "find_balance_sheet")
+STREAM_FINDERS = os.getenv("AI_STREAM_FINDERS", "1") == "1"
+MAX_TOKENS = {
+    "find": int(os.getenv("AI_MAX_TOKENS_FIND", "2048")),
+    "find_balance_sheet": int(os.getenv("AI_MAX_TOKENS_FIND_BALANCE_SHEET", "2048")),
+    "extract": int(os.getenv("AI_MAX_TOKENS_EXTRACT", "8192")),
+    "extract_balance_sheet": int(os.getenv("AI_MAX_TOKENS_EXTRACT_BALANCE_SHEET", "8192")),
+    "find_batch": int(os.getenv("AI_MAX_TOKENS_FIND_BATCH", "4096")),
+    "find_balance_sheet_batch": int(os.getenv("AI_MAX_TOKENS_FIND_BALANCE_SHEET_BATCH", "4096")),
+    "find_both": int(os.getenv("AI_MAX_TOKENS_FIND_BOTH", "4096")),
+}
+
+# Which models answer each prompt type, in fallback order, with their
+# concurrency limits and timeouts (see model_router.py).
+ROUTER = model_router.router_from_environment(MAX_TOKENS)
+
+VERDICT_RE = re.compile(r"\b(YES|NO)\b")
+THINK_BLOCK_RE = re.compile(r"<think>.*?(</think>|$)", re.S | re.I)
+
+_shared_client = None
+_shared_client_pid = None
+_shared_client_lock = threading.Lock()
 
 
 FINDER_PROMPT = """
-You are a data-processing agent. You will be given a long string of
-Base64 encoded text.
+You are a data-processing agent. You will be given the plain text of a
+few pages from a bank's annual report.
 Your task is to:
-1.  First, Base64-decode this string back into plain UTF-8 text.
-2.  Second, analyze that decoded text. Does it contain a high-level,
-    summary financial table? This table is usually labeled "Overview",
-    "Financial Highlights", or "Performance".
-3.  Do NOT say YES to the main, multi-page "Consolidated Balance Sheet".
+1.  Analyze that text. Does it contain a high-level, summary financial
+    table? This table is usually labeled "Overview", "Financial
+    Highlights", or "Performance".
+2.  Do NOT say YES to the main, multi-page "Consolidated Balance Sheet".
     Only say YES to the high-level summary.
-4.  Respond with only the word "YES" or "NO".
+3.  Respond with only the word "YES" or "NO".
 """
 
 EXTRACTOR_PROMPT = """
-You are a data-processing agent. You will be given a long string of
-Base64 encoded text.
+You are a data-processing agent. You will be given the plain text of a
+few pages from a bank's annual report.
 Your task is to:
-1.  First, Base64-decode this string back into plain UTF-8 text, replacing
-    any invalid characters.
-2.  Second, find the key financial information in that decoded text.
-3.  Third, respond with ONLY a single, valid JSON object using this
+1.  Find the key financial information in that text.
+2.  Respond with ONLY a single, valid JSON object using this
     exact schema:
 {
   "bank_name": "string (e.g., HDFC Bank)",
@@ -46,29 +91,27 @@ Find the *latest* year's data.
 """
 
 FINDER_BALANCE_SHEET_PROMPT = """
-You are a financial analyst. You will be given a long string of
-Base64 encoded text.
+You are a financial analyst. You will be given the plain text of several
+pages from a bank's annual report.
 Your task is to:
-1.  First, Base64-decode this string back into plain UTF-8 text.
-2.  Second, analyze that decoded text. Does this text contain the *start*
-    of the main, multi-page "CONSOLIDATED BALANCE SHEET"?
-3.  This page will have headers like "ASSETS", "LIABILITIES",
+1.  Analyze that text. Does it contain the *start* of the main,
+    multi-page "CONSOLIDATED BALANCE SHEET"?
+2.  This page will have headers like "ASSETS", "LIABILITIES",
     "Shareholder's Equity", "Cash and cash equivalents", "Loans", etc.
-4.  Respond with only the word "YES" or "NO".
+3.  Respond with only the word "YES" or "NO".
 """
 
 EXTRACTOR_BALANCE_SHEET_PROMPT = """
-You are an expert financial data extraction agent. You will be given a
-long string of Base64 encoded text.
+You are an expert financial data extraction agent. You will be given the
+plain text of several pages from a bank's annual report.
 Your task is to:
-1.  First, Base64-decode this string back into plain UTF-8 text, replacing
-    any invalid characters.
-2.  Second, find the key financial information in that decoded text, which
-    is from a "Consolidated Balance Sheet".
-3.  Third, respond with ONLY a single, valid JSON object using this
+1.  Find the key financial information in that text, which is from a
+    "Consolidated Balance Sheet".
+2.  Respond with ONLY a single, valid JSON object using this
     exact schema. Be extremely detailed.
 
 {
+  "unit": "string (the unit the statement gives its amounts in, e.g. crore, lakh, thousand)",
   "total_assets": "integer",
   "total_liabilities": "integer",
   "total_shareholders_equity": "integer",
@@ -93,52 +136,377 @@ Your task is to:
 
 If a value is not found, use null.
 Find the numbers for the *latest* year (e.g., 2025 or 2024).
-Extract all monetary values as simple integers.
+Extract all monetary values as simple integers, in that unit.
+"""
+
+BATCH_FINDER_PROMPT = """
+You are a data-processing agent. You will be given several windows of
+plain text from a bank's annual report. Each window starts with a header
+line like "=== WINDOW 3 (pages 5-7) ===".
+Your task is to:
+1.  For every window, decide whether it contains {target}
+2.  Respond with ONLY a single, valid JSON object using this exact schema,
+    with one entry per window:
+{{
+  "windows": [
+    {{"window": "integer (the window number)", "verdict": "YES or NO", "score": "float from 0 to 1 (how likely this window is a YES)"}}
+  ]
+}}
 """
 
+BATCH_FINDER_TARGETS = {
+    "find_batch": (
+        'a high-level, summary financial table, usually labeled "Overview",\n'
+        '    "Financial Highlights", or "Performance". Do NOT say YES to the main,\n'
+        '    multi-page "Consolidated Balance Sheet"; only to the high-level summary.'
+    ),
+    "find_balance_sheet_batch": (
+        'the *start* of the main, multi-page "CONSOLIDATED BALANCE SHEET",\n'
+        '    with headers like "ASSETS", "LIABILITIES", "Shareholder\'s Equity",\n'
+        '    "Cash and cash equivalents", "Loans", etc.'
+    ),
+}
 
+# Multi-label finder for the single-pass pipeline: every window is judged
+# for both targets at once, so the document is only walked one time.
+FIND_BOTH_PROMPT = """
+You are a data-processing agent. You will be given one or more windows of
+plain text from a bank's annual report. Each window starts with a header
+line like "=== WINDOW 3 (pages 5-7) ===".
+Your task is to:
+1.  For every window, decide two things independently:
+    - "summary": does it contain a high-level, summary financial table,
+      usually labeled "Overview", "Financial Highlights", or "Performance"?
+      Do NOT say YES here for the main, multi-page "Consolidated Balance
+      Sheet"; only for the high-level summary.
+    - "balance_sheet": does it contain the *start* of the main, multi-page
+      "CONSOLIDATED BALANCE SHEET", with headers like "ASSETS",
+      "LIABILITIES", "Shareholder's Equity", "Cash and cash equivalents",
+      "Loans", etc.?
+2.  Respond with ONLY a single, valid JSON object using this exact schema,
+    with one entry per window:
+{
+  "windows": [
+    {"window": "integer (the window number)",
+     "summary": "YES or NO", "summary_score": "float from 0 to 1",
+     "balance_sheet": "YES or NO", "balance_sheet_score": "float from 0 to 1"}
+  ]
+}
+"""
 
-def get_ai_response(client, headers, text, prompt_type):
-    
+# The JSON each prompt type answers with, mirroring the schemas in the
+# prompts above; json_scanner uses them to pick the answer out of a response
+# and coerce its values.
+BATCH_FINDER_SCHEMA = {"windows": [{"window": "integer", "verdict": "string", "score": "float"}]}
+RESPONSE_SCHEMAS = {
+    "extract": {
+        "bank_name": "string",
+        "report_year": "string",
+        "schema_type": "string",
+        "data": {
+            "balance_sheet_size_cr": "integer",
+            "profit_after_tax_cr": "integer",
+            "deposits_cr": "integer",
+            "advances_cr": "integer",
+            "return_on_equity_percent": "float",
+            "dividend_per_share_inr": "float",
+        },
+    },
+    "extract_balance_sheet": {
+        "unit": "string",
+        "total_assets": "integer",
+        "total_liabilities": "integer",
+        "total_shareholders_equity": "integer",
+        "asset_breakdown": {
+            "cash_and_cash_equivalents": "integer",
+            "loans_receivable": "integer",
+            "investments": "integer",
+            "property_plant_equipment": "integer",
+            "other_assets": "integer",
+        },
+        "liability_breakdown": {
+            "deposits": "integer",
+            "borrowings": "integer",
+            "other_liabilities": "integer",
+        },
+        "equity_breakdown": {
+            "equity_share_capital": "integer",
+            "reserves_and_surplus": "integer",
+            "other_equity": "integer",
+        },
+    },
+    "find_batch": BATCH_FINDER_SCHEMA,
+    "find_balance_sheet_batch": BATCH_FINDER_SCHEMA,
+    "find_both": {"windows": [{
+        "window": "integer",
+        "summary": "string", "summary_score": "float",
+        "balance_sheet": "string", "balance_sheet_score": "float",
+    }]},
+}
+
+# Appended to every prompt when the opt-in "base64" transport is used.
+BASE64_NOTE = """
+Note: the text is delivered as one long Base64 encoded string. First,
+Base64-decode it back into plain UTF-8 text, replacing any invalid
+characters, and apply the instructions above to the decoded text.
+"""
+
+TRANSPORTS = ("text", "base64")
+
+
+def system_prompt_for(prompt_type, transport="text"):
+    """Returns the system prompt for a prompt type, or None if unknown."""
     if prompt_type == "find": system_prompt = FINDER_PROMPT
     elif prompt_type == "extract": system_prompt = EXTRACTOR_PROMPT
     elif prompt_type == "find_balance_sheet": system_prompt = FINDER_BALANCE_SHEET_PROMPT
     elif prompt_type == "extract_balance_sheet": system_prompt = EXTRACTOR_BALANCE_SHEET_PROMPT
-    else: return '{"error": "Invalid prompt type"}'
-
-    MAX_RETRIES = 3
-    for attempt in range(MAX_RETRIES):
-        try:
-            completion = client.chat.completions.create(
-                extra_headers=headers,
-                model="tngtech/deepseek-r1t2-chimera:free",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text} 
-                ]
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"  [AI Agent] Call failed (Attempt {attempt + 1}/{MAX_RETRIES}): {e}", file=sys.stderr)
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(2)
+    elif prompt_type in BATCH_FINDER_TARGETS: system_prompt = BATCH_FINDER_PROMPT.format(target=BATCH_FINDER_TARGETS[prompt_type])
+    elif prompt_type == "find_both": system_prompt = FIND_BOTH_PROMPT
+    else: return None
+
+    if transport == "base64":
+        return system_prompt + BASE64_NOTE
+    return system_prompt
+
+def build_messages(text, prompt_type, transport="text"):
+    """
+    Builds the chat messages for a call, or returns None for an unknown
+    prompt type or transport. `text` must already be encoded for the
+    transport (Base64 for "base64", plain text otherwise).
+    """
+    if transport not in TRANSPORTS: return None
+    system_prompt = system_prompt_for(prompt_type, transport)
+    if system_prompt is None: return None
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+def find_verdict(answer, final=False):
+    """
+    Returns "YES" or "NO" once the answer, ignoring any <think> reasoning,
+    contains one as a complete word; otherwise None. Until `final`, a word
+    at the very end is not trusted yet, as the next token may extend it.
+    """
+    visible = THINK_BLOCK_RE.sub("", answer).upper()
+    for match in VERDICT_RE.finditer(visible):
+        if final or match.end() < len(visible):
+            return match.group(1)
+    return None
+
+def stream_finder_response(client, headers, messages, prompt_type, model, timeout):
+    """
+    Streams a finder completion and stops reading as soon as a decisive
+    YES or NO appears in the answer, returning just that word. Raises
+    ModelTimeoutError if the model is still going after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    stream = client.chat.completions.create(
+        extra_headers=headers,
+        model=model,
+        messages=messages,
+        max_tokens=MAX_TOKENS.get(prompt_type),
+        stream=True,
+        timeout=timeout
+    )
+    answer = ""
+    try:
+        for chunk in stream:
+            if time.monotonic() > deadline:
+                raise ModelTimeoutError(f"{model} took longer than {timeout:g}s")
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            answer += content
+            verdict = find_verdict(answer)
+            if verdict:
+                return verdict
+    finally:
+        stream.close()
+        # The stream is cut short, so there is no usage block to read.
+        telemetry.annotate(output_tokens=telemetry.estimate_tokens(answer))
+    return find_verdict(answer, final=True) or answer
+
+def usable_answer(response, prompt_type):
+    """
+    Whether a response is in the form its prompt type asks for: a YES/NO
+    for the single-window finders, JSON fitting the schema otherwise. An
+    empty answer is never usable.
+    """
+    if not response or not response.strip():
+        return False
+    if prompt_type in FINDER_PROMPT_TYPES:
+        return find_verdict(response, final=True) is not None
+    try:
+        json_scanner.parse_response(response, RESPONSE_SCHEMAS.get(prompt_type))
+    except json_scanner.ResponseParseError:
+        return False
+    return True
+
+def call_model(client, headers, messages, prompt_type, transport, stream, model, fallback=None):
+    """
+    Sends the messages to one model, retrying as retry_policy.py says.
+    `fallback` is the model tried next if this one fails; while there is
+    one, a timeout or a fatal error gives up on this model straight away.
+    Returns (response, outcome), outcome being one of
+    model_router.OUTCOMES, or "circuit_open" when no model should be tried.
+    """
+    timeout = ROUTER.timeout_for(model)
+    with telemetry.span("llm_call", kind="llm_call", prompt_type=prompt_type, model=model,
+                        transport=transport, streamed=bool(stream)) as call_span:
+        call_span.set(input_tokens=sum(telemetry.estimate_tokens(message["content"]) for message in messages))
+        max_attempts = DEFAULT_POLICY.max_attempts
+        for attempt in range(max_attempts):
+            call_span.set(retries=attempt)
+            try:
+                CIRCUIT_BREAKER.before_call()
+            except CircuitOpenError as e:
+                print(f"  [AI Agent] {e}; not calling the API.", file=sys.stderr)
+                call_span.set(error=str(e), outcome="circuit_open")
+                return f'{{"error": "AI API call failed", "details": "{str(e)}"}}', "circuit_open"
+
+            wait_started = time.perf_counter()
+            with ROUTER.slot(model):
+                call_span.set(slot_wait_ms=round((time.perf_counter() - wait_started) * 1000, 3))
+                booked_at = THROTTLE.wait()
+                started = time.perf_counter()
+                try:
+                    if stream:
+                        response = stream_finder_response(client, headers, messages, prompt_type, model, timeout)
+                    else:
+                        completion = client.chat.completions.create(
+                            extra_headers=headers,
+                            model=model,
+                            messages=messages,
+                            max_tokens=MAX_TOKENS.get(prompt_type),
+                            timeout=timeout
+                        )
+                        if completion.usage:
+                            call_span.set(input_tokens=completion.usage.prompt_tokens, output_tokens=completion.usage.completion_tokens)
+                        # None when the model sent only reasoning or nothing at all.
+                        response = completion.choices[0].message.content or ""
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+            seconds = time.perf_counter() - started
+
+            if error is None:
+                CIRCUIT_BREAKER.record_success()
+                THROTTLE.on_success()
+                outcome = "ok" if usable_answer(response, prompt_type) else "unusable"
+                ROUTER.record(model, prompt_type, outcome, seconds, fell_back=bool(fallback) and outcome != "ok")
+                call_span.set(outcome=outcome)
+                return response, outcome
+
+            timed_out = isinstance(error, (ModelTimeoutError, openai.APITimeoutError))
+            retryable = timed_out or is_retryable(error)
+            retry_after = retry_after_seconds(error)
+            throttled = error_status(error) == 429
+            if throttled or (timed_out and fallback):
+                # The provider is up but at capacity, or this model is just
+                # slow: slow every caller down or move on to the next model,
+                # rather than counting it towards opening the circuit.
+                if throttled:
+                    THROTTLE.on_throttled(retry_after, booked_at)
+                CIRCUIT_BREAKER.record_success()
+            elif retryable:
+                CIRCUIT_BREAKER.record_failure()
             else:
-                return f'{{"error": "AI API call failed", "details": "{str(e)}"}}'
+                # The API answered (a bad request, say), so it is up.
+                CIRCUIT_BREAKER.record_success()
 
-def main():
+            if not retryable or attempt == max_attempts - 1 or (timed_out and fallback):
+                kind = "timeout" if timed_out else "retryable" if retryable else "fatal"
+                print(f"  [AI Agent] {model} call failed ({kind}, attempt {attempt + 1}/{max_attempts}): {error}", file=sys.stderr)
+                outcome = "timeout" if timed_out else "error"
+                ROUTER.record(model, prompt_type, outcome, fell_back=bool(fallback))
+                call_span.set(error=str(error), outcome=outcome)
+                return f'{{"error": "AI API call failed", "details": "{str(error)}"}}', outcome
+
+            delay = DEFAULT_POLICY.backoff(attempt, retry_after, throttled)
+            print(f"  [AI Agent] {model} call failed (attempt {attempt + 1}/{max_attempts}), retrying in {delay:.1f}s: {error}", file=sys.stderr)
+            if delay:
+                time.sleep(delay)
+
+def get_ai_response(client, headers, text, prompt_type, transport="text", stream=None):
+    """
+    Sends the text to the models routed for the prompt type (see
+    model_router.py), moving on to the next one while a model fails, times
+    out or answers in a form the prompt type cannot use. Returns the first
+    usable response, else the last model's response or error.
+    """
+    messages = build_messages(text, prompt_type, transport)
+    if messages is None: return '{"error": "Invalid prompt type or transport"}'
+
+    if stream is None:
+        stream = STREAM_FINDERS and prompt_type in FINDER_PROMPT_TYPES
+
+    models = ROUTER.models_for(prompt_type)
+    for position, model in enumerate(models):
+        fallback = models[position + 1] if position + 1 < len(models) else None
+        response, outcome = call_model(client, headers, messages, prompt_type, transport, stream, model, fallback)
+        if outcome in ("ok", "circuit_open") or not fallback:
+            return response
+        print(f"  [AI Agent] {model} gave no usable answer ({outcome}), falling back to {fallback}.", file=sys.stderr)
+
+def create_client():
+    """
+    Builds an OpenRouter client from the environment (.env is loaded here).
+    Raises RuntimeError if no API key is configured.
+    """
     load_dotenv()
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
-        print('{"error": "OPENROUTER_API_KEY not found"}')
-        return
+        raise RuntimeError("OPENROUTER_API_KEY not found")
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+    )
+    base_url = os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL)
+    # Retries are handled by get_ai_response (see retry_policy.py), not the SDK.
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
 
-    headers_to_send = {
-        "HTTP-Referer": "http://localhost:5000",
-        "X-Title": "AI Bank Ingestion"
-    }
+def get_shared_client():
+    """
+    Returns the process-wide client, creating it on first use. The client
+    (and its keep-alive connection pool) is reused by every call and every
+    upload handled by this process. A forked child builds its own.
+    """
+    global _shared_client, _shared_client_pid
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != os.getpid():
+            _shared_client = create_client()
+            _shared_client_pid = os.getpid()
+        return _shared_client
 
+def ask_agent(text, mode, transport="text"):
+    """
+    In-process equivalent of `python ai_agent.py <mode> <transport>`: sends
+    the text to the model using the shared client and returns the raw
+    response string.
+    """
     try:
-        client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
+        client = get_shared_client()
+    except RuntimeError as e:
+        return f'{{"error": "{str(e)}"}}'
+    except Exception as e:
+        return f'{{"error": "Failed to create AI client", "details": "{str(e)}"}}'
+
+    return get_ai_response(client, HEADERS, text, mode, transport)
+
+def main():
+    try:
+        client = create_client()
+    except RuntimeError as e:
+        print(f'{{"error": "{str(e)}"}}')
+        return
     except Exception as e:
         print(f'{{"error": "Failed to create AI client", "details": "{str(e)}"}}')
         return
@@ -149,12 +517,14 @@ def main():
         print('{"error": "No mode provided"}')
         return
 
-    base64_input = sys.stdin.read()
-    if not base64_input:
-        print('{"error": "No Base64 text provided via stdin"}')
+    transport = sys.argv[2] if len(sys.argv) > 2 else "text"
+
+    agent_input = sys.stdin.read()
+    if not agent_input:
+        print('{"error": "No text provided via stdin"}')
         return
         
-    response = get_ai_response(client, headers_to_send, base64_input, mode)
+    response = get_ai_response(client, HEADERS, agent_input, mode, transport)
     
     print(response)
 
@@ -0,0 +1,229 @@
+"""
+The `bank_year_metrics` collection: one row per bank and report year with
+the figures analysts compare across banks, kept up to date as reports are
+saved. Rankings, filters and time series are answered from this small,
+indexed collection instead of scanning the raw reports.
+
+    python analytics.py --rebuild    # backfill from the stored reports
+"""
+import argparse
+import re
+import time
+
+import pandas as pd
+from pymongo import ReplaceOne
+
+import db
+import validation
+
+SUMMARY_METRICS = validation.SUMMARY_FIELDS
+BALANCE_SHEET_METRICS = validation.BALANCE_SHEET_TOTALS
+METRICS = SUMMARY_METRICS + BALANCE_SHEET_METRICS
+ROW_FIELDS = ("bank_key", "bank_name", "report_year", "year_start") + METRICS
+REPORT_PROJECTION = {"bank_key": 1, "bank_name": 1, "report_year": 1, "data": 1, "balance_sheet": 1}
+REBUILD_BATCH_SIZE = 5000
+
+YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+
+
+def get_collection():
+    return db.get_analytics_collection(METRICS)
+
+
+def year_start(report_year):
+    """The first calendar year of a report year: 2024 for "2024-25"."""
+    match = YEAR_RE.search(str(report_year or ""))
+    return int(match.group()) if match else None
+
+
+def metric_rows(reports):
+    """
+    The rows for a batch of reports, with values normalized to crore as in
+    validation.py. Reports without a bank key or report year are skipped,
+    and balance sheets mixing units leave their metrics empty.
+    """
+    reports = [report for report in reports if report.get("bank_key") and report.get("report_year")]
+    if not reports:
+        return []
+    summary_values, _ = validation.validate_summaries([validation.summary_data(report) for report in reports])
+    balance_sheet_values, balance_sheet_failures = validation.validate_balance_sheets(
+        [validation.balance_sheet_data(report) for report in reports]
+    )
+    # Amounts in a mix of units cannot be compared with other banks'.
+    balance_sheet_values = balance_sheet_values.mask(balance_sheet_failures["balance_sheet.mixed_units"], axis=0)
+    values = pd.concat(
+        [summary_values[list(SUMMARY_METRICS)], balance_sheet_values[list(BALANCE_SHEET_METRICS)]], axis=1
+    )
+
+    updated_at = time.time()
+    rows = []
+    for report, metrics in zip(reports, values.to_dict("records")):
+        row = {
+            "_id": f"{report['bank_key']}:{report['report_year']}",
+            "bank_key": report["bank_key"],
+            "bank_name": report.get("bank_name"),
+            "report_year": report["report_year"],
+            "year_start": year_start(report["report_year"]),
+            "report_id": report["_id"],
+            "updated_at": updated_at,
+        }
+        row.update({metric: validation.stored_value(None, value) for metric, value in metrics.items()})
+        rows.append(row)
+    return rows
+
+
+def refresh_report(report_id, reports=None):
+    """
+    Re-derives the row of one report after it was saved. The latest saved
+    report for a bank and year wins. Failures are only logged: the report
+    itself has been saved.
+    """
+    try:
+        reports = reports if reports is not None else db.get_reports_collection()
+        report = reports.find_one({"_id": report_id}, REPORT_PROJECTION)
+        rows = metric_rows([report]) if report else []
+        collection = get_collection()
+        for row in rows:
+            collection.replace_one({"_id": row["_id"]}, row, upsert=True)
+        # A corrected report may have moved to another bank or year.
+        collection.delete_many({"report_id": report_id, "_id": {"$nin": [row["_id"] for row in rows]}})
+    except Exception as e:
+        print(f"  [Analytics] Could not update metrics for report {report_id}: {e}")
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """Recomputes every row from the stored reports. Returns the number of rows written."""
+    started = time.time()
+    collection = get_collection()
+    cursor = db.get_reports_collection().find({}, REPORT_PROJECTION).sort("_id", 1).batch_size(batch_size)
+    written = 0
+    batch = []
+    for report in cursor:
+        batch.append(report)
+        if len(batch) >= batch_size:
+            written += write_rows(collection, metric_rows(batch))
+            batch.clear()
+    written += write_rows(collection, metric_rows(batch))
+    collection.delete_many({"updated_at": {"$lt": started}})
+    return written
+
+
+def write_rows(collection, rows):
+    # Within a batch, a later report for the same bank and year replaces an earlier one.
+    latest = {row["_id"]: row for row in rows}
+    if latest:
+        collection.bulk_write([ReplaceOne({"_id": key}, row, upsert=True) for key, row in latest.items()], ordered=False)
+    return len(latest)
+
+
+def public_row(row, metrics=None):
+    """A row as the API returns it."""
+    result = {field: row.get(field) for field in ("bank_key", "bank_name", "report_year", "year_start")}
+    for metric in metrics or METRICS:
+        result[metric] = row.get(metric)
+    result["report_id"] = str(row["report_id"]) if row.get("report_id") is not None else None
+    return result
+
+
+def latest_year(metric):
+    """The most recent report year with a value for `metric`, or None."""
+    row = get_collection().find_one(
+        {metric: {"$ne": None}}, {"report_year": 1}, sort=[("year_start", -1), ("report_year", -1)]
+    )
+    return row["report_year"] if row else None
+
+
+def rank(metric, report_year=None, bank_keys=None, limit=10, ascending=False):
+    """
+    Banks ranked by `metric` in one report year (the latest by default).
+    Returns (report_year, rows), each row with its 1-based `rank`.
+    """
+    report_year = report_year or latest_year(metric)
+    if report_year is None:
+        return None, []
+    mongo_filter = {"report_year": report_year, metric: {"$ne": None}}
+    if bank_keys:
+        mongo_filter["bank_key"] = {"$in": list(bank_keys)}
+    cursor = (get_collection()
+              .find(mongo_filter)
+              .sort([(metric, 1 if ascending else -1), ("bank_key", 1)])
+              .limit(limit))
+    rows = []
+    for position, row in enumerate(cursor, 1):
+        result = public_row(row, [metric])
+        result["rank"] = position
+        rows.append(result)
+    return report_year, rows
+
+
+def time_series(metrics, bank_keys=None, from_year=None, to_year=None):
+    """
+    `metrics` per report year for each bank, oldest first:
+    {bank_key: {"bank_name": ..., "points": [{"report_year": ..., metric: ...}]}}.
+    """
+    mongo_filter = {}
+    if bank_keys:
+        mongo_filter["bank_key"] = {"$in": list(bank_keys)}
+    year_range = {}
+    if from_year is not None:
+        year_range["$gte"] = from_year
+    if to_year is not None:
+        year_range["$lte"] = to_year
+    if year_range:
+        mongo_filter["year_start"] = year_range
+
+    projection = {field: 1 for field in ("bank_key", "bank_name", "report_year", "year_start", *metrics)}
+    series = {}
+    for row in get_collection().find(mongo_filter, projection).sort([("bank_key", 1), ("year_start", 1)]):
+        bank = series.setdefault(row["bank_key"], {"bank_name": row.get("bank_name"), "points": []})
+        point = {"report_year": row["report_year"], "year_start": row.get("year_start")}
+        point.update({metric: row.get(metric) for metric in metrics})
+        bank["points"].append(point)
+    return series
+
+
+def query(bank_keys=None, report_years=None, ranges=None, metrics=None, sort=None, ascending=False,
+          limit=100, offset=0):
+    """
+    Rows filtered by bank, report year and metric ranges ({metric: (min,
+    max)}, either end None for open), sorted by a metric. Returns (total, rows).
+    """
+    mongo_filter = {}
+    if bank_keys:
+        mongo_filter["bank_key"] = {"$in": list(bank_keys)}
+    if report_years:
+        mongo_filter["report_year"] = {"$in": list(report_years)}
+    for metric, (low, high) in (ranges or {}).items():
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds["$lte"] = high
+        if bounds:
+            mongo_filter[metric] = bounds
+
+    collection = get_collection()
+    total = collection.count_documents(mongo_filter)
+    order = [("bank_key", 1), ("year_start", -1)]
+    if sort:
+        order.insert(0, (sort, 1 if ascending else -1))
+    cursor = collection.find(mongo_filter).sort(order).skip(offset).limit(limit)
+    return total, [public_row(row, metrics) for row in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the bank/year metrics collection")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every row from the stored reports")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        started = time.perf_counter()
+        written = rebuild(args.batch_size)
+        print(f"[Analytics] Rebuilt {written} bank/year row(s) in {time.perf_counter() - started:.2f}s.")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 import json
-from flask import Flask, request, render_template_string, redirect, url_for, flash, session
+from flask import Flask, Request, request, render_template_string, redirect, url_for, flash, session, jsonify, Response, stream_with_context, stream_template_string
+from werkzeug.serving import is_running_from_reloader
 from werkzeug.utils import secure_filename
 import pymongo
 from bson import json_util
@@ -8,12 +9,27 @@ from bson import json_util
 
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 
-from ingest_processor import process_file
+import analytics
+import db
+import job_queue
+import telemetry
+import upload_store
+import validation
+from bank_names import normalize_bank_name
 
 print("--- Checkpoint 1: All imports successful. ---")
 
+
+class UploadRequest(Request):
+    """Streams uploaded files straight into the upload store, hashing them as they arrive."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.HashingUpload(UPLOAD_FOLDER)
+
+
 try:
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config['SECRET_KEY'] = 'a-very-secret-random-string-12345'
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'txt', 'pdf'}
@@ -26,6 +42,9 @@ except Exception as e:
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
     print("--- Checkpoint 3: 'uploads' folder checked/created. ---")
+upload_store.remove_stale_uploads(UPLOAD_FOLDER)
+
+job_queue.init_db()
 
 try:
     login_manager = LoginManager()
@@ -162,6 +181,10 @@ HTML_REVIEW_TEMPLATE = """
   .container { max-width: 1200px; margin: 0 auto; background: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
   .navbar { text-align: right; margin-bottom: 20px; }
   .navbar a { text-decoration: none; color: #007bff; margin-left: 15px; }
+  .filters { margin-bottom: 20px; }
+  .filters input[type="text"] { padding: 6px; border: 1px solid #ccc; border-radius: 4px; }
+  .pager { margin: 20px 0; }
+  .pager a { text-decoration: none; color: #007bff; margin-right: 15px; }
   pre { background-color: #eee; padding: 10px; border-radius: 4px; white-space: pre-wrap; word-wrap: break-word; border: 1px solid #ccc; }
   .bank-section { margin-bottom: 30px; }
 </style>
@@ -174,24 +197,35 @@ HTML_REVIEW_TEMPLATE = """
   </div>
 
   <h1>Review Ingested Data</h1>
-  
-  {% if all_bank_data %}
-    {% for bank in all_bank_data %}
+
+  <form class="filters" method=get>
+    <input type="text" name="bank" placeholder="Bank" value="{{ query.bank }}">
+    <input type="text" name="year" placeholder="Report year (e.g. 2024-25)" value="{{ query.year }}">
+    <input type="submit" value="Filter">
+  </form>
+
+  <p>{{ total }} document(s). Page {{ query.page }} of {{ page_count }}.</p>
+
+  {% for bank_name, doc in documents %}
+    {% if loop.changed(bank_name) %}
+      {% if not loop.first %}</div>{% endif %}
       <div class="bank-section">
-        <h2>Bank: {{ bank.name }}</h2>
-        {% if bank.documents %}
-          {% for doc in bank.documents %}
-            <pre>{{ doc }}</pre>
-          {% endfor %}
-        {% else %}
-          <p>No documents found for this bank.</p>
-        {% endif %}
-      </div>
-    {% endfor %}
+        <h2>Bank: {{ bank_name }}</h2>
+    {% endif %}
+        <pre>{{ doc }}</pre>
+    {% if loop.last %}</div>{% endif %}
   {% else %}
     <p>No data found in the 'bank_data' database.</p>
-  {% endif %}
-  
+  {% endfor %}
+
+  <div class="pager">
+    {% if query.page > 1 %}
+      <a href="{{ url_for('review', page=query.page - 1, per_page=query.per_page, bank=query.bank, year=query.year) }}">&laquo; Previous</a>
+    {% endif %}
+    {% if query.page < page_count %}
+      <a href="{{ url_for('review', page=query.page + 1, per_page=query.per_page, bank=query.bank, year=query.year) }}">Next &raquo;</a>
+    {% endif %}
+  </div>
 </div>
 """
 print("--- Checkpoint 8: HTML templates defined. ---")
@@ -200,6 +234,29 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def store_upload(file, filename):
+    """Moves an upload into the content-addressed store. Returns (content_hash, path)."""
+    extension = filename.rsplit('.', 1)[1].lower()
+    if isinstance(file.stream, upload_store.HashingUpload):
+        return file.stream.commit(extension)
+    # Small or non-multipart bodies may not go through UploadRequest.
+    return upload_store.save_stream(file.stream, UPLOAD_FOLDER, extension)
+
+def discard_upload(file):
+    if isinstance(file.stream, upload_store.HashingUpload):
+        file.stream.discard()
+
+def find_processed_report(content_hash):
+    """The stored report ingested from exactly this file, if any."""
+    try:
+        db.check_health(timeout=5)
+        return db.get_reports_collection().find_one(
+            {"content_hashes": content_hash}, {"bank_name": 1, "report_year": 1}
+        )
+    except Exception as e:
+        print(f"[Upload] Could not check for an existing report: {e}")
+        return None
+
 @app.route('/', methods=['GET', 'POST'])
 def home():
     if request.method == 'POST':
@@ -210,24 +267,32 @@ def home():
         file = request.files['file']
         
         if file.filename == '':
+            discard_upload(file)
             flash('No selected file', 'error')
             return redirect(request.url)
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             
             try:
-                file.save(file_path)
-                print(f"File saved successfully: {file_path}")
-                
-                print("Calling ingest_processor...")
-                success = process_file(file_path)
-                
-                if success:
-                    flash(f"File '{filename}' processed successfully!", 'success')
+                content_hash, file_path = store_upload(file, filename)
+                print(f"File saved successfully: {file_path} (sha256 {content_hash[:12]})")
+
+                existing = find_processed_report(content_hash)
+                if existing:
+                    flash(f"File '{filename}' has already been processed "
+                          f"({existing.get('bank_name')} {existing.get('report_year') or ''}). "
+                          f"See {url_for('review', bank=existing.get('bank_name'), year=existing.get('report_year'))}",
+                          'success')
+                    return redirect(request.url)
+
+                job_id, created = job_queue.enqueue_unique_job(file_path, filename, content_hash)
+                if created:
+                    flash(f"File '{filename}' queued for processing. Job ID: {job_id} "
+                          f"(status: {url_for('job_status', job_id=job_id)})", 'success')
                 else:
-                    flash(f"Error processing file '{filename}'. Check terminal.", 'error')
+                    flash(f"File '{filename}' is already being processed. Job ID: {job_id} "
+                          f"(status: {url_for('job_status', job_id=job_id)})", 'success')
 
             except Exception as e:
                 flash(f"An unexpected error occurred: {e}", 'error')
@@ -235,6 +300,7 @@ def home():
             return redirect(request.url)
             
         else:
+            discard_upload(file)
             flash('Invalid file type. Only .txt and .pdf allowed.', 'error')
             return redirect(request.url)
 
@@ -269,42 +335,194 @@ def logout():
     return redirect(url_for('home'))
 
 
+REVIEW_PER_PAGE = 20
+REVIEW_MAX_PER_PAGE = 100
+REVIEW_DEFAULT_FIELDS = ["bank_name", "report_year", "schema_type", "data", "balance_sheet"]
+
+def review_query():
+    """Reads the /review paging, filter and projection arguments."""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = request.args.get('per_page', REVIEW_PER_PAGE, type=int)
+    per_page = min(max(1, per_page), REVIEW_MAX_PER_PAGE)
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    return {
+        "page": page,
+        "per_page": per_page,
+        "bank": request.args.get('bank', '').strip(),
+        "year": request.args.get('year', '').strip(),
+        "fields": fields or REVIEW_DEFAULT_FIELDS,
+        "format": request.args.get('format', 'html'),
+    }
+
+def review_filter(query):
+    """Builds the Mongo filter for /review, served by the reports indexes."""
+    mongo_filter = {}
+    if query["bank"]:
+        mongo_filter["bank_key"] = normalize_bank_name(query["bank"])[0]
+    if query["year"]:
+        mongo_filter["report_year"] = query["year"]
+    return mongo_filter
+
+def iter_review_documents(reports, mongo_filter, query):
+    """Yields (bank_name, document) lazily for one page of reports."""
+    projection = {field: 1 for field in query["fields"]}
+    projection["bank_name"] = 1
+    cursor = (reports
+              .find(mongo_filter, projection)
+              .sort([("bank_key", pymongo.ASCENDING), ("report_year", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+              .skip((query["page"] - 1) * query["per_page"])
+              .limit(query["per_page"]))
+    for doc in cursor:
+        yield doc.get("bank_name"), validation.upgrade_legacy_layout(doc)
+
+def stream_review_json(documents, total, query):
+    meta = {"page": query["page"], "per_page": query["per_page"], "total": total}
+    yield '{"meta": ' + json.dumps(meta) + ', "documents": ['
+    for i, (bank_name, doc) in enumerate(documents):
+        yield (", " if i else "") + json.dumps(doc, default=json_util.default)
+    yield ']}'
+
 @app.route('/review')
 @login_required
 def review():
-    all_bank_data = []
+    query = review_query()
+    documents = iter(())
+    total = 0
     try:
-        db_client = pymongo.MongoClient("mongodb://localhost:27018/", serverSelectionTimeoutMS=5000)
-        db_client.server_info()
-        db = db_client["bank_data"]
-        
-        collection_names = db.list_collection_names()
-        
-        if "sheets" in collection_names:
-            collection_names.remove("sheets") 
-            
-        for bank_name in collection_names:
-            bank = {"name": bank_name, "documents": []}
-            collection = db[bank_name]
-            for doc in collection.find():
-                bank["documents"].append(json.dumps(doc, indent=2, default=json_util.default))
-            all_bank_data.append(bank)
-            
-        db_client.close()
-        
-    except pymongo.errors.ServerSelectionTimeoutError:
+        db.check_health(timeout=5)
+        reports = db.get_reports_collection()
+        mongo_filter = review_filter(query)
+        total = reports.count_documents(mongo_filter)
+        documents = iter_review_documents(reports, mongo_filter, query)
+    except (pymongo.errors.ServerSelectionTimeoutError, pymongo.errors.NetworkTimeout):
         flash("Error: Could not connect to MongoDB. Is it running?", 'error')
     except Exception as e:
         flash(f"An error occurred: {e}", 'error')
 
-    return render_template_string(HTML_REVIEW_TEMPLATE, all_bank_data=all_bank_data)
+    if query["format"] == "json":
+        return Response(stream_with_context(stream_review_json(documents, total, query)),
+                        mimetype='application/json')
+
+    rendered_documents = (
+        (bank_name, json.dumps(doc, indent=2, default=json_util.default))
+        for bank_name, doc in documents
+    )
+    page_count = max(1, -(-total // query["per_page"]))
+    return Response(stream_template_string(
+        HTML_REVIEW_TEMPLATE, documents=rendered_documents, total=total, page_count=page_count, query=query
+    ))
+
+ANALYTICS_DEFAULT_LIMIT = 100
+ANALYTICS_MAX_LIMIT = 1000
+
+def csv_arg(name):
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+def bank_keys_arg():
+    return [normalize_bank_name(bank)[0] for bank in csv_arg('bank')]
+
+def metrics_arg(name, default=None):
+    """Reads a comma-separated list of analytics metrics; raises ValueError for unknown ones."""
+    metrics = csv_arg(name) or list(default or [])
+    unknown = [metric for metric in metrics if metric not in analytics.METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}. Available: {', '.join(analytics.METRICS)}")
+    if not metrics:
+        raise ValueError(f"'{name}' is required. Available: {', '.join(analytics.METRICS)}")
+    return metrics
+
+def limit_arg(default=ANALYTICS_DEFAULT_LIMIT):
+    return min(max(1, request.args.get('limit', default, type=int)), ANALYTICS_MAX_LIMIT)
+
+def analytics_response(build):
+    """Runs an analytics query: bad arguments give a 400, an unreachable MongoDB a 503."""
+    try:
+        db.check_health(timeout=5)
+        return jsonify(build())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except (pymongo.errors.ServerSelectionTimeoutError, pymongo.errors.NetworkTimeout):
+        return jsonify({"error": "Could not connect to MongoDB"}), 503
+
+@app.route('/api/analytics')
+@login_required
+def analytics_rows():
+    """
+    Bank/year rows, filtered by bank=a,b, year=2023-24,2024-25 and
+    <metric>_min / <metric>_max, sorted by sort=<metric> (order=asc|desc),
+    with limit/offset paging. metrics=a,b limits the metrics returned.
+    """
+    def build():
+        metrics = metrics_arg('metrics', analytics.METRICS)
+        ranges = {}
+        for metric in analytics.METRICS:
+            low = request.args.get(f'{metric}_min', type=float)
+            high = request.args.get(f'{metric}_max', type=float)
+            if low is not None or high is not None:
+                ranges[metric] = (low, high)
+        sort = metrics_arg('sort')[0] if request.args.get('sort') else None
+        limit = limit_arg()
+        offset = max(0, request.args.get('offset', 0, type=int))
+        total, rows = analytics.query(
+            bank_keys_arg(), csv_arg('year'), ranges, metrics, sort,
+            ascending=request.args.get('order') == 'asc', limit=limit, offset=offset
+        )
+        return {"meta": {"total": total, "limit": limit, "offset": offset}, "rows": rows}
+    return analytics_response(build)
+
+@app.route('/api/analytics/rank')
+@login_required
+def analytics_rank():
+    """Banks ranked by metric=<metric> in year=<report year> (latest by default), optionally among bank=a,b."""
+    def build():
+        metric = metrics_arg('metric')[0]
+        ascending = request.args.get('order') == 'asc'
+        report_year, rows = analytics.rank(
+            metric, request.args.get('year') or None, bank_keys_arg(), limit_arg(10), ascending
+        )
+        return {"meta": {"metric": metric, "report_year": report_year, "order": "asc" if ascending else "desc"},
+                "rows": rows}
+    return analytics_response(build)
+
+@app.route('/api/analytics/timeseries')
+@login_required
+def analytics_timeseries():
+    """metric=a,b per report year for bank=a,b (all banks by default), from=/to= first calendar year."""
+    def build():
+        metrics = metrics_arg('metric')
+        from_year = request.args.get('from', type=int)
+        to_year = request.args.get('to', type=int)
+        series = analytics.time_series(metrics, bank_keys_arg(), from_year, to_year)
+        return {"meta": {"metrics": metrics, "from": from_year, "to": to_year}, "banks": series}
+    return analytics_response(build)
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# Built from the span log, so it includes calls made by the job workers.
+metrics_aggregator = telemetry.MetricsAggregator()
+
+@app.route('/metrics')
+@login_required
+def metrics():
+    return Response(metrics_aggregator.render(), mimetype="text/plain; version=0.0.4")
 
 print("--- Checkpoint 9: All routes defined. ---")
 
 if __name__ == '__main__':
     print("--- Checkpoint 10: Script is being run directly. ---")
+    # The debug reloader's parent process only watches for file changes and
+    # restarts the serving child; every other process runs the workers.
+    use_reloader = os.getenv("FLASK_USE_RELOADER", "1") == "1"
+    if not use_reloader or is_running_from_reloader():
+        job_queue.start_workers(job_queue.JOB_WORKERS)
     try:
-        app.run(debug=True, port=5000)
+        app.run(debug=True, port=5000, use_reloader=use_reloader)
         print("--- Server is running. ---") 
     except Exception as e:
         print(f"--- ERROR running app: {e} ---")
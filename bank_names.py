@@ -0,0 +1,57 @@
+import re
+
+# Spelling variants the extractor produces, keyed by their normalized form
+# (see clean_bank_name), mapped to one canonical display name. Add new
+# variants here as they show up in ingested reports.
+BANK_NAME_ALIASES = {
+    "hdfc": "HDFC Bank",
+    "hdfc bank": "HDFC Bank",
+    "housing development finance corporation bank": "HDFC Bank",
+    "icici": "ICICI Bank",
+    "icici bank": "ICICI Bank",
+    "sbi": "State Bank of India",
+    "state bank of india": "State Bank of India",
+    "state bank of india sbi": "State Bank of India",
+    "axis": "Axis Bank",
+    "axis bank": "Axis Bank",
+    "kotak": "Kotak Mahindra Bank",
+    "kotak mahindra bank": "Kotak Mahindra Bank",
+    "kotak mahindra": "Kotak Mahindra Bank",
+    "pnb": "Punjab National Bank",
+    "punjab national bank": "Punjab National Bank",
+    "bank of baroda": "Bank of Baroda",
+    "bob": "Bank of Baroda",
+    "indusind bank": "IndusInd Bank",
+    "indusind": "IndusInd Bank",
+    "yes bank": "Yes Bank",
+    "canara bank": "Canara Bank",
+    "union bank of india": "Union Bank of India",
+    "idfc first bank": "IDFC FIRST Bank",
+    "idfc first": "IDFC FIRST Bank",
+}
+
+LEGAL_SUFFIXES = ("limited", "ltd", "plc", "inc", "co")
+
+
+def clean_bank_name(bank_name):
+    """Lowercases a bank name and strips punctuation and legal suffixes."""
+    name = bank_name.lower().replace("&", " and ")
+    name = re.sub(r"[^a-z0-9 ]+", " ", name)
+    words = name.split()
+    if words and words[0] == "the":
+        words = words[1:]
+    while words and words[-1] in LEGAL_SUFFIXES:
+        words = words[:-1]
+    return " ".join(words)
+
+
+def normalize_bank_name(bank_name):
+    """
+    Returns (bank_key, display_name) for a bank name as extracted. Known
+    variants map to their canonical bank; unknown names keep their own
+    spelling but still get a stable key.
+    """
+    cleaned = clean_bank_name(bank_name or "")
+    display_name = BANK_NAME_ALIASES.get(cleaned, (bank_name or "").strip())
+    bank_key = clean_bank_name(display_name).replace(" ", "_")
+    return bank_key, display_name
@@ -0,0 +1,179 @@
+"""
+Bulk ingestion of annual reports: runs process_file over a directory (or a
+manifest listing one PDF path per line) on a pool of worker processes that
+share one API rate budget.
+
+    python batch_ingest.py reports/ --workers 4 --rate 2
+    python batch_ingest.py --manifest backfill.txt --workers 8
+
+Progress is checkpointed after every document, so re-running the same
+command resumes where an interrupted run stopped. A JSON summary (docs/sec,
+LLM calls per doc, failures) is written at the end.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chunk_scanner import SharedTokenBucket
+
+DEFAULT_OUTPUT_DIR = "batch_runs"
+
+
+def find_pdfs(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(paths)
+
+
+def read_manifest(manifest_path):
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(os.path.abspath(os.path.join(base_dir, line)))
+    return paths
+
+
+def load_checkpoint(checkpoint_path):
+    """Returns {path: record} for every document finished in earlier runs."""
+    finished = {}
+    if not os.path.exists(checkpoint_path):
+        return finished
+    with open(checkpoint_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            finished[record["path"]] = record
+    return finished
+
+
+def append_checkpoint(checkpoint_file, record):
+    checkpoint_file.write(json.dumps(record) + "\n")
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
+
+
+def init_worker(rate_limiter):
+    import ingest_processor
+    ingest_processor.API_RATE_LIMITER = rate_limiter
+
+
+def ingest_one(path, log_dir):
+    import ingest_processor
+
+    calls_before = ingest_processor.get_agent_call_count()
+    started = time.time()
+    path_hash = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+    log_path = os.path.join(log_dir, f"{os.path.basename(path)}-{path_hash}.log")
+    error = None
+    with open(log_path, "w") as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            success = ingest_processor.process_file(path)
+        except Exception as e:
+            print(f"Unhandled error: {e}")
+            success = False
+            error = str(e)
+
+    return {
+        "path": path,
+        "status": "done" if success else "failed",
+        "seconds": round(time.time() - started, 3),
+        "llm_calls": ingest_processor.get_agent_call_count() - calls_before,
+        "error": error,
+        "log": log_path,
+    }
+
+
+def write_summary(summary_path, records, elapsed, skipped):
+    done = [record for record in records if record["status"] == "done"]
+    failed = [record for record in records if record["status"] != "done"]
+    llm_calls = sum(record["llm_calls"] for record in records)
+    summary = {
+        "documents": len(records),
+        "succeeded": len(done),
+        "failed": len(failed),
+        "skipped_from_checkpoint": skipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(len(records) / elapsed, 4) if elapsed else None,
+        "llm_calls": llm_calls,
+        "llm_calls_per_doc": round(llm_calls / len(records), 2) if records else None,
+        "failures": [{"path": record["path"], "error": record["error"], "log": record["log"]} for record in failed],
+    }
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    import ingest_processor
+
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory or manifest of annual reports")
+    parser.add_argument("directory", nargs="?", help="Directory searched recursively for PDFs")
+    parser.add_argument("--manifest", help="Text file with one PDF path per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--rate", type=float, default=ingest_processor.API_RATE_PER_SECOND,
+                        help="Fixed API calls per second shared by all workers (0: only the adaptive throttle)")
+    parser.add_argument("--burst", type=int, default=ingest_processor.API_RATE_BURST)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="Where the checkpoint, per-document logs and summary are written")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-run documents that failed in an earlier run instead of skipping them")
+    args = parser.parse_args()
+
+    if not args.directory and not args.manifest:
+        parser.error("give a directory or --manifest")
+
+    paths = read_manifest(args.manifest) if args.manifest else find_pdfs(args.directory)
+    log_dir = os.path.join(args.output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.output_dir, "checkpoint.jsonl")
+    summary_path = os.path.join(args.output_dir, "summary.json")
+
+    finished = load_checkpoint(checkpoint_path)
+    pending = [
+        path for path in paths
+        if path not in finished or (args.retry_failed and finished[path]["status"] != "done")
+    ]
+    skipped = len(paths) - len(pending)
+    print(f"[Batch] {len(paths)} document(s), {skipped} already in the checkpoint, {len(pending)} to ingest "
+          f"with {args.workers} worker(s) at {args.rate} calls/s.")
+
+    context = multiprocessing.get_context("spawn")
+    rate_limiter = SharedTokenBucket(args.rate, args.burst, context=context)
+    records = []
+    started = time.time()
+    with open(checkpoint_path, "a") as checkpoint_file, ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=context, initializer=init_worker, initargs=(rate_limiter,)
+    ) as executor:
+        futures = {executor.submit(ingest_one, path, log_dir): path for path in pending}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"path": futures[future], "status": "failed", "seconds": None,
+                          "llm_calls": 0, "error": str(e), "log": None}
+            append_checkpoint(checkpoint_file, record)
+            records.append(record)
+            print(f"[Batch] {len(records)}/{len(pending)} {record['status']:<6} "
+                  f"{os.path.basename(record['path'])} ({record['llm_calls']} LLM calls)")
+
+    summary = write_summary(summary_path, records, time.time() - started, skipped)
+    print(f"\n[Batch] {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['docs_per_second']} docs/sec, {summary['llm_calls_per_doc']} LLM calls/doc.")
+    print(f"[Batch] Summary written to {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares per-call overhead of the in-process AI agent client against the
+old one-interpreter-per-call subprocess mode, using the local stub server.
+
+    python bench_agent.py --calls 30
+"""
+import argparse
+import os
+import statistics
+import time
+
+from stub_openai_server import start_stub_server
+
+
+def time_calls(call_ai_agent, agent_mode, text, calls):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = call_ai_agent(text, "find", agent_mode=agent_mode)
+        timings.append(time.perf_counter() - start)
+        if not response or response.strip().startswith('{"error"'):
+            raise RuntimeError(f"Agent call failed in {agent_mode} mode: {response}")
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<12} mean {statistics.mean(timings) * 1000:8.1f} ms   "
+          f"p50 {statistics.median(timings) * 1000:8.1f} ms   "
+          f"p95 {p95 * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI agent per-call overhead benchmark")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=3, help="Approximate pages of text per call")
+    args = parser.parse_args()
+
+    server = start_stub_server(answer="NO")
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ["OPENROUTER_API_KEY"] = "stub"
+
+    import ingest_processor
+
+    # Time the transport itself: no cached answers and no rate limiting.
+    ingest_processor.AI_CACHE_ENABLED = False
+    ingest_processor.API_RATE_LIMITER = ingest_processor.TokenBucket(0, 1)
+
+    text = ("Financial Highlights 2024-25  Deposits 1,234,567  Advances 987,654\n" * 40) * args.pages
+
+    print(f"Running {args.calls} calls per mode against {server.base_url}")
+    results = {}
+    for agent_mode in ("inprocess", "subprocess"):
+        # One warm-up call so the in-process client exists before timing.
+        time_calls(ingest_processor.call_ai_agent, agent_mode, text, 1)
+        results[agent_mode] = time_calls(ingest_processor.call_ai_agent, agent_mode, text, args.calls)
+
+    print("\n--- Per-call latency ---")
+    for agent_mode, timings in results.items():
+        report(agent_mode, timings)
+
+    speedup = statistics.mean(results["subprocess"]) / statistics.mean(results["inprocess"])
+    print(f"\nIn-process mode is {speedup:.1f}x faster per call.")
+    print(f"Stub served {server.request_count} requests.")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
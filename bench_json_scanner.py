@@ -0,0 +1,163 @@
+"""
+Compares json_scanner.parse_response with the old first-"{"-to-last-"}"
+slice on messy model outputs: markdown fences, reasoning before and after
+the answer with stray braces or example JSON in it, trailing commas, smart
+quotes, numbers as strings, braces inside string values. Reports how many
+responses each recovers correctly and the time per parse (json and orjson).
+
+--fuzz N generates N responses from random combinations of those
+mutations; each is checked to parse to the expected object (or, for a
+truncated answer, to be rejected rather than misread).
+
+    python bench_json_scanner.py
+    python bench_json_scanner.py --fuzz 20000 --seed 3
+"""
+import argparse
+import json
+import random
+import time
+
+import ai_agent
+import json_scanner
+
+SCHEMA = ai_agent.RESPONSE_SCHEMAS["extract_balance_sheet"]
+BANKS = ["HDFC Bank", "State Bank of India", "ICICI Bank", "Axis Bank {Consolidated}", 'Bank "A" Ltd']
+
+
+def old_parse(raw_text):
+    """The removed clean_ai_response followed by json.loads."""
+    try:
+        json_string = raw_text[raw_text.index('{'):raw_text.rindex('}') + 1]
+    except ValueError:
+        json_string = raw_text
+    return json_scanner.coerce(json.loads(json_string), SCHEMA)
+
+
+def expected_object(rng):
+    total = rng.randint(10_000, 2_000_000)
+    equity = total // 10
+    return {
+        "total_assets": total,
+        "total_liabilities": total - equity,
+        "total_shareholders_equity": equity,
+        "asset_breakdown": {"loans_receivable": total * 6 // 10, "investments": total * 3 // 10, "other_assets": None},
+        "liability_breakdown": {"deposits": (total - equity) * 8 // 10, "borrowings": rng.randint(0, 5000)},
+        "equity_breakdown": {"equity_share_capital": equity // 20, "reserves_and_surplus": equity - equity // 20},
+        "notes": f"Figures for {rng.choice(BANKS)} in Rs. crore {{standalone}}",
+    }
+
+
+def stringify_numbers(value, rng):
+    if isinstance(value, dict):
+        return {key: stringify_numbers(item, rng) for key, item in value.items()}
+    if isinstance(value, int) and rng.random() < 0.5:
+        return f"{value:,}"
+    if value is None and rng.random() < 0.5:
+        return "N/A"
+    return value
+
+
+# Each mutation takes (json_text, rng) and returns the response text.
+MUTATIONS = {
+    "fence": lambda text, rng: f"```json\n{text}\n```",
+    "prose_before": lambda text, rng: "Here is the balance sheet I extracted:\n\n" + text,
+    "braces_before": lambda text, rng: "All values are {in crore}; I ignored the {restated} column.\n" + text,
+    "example_before": lambda text, rng: 'The schema is {"total_assets": "integer", ...} so:\n' + text,
+    "stray_open_before": lambda text, rng: "Checking the { header row first.\n" + text,
+    "braces_after": lambda text, rng: text + "\n\nNote: {other_equity} was not reported.",
+    "answer_twice": lambda text, rng: 'First attempt: {"total_assets": 1}\nCorrected answer:\n' + text,
+    "trailing_commas": lambda text, rng: text.replace("}", ",}").replace(",,", ","),
+    "smart_quotes": lambda text, rng: text.replace('"total_assets"', "“total_assets”", 1),
+}
+# Applied to the object before serializing.
+VALUE_MUTATIONS = {
+    "numbers_as_strings": stringify_numbers,
+}
+
+
+def make_response(rng, mutations, truncated=False):
+    expected = expected_object(rng)
+    value = expected
+    if "numbers_as_strings" in mutations:
+        value = stringify_numbers(value, rng)
+    text = json.dumps(value, indent=rng.choice([None, 2]), ensure_ascii=False)
+    if truncated:
+        text = text[:rng.randint(1, len(text) - 2)]
+    for name in mutations:
+        if name in MUTATIONS:
+            text = MUTATIONS[name](text, rng)
+    return text, (None if truncated else expected)
+
+
+def outcome(parse, text, expected):
+    """"ok", "wrong" (parsed to something else) or "failed"."""
+    try:
+        parsed = parse(text)
+    except ValueError:
+        return "ok" if expected is None else "failed"
+    if expected is None:
+        return "wrong"
+    return "ok" if parsed == expected else "wrong"
+
+
+def time_parse(parse, samples, repeat):
+    started = None
+    # The first round warms up and is not timed.
+    for round_number in range(repeat + 1):
+        if round_number == 1:
+            started = time.perf_counter()
+        for text, _ in samples:
+            try:
+                parse(text)
+            except ValueError:
+                pass
+    return (time.perf_counter() - started) / (repeat * len(samples)) * 1e6
+
+
+def new_parse(text):
+    return json_scanner.parse_response(text, SCHEMA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON response parsing benchmark")
+    parser.add_argument("--fuzz", type=int, default=0, help="Random responses to generate (0: one per mutation)")
+    parser.add_argument("--truncated", type=float, default=0.05, help="Share of fuzzed responses cut short")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = list(MUTATIONS) + list(VALUE_MUTATIONS)
+    if args.fuzz:
+        samples = [
+            make_response(rng, rng.sample(names, rng.randint(0, 4)), truncated=rng.random() < args.truncated)
+            for _ in range(args.fuzz)
+        ]
+        labels = ["fuzz"] * len(samples)
+    else:
+        samples = [make_response(rng, [])] + [make_response(rng, [name]) for name in names]
+        samples.append(make_response(rng, ["prose_before"], truncated=True))
+        labels = ["clean"] + names + ["truncated"]
+
+    results = {"old": {}, "new": {}}
+    for label, (text, expected) in zip(labels, samples):
+        for name, parse in (("old", old_parse), ("new", new_parse)):
+            counts = results[name].setdefault(label, {"ok": 0, "wrong": 0, "failed": 0})
+            counts[outcome(parse, text, expected)] += 1
+
+    print(f"{'case':<20} {'old ok/wrong/failed':>20} {'new ok/wrong/failed':>20}")
+    for label in dict.fromkeys(labels):
+        old, new = results["old"][label], results["new"][label]
+        print(f"{label:<20} {old['ok']:>8}/{old['wrong']}/{old['failed']:<8} {new['ok']:>8}/{new['wrong']}/{new['failed']}")
+
+    timing_samples = samples[:2000]
+    print(f"\nold slice + json       {time_parse(old_parse, timing_samples, args.repeat):8.1f} us/response")
+    if json_scanner.orjson is not None:
+        print(f"scanner + orjson       {time_parse(new_parse, timing_samples, args.repeat):8.1f} us/response")
+    orjson, json_scanner.orjson = json_scanner.orjson, None
+    print(f"scanner + json         {time_parse(new_parse, timing_samples, args.repeat):8.1f} us/response")
+    json_scanner.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
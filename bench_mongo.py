@@ -0,0 +1,74 @@
+"""
+Measures save latency against a local mongod: the old pattern (new
+MongoClient, server_info() and close() on every save) versus the shared,
+pooled client in db.py. Writes go to a scratch collection that is dropped
+afterwards.
+
+    mongod --port 27018
+    python bench_mongo.py --saves 50
+"""
+import argparse
+import statistics
+import time
+
+import pymongo
+
+import db
+
+BENCH_COLLECTION = "bench_save_latency"
+
+
+def sample_document(i):
+    return {
+        "bank_name": "Bench Bank",
+        "report_year": "2024-25",
+        "schema_type": "annual_report_summary",
+        "data": {"deposits_cr": 1000 + i, "advances_cr": 900 + i}
+    }
+
+
+def save_with_new_client(document):
+    client = pymongo.MongoClient(db.MONGO_URI, serverSelectionTimeoutMS=30000)
+    try:
+        client.server_info()
+        return client[db.MONGO_DB_NAME][BENCH_COLLECTION].insert_one(document).inserted_id
+    finally:
+        client.close()
+
+
+def save_with_shared_client(document):
+    db.check_health()
+    return db.get_db()[BENCH_COLLECTION].insert_one(document).inserted_id
+
+
+def time_saves(save, saves):
+    timings = []
+    for i in range(saves):
+        start = time.perf_counter()
+        save(sample_document(i))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MongoDB save latency benchmark")
+    parser.add_argument("--saves", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"Benchmarking {args.saves} saves per mode against {db.MONGO_URI}")
+    results = {
+        "per-save client": time_saves(save_with_new_client, args.saves),
+        "shared pool": time_saves(save_with_shared_client, args.saves),
+    }
+    db.get_db()[BENCH_COLLECTION].drop()
+
+    print("\n--- Save latency ---")
+    for label, timings in results.items():
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<16} mean {statistics.mean(timings) * 1000:8.2f} ms   "
+              f"p50 {statistics.median(timings) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
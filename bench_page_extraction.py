@@ -0,0 +1,94 @@
+"""
+Measures page text extraction of a large PDF on a process pool
+(pdf_document.iter_page_texts) against the single-process page loop, for
+1, 2, 4 and 8 workers: time until the first finder window's pages are
+available and time for the whole document. "cold" includes starting the
+pool's workers, which happens once per process; "warm" reuses them.
+
+Without a PDF it generates a report of --pages dense statement-like pages.
+
+    python bench_page_extraction.py report.pdf
+    python bench_page_extraction.py --pages 400 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import fitz
+
+import pdf_document
+
+# Pages in a summary finder window (ingest_processor.SUMMARY_CHUNK_SIZE). Not
+# imported from there: pool workers import this script, and should not pay
+# for the pipeline's imports.
+FIRST_WINDOW_PAGES = 3
+
+
+def dense_report(path, pages):
+    """Pages of small, column-laid-out text: heavy for the text extractor."""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), [f"Schedule {page_num} item {row}" for row in range(60)], fontsize=7)
+        for column in range(6):
+            amounts = [f"{(page_num + 1) * (row + 1) * (column + 7):,}" for row in range(60)]
+            page.insert_text((220 + column * 60, 40), amounts, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def time_serial(path):
+    started = time.perf_counter()
+    first_window = None
+    with fitz.open(path) as doc:
+        for page_num in range(len(doc)):
+            doc.load_page(page_num).get_text()
+            if page_num == FIRST_WINDOW_PAGES - 1:
+                first_window = time.perf_counter() - started
+    return first_window, time.perf_counter() - started
+
+
+def time_pool(path, page_count, workers, batch_size):
+    started = time.perf_counter()
+    first_window = None
+    for page_num, _ in pdf_document.iter_page_texts(path, page_count, workers, batch_size):
+        if page_num == FIRST_WINDOW_PAGES - 1:
+            first_window = time.perf_counter() - started
+    return first_window, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel page extraction benchmark")
+    parser.add_argument("pdf", nargs="?", help="PDF to extract (default: a generated one)")
+    parser.add_argument("--pages", type=int, default=400, help="Pages of the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=pdf_document.PAGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    temp_dir = None
+    path = args.pdf
+    if not path:
+        temp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(temp_dir.name, "dense.pdf")
+        dense_report(path, args.pages)
+    with fitz.open(path) as doc:
+        page_count = len(doc)
+
+    print(f"--- {page_count} pages, {os.cpu_count()} CPU(s), {args.batch_size} pages per task ---")
+    print(f"{'mode':<18} {'first window':>13} {'all pages':>10} {'pages/s':>9} {'speedup':>8}")
+    first_window, total = time_serial(path)
+    serial_total = total
+    print(f"{'serial':<18} {first_window:>12.2f}s {total:>9.2f}s {page_count / total:>9.0f} {1:>7.2f}x")
+    for workers in args.workers:
+        for run in ("cold", "warm"):
+            first_window, total = time_pool(path, page_count, workers, args.batch_size)
+            print(f"{f'{workers} worker(s), {run}':<18} {first_window:>12.2f}s {total:>9.2f}s "
+                  f"{page_count / total:>9.0f} {serial_total / total:>7.2f}x")
+        pdf_document.shutdown_page_pool()
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+End-to-end throughput of process_file, fully offline: the AI agent talks to
+stub_openai_server.py answering with canned verdicts and JSON (--canned),
+MongoDB is mongomock (MONGO_URI=mongomock://, unless --mongo-uri is given)
+and the reports are generated by synthetic_reports.py with random page
+counts and table positions.
+
+Reports reports/minute, LLM calls and HTTP requests per report (429s
+retried included), p50/p95 latency per report and how many reports were
+stored with the right pages. Regression thresholds can be given directly
+(--min-reports-per-minute, --max-p95, --max-calls-per-report) or as a
+baseline saved by an earlier run (--save-baseline, then --baseline with
+--tolerance); the exit status is 1 if any is missed.
+
+    python bench_pipeline.py --reports 20 --pages 40 200 --latency 0.05 --rate-limit-rate 0.05
+    python bench_pipeline.py --save-baseline baseline.json
+    python bench_pipeline.py --baseline baseline.json --tolerance 0.2
+
+Model routing (model_router.py) is benchmarked by naming the finder and
+extractor models and giving the stub a latency per model; the latency and
+accuracy recorded for each model are printed after the run:
+
+    python bench_pipeline.py --finder-models fast,slow --extractor-models slow \
+        --model-latency fast=0.02 --model-latency slow=0.5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import model_router
+import synthetic_reports
+from stub_openai_server import start_stub_server
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def configure(args, server, work_dir):
+    """Environment for the pipeline modules, set before they are imported."""
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ["OPENROUTER_API_KEY"] = "stub"
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = "bench_pipeline"
+    os.environ["AI_CACHE_ENABLED"] = "1" if args.cache else "0"
+    os.environ["AI_CACHE_PATH"] = os.path.join(work_dir, "ai_responses.sqlite3")
+    os.environ["API_RATE_PER_SECOND"] = str(args.rate)
+    os.environ["TELEMETRY_PATH"] = os.path.join(work_dir, "spans.jsonl")
+    os.environ["AI_RETRY_BASE_DELAY"] = str(args.retry_after)
+    if args.finder_models:
+        os.environ["AI_FINDER_MODELS"] = args.finder_models
+    if args.extractor_models:
+        os.environ["AI_EXTRACTOR_MODELS"] = args.extractor_models
+
+
+def stored_correctly(report, labels, total_pages):
+    """Whether a stored report holds both sections, found on the labelled pages."""
+    if not report or not report.get("balance_sheet"):
+        return False
+    source_pages = report.get("source_pages") or {}
+    for section, mode in (("summary", "find"), ("balance_sheet", "find_balance_sheet")):
+        start, end = source_pages.get(section) or (None, None)
+        if start is None or not start < labels[mode][0] <= min(end, total_pages):
+            return False
+    return True
+
+
+def check_thresholds(results, args):
+    """The regressions found, as messages."""
+    limits = []
+    if args.min_reports_per_minute is not None:
+        limits.append(("reports_per_minute", ">=", args.min_reports_per_minute))
+    if args.max_p95 is not None:
+        limits.append(("p95_seconds", "<=", args.max_p95))
+    if args.max_calls_per_report is not None:
+        limits.append(("llm_calls_per_report", "<=", args.max_calls_per_report))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limits.append(("reports_per_minute", ">=", baseline["reports_per_minute"] * (1 - args.tolerance)))
+        limits.append(("p95_seconds", "<=", baseline["p95_seconds"] * (1 + args.tolerance)))
+        limits.append(("llm_calls_per_report", "<=", baseline["llm_calls_per_report"] * (1 + args.tolerance)))
+        limits.append(("correct_share", ">=", baseline["correct_share"]))
+
+    failures = []
+    for metric, operator, limit in limits:
+        value = results[metric]
+        if (operator == ">=" and value < limit) or (operator == "<=" and value > limit):
+            failures.append(f"{metric} = {value:.3f}, expected {operator} {limit:.3f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against local stubs")
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, nargs=2, default=[40, 120], metavar=("MIN", "MAX"))
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per completion")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests the stub answers with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of the stub's 429s, and the retry base delay")
+    parser.add_argument("--rate", type=float, default=0, help="API_RATE_PER_SECOND for the run (0: no budget)")
+    parser.add_argument("--pipeline", choices=["single_pass", "two_stage"], help="PIPELINE_MODE (default: as configured)")
+    parser.add_argument("--mongo-uri", default="mongomock://", help="MongoDB to save to (default: in-memory mongomock)")
+    parser.add_argument("--cache", action="store_true", help="Keep the AI response cache on (a fresh one per run)")
+    parser.add_argument("--finder-models", help="AI_FINDER_MODELS for the run (default: as configured)")
+    parser.add_argument("--extractor-models", help="AI_EXTRACTOR_MODELS for the run (default: as configured)")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="Stub latency for one model, instead of --latency (repeatable)")
+    parser.add_argument("--failing-model", action="append", default=[], metavar="MODEL",
+                        help="Model the stub answers with 404 (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-reports-per-minute", type=float)
+    parser.add_argument("--max-p95", type=float, help="Seconds")
+    parser.add_argument("--max-calls-per-report", type=float)
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against --baseline")
+    parser.add_argument("--save-baseline", help="Write this run's results as JSON")
+    args = parser.parse_args()
+
+    if args.mongo_uri.startswith("mongomock://"):
+        try:
+            import mongomock
+        except ImportError:
+            parser.error("the default in-memory MongoDB needs mongomock: run `pip install -r requirements.txt` "
+                         "(or `pip install mongomock`), or pass --mongo-uri for a real server")
+
+    rng = random.Random(args.seed)
+    server = start_stub_server(latency=args.latency, canned=True, rate_limit_rate=args.rate_limit_rate,
+                               retry_after=args.retry_after, seed=args.seed,
+                               model_latency=model_router.model_settings(",".join(args.model_latency), float),
+                               failing_models=args.failing_model)
+    work_dir = tempfile.TemporaryDirectory()
+    configure(args, server, work_dir.name)
+    if args.pipeline:
+        os.environ["PIPELINE_MODE"] = args.pipeline
+
+    import ai_agent
+    import db
+    import ingest_processor
+
+    print(f"Generating {args.reports} report(s) of {args.pages[0]}-{args.pages[1]} pages...")
+    reports = []
+    for number in range(1, args.reports + 1):
+        path = os.path.join(work_dir.name, f"synthetic_{number}.pdf")
+        pages = rng.randint(*args.pages)
+        layout = synthetic_reports.random_layout(rng, pages)
+        labels, _ = synthetic_reports.write_report(path, rng, pages, *layout, bank_name=f"Synthetic Bank {number} Ltd")
+        reports.append((path, pages, labels, f"Synthetic Bank {number} Ltd"))
+
+    print(f"Ingesting against {server.base_url} ({ingest_processor.PIPELINE_MODE}, MongoDB {args.mongo_uri})...")
+    latencies = []
+    succeeded = correct = 0
+    calls_before = ingest_processor.get_agent_call_count()
+    requests_before = server.request_count
+    started = time.perf_counter()
+    for path, pages, labels, bank_name in reports:
+        report_started = time.perf_counter()
+        # The pipeline's own logging is not part of the benchmark output.
+        streams = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+        try:
+            ok = ingest_processor.process_file(path)
+        finally:
+            sys.stdout.close()
+            sys.stdout, sys.stderr = streams
+        latencies.append(time.perf_counter() - report_started)
+        succeeded += bool(ok)
+        stored = db.get_reports_collection().find_one({"bank_name": bank_name})
+        correct += stored_correctly(stored, labels, pages)
+    elapsed = time.perf_counter() - started
+
+    count = len(reports)
+    results = {
+        "reports": count,
+        "reports_per_minute": count / elapsed * 60,
+        "llm_calls_per_report": (ingest_processor.get_agent_call_count() - calls_before) / count,
+        "http_requests_per_report": (server.request_count - requests_before) / count,
+        "p50_seconds": statistics.median(latencies),
+        "p95_seconds": percentile(latencies, 0.95),
+        "succeeded_share": succeeded / count,
+        "correct_share": correct / count,
+        "status_counts": {str(status): number for status, number in sorted(server.status_counts.items())},
+        "models": ai_agent.ROUTER.stats(),
+    }
+    print(f"\n--- {count} reports in {elapsed:.1f}s ---")
+    print(f"reports/minute            {results['reports_per_minute']:8.1f}")
+    print(f"LLM calls per report      {results['llm_calls_per_report']:8.2f}")
+    print(f"HTTP requests per report  {results['http_requests_per_report']:8.2f}   (stub statuses: {results['status_counts']})")
+    print(f"latency p50 / p95         {results['p50_seconds']:8.2f}s / {results['p95_seconds']:.2f}s")
+    print(f"succeeded / correct       {succeeded}/{count} / {correct}/{count}")
+    print(f"\n{'model':<28} {'prompt type':<24} {'calls':>6} {'accuracy':>9} {'p50':>7} {'p95':>7} {'fallbacks':>10}")
+    for row in results["models"]:
+        accuracy = f"{row['accuracy']:.0%}" if row["accuracy"] is not None else "-"
+        shown_latencies = [f"{row[key]:.2f}s" if row[key] is not None else "-" for key in ("p50_seconds", "p95_seconds")]
+        print(f"{row['model']:<28} {row['prompt_type']:<24} {row['calls']:>6} {accuracy:>9} "
+              f"{shown_latencies[0]:>7} {shown_latencies[1]:>7} {row['fallbacks']:>10}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save_baseline}")
+    server.shutdown()
+    work_dir.cleanup()
+
+    failures = check_thresholds(results, args)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures the finder pre-filter on a corpus of sample reports: LLM calls and
+time-to-first-YES per finder stage, compared with the plain linear scan.
+
+With --labels, the agent is replaced by an oracle that answers YES for any
+window containing a labelled page, so no API calls are made:
+
+    {"hdfc_2024.pdf": {"find": [12], "find_balance_sheet": [180]}}
+
+(page numbers are 1-based). --latency adds a simulated delay per oracle
+call. Without --labels the configured AI agent answers.
+
+    python bench_prefilter.py reports/ --labels labels.json --latency 2
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import ingest_processor
+from pdf_document import PdfDocument
+
+STAGES = [
+    ("find", 3, "Finder"),
+    ("find_balance_sheet", 10, "BS Finder"),
+]
+
+
+def make_oracle(labels, latency, counter):
+    def oracle(text_input, mode, agent_mode=None):
+        counter["calls"] += 1
+        if latency:
+            time.sleep(latency)
+        pages = labels.get(mode, [])
+        return "YES" if any(f"\0PAGE{page}\0" in text_input for page in pages) else "NO"
+    return oracle
+
+
+class MarkedPdf:
+    """Wraps a PdfDocument so each page carries a marker the oracle can see."""
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.file_path = pdf.file_path
+
+    def __len__(self):
+        return len(self.pdf)
+
+    def window(self, start_page, end_page):
+        end_page = min(end_page, len(self.pdf))
+        return "".join(f"\0PAGE{page + 1}\0" + self.pdf.page_text(page) for page in range(start_page, end_page))
+
+
+def run_stage(pdf, mode, chunk_size, label, prefilter, counter):
+    ingest_processor.FINDER_PREFILTER = prefilter
+    calls_before = counter["calls"]
+    start = time.perf_counter()
+    found = ingest_processor.find_chunk(pdf, chunk_size, 1, mode, label)
+    elapsed = time.perf_counter() - start
+    return {
+        "found_pages": [found[0] + 1, min(found[1], len(pdf))] if found else None,
+        "llm_calls": counter["calls"] - calls_before,
+        "seconds_to_first_yes": elapsed if found else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finder pre-filter benchmark")
+    parser.add_argument("corpus", help="Directory of sample PDF reports")
+    parser.add_argument("--labels", help="JSON file of labelled pages per report")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per oracle call")
+    parser.add_argument("--concurrency", type=int, default=1, help="Finder concurrency during the benchmark")
+    parser.add_argument("--output", help="Write per-report results as JSON to this file")
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+
+    counter = {"calls": 0}
+    ingest_processor.FINDER_CONCURRENCY = args.concurrency
+    ingest_processor.AI_CACHE_ENABLED = False
+    ingest_processor.API_RATE_LIMITER = ingest_processor.TokenBucket(0, 1)
+    real_call_ai_agent = ingest_processor.call_ai_agent
+
+    def counting_agent(text_input, mode, agent_mode=None):
+        counter["calls"] += 1
+        return real_call_ai_agent(text_input, mode, agent_mode)
+
+    results = []
+    pdf_names = sorted(name for name in os.listdir(args.corpus) if name.lower().endswith(".pdf"))
+    for name in pdf_names:
+        with PdfDocument(os.path.join(args.corpus, name)) as pdf:
+            if args.labels:
+                if name not in labels:
+                    print(f"Skipping {name}: no labels.")
+                    continue
+                ingest_processor.call_ai_agent = make_oracle(labels[name], args.latency, counter)
+                target = MarkedPdf(pdf)
+            else:
+                ingest_processor.call_ai_agent = counting_agent
+                target = pdf
+
+            for mode, chunk_size, label in STAGES:
+                row = {"report": name, "stage": mode}
+                row["linear"] = run_stage(target, mode, chunk_size, label, False, counter)
+                row["prefilter"] = run_stage(target, mode, chunk_size, label, True, counter)
+                results.append(row)
+
+    ingest_processor.call_ai_agent = real_call_ai_agent
+
+    print("\n--- Pre-filter vs linear scan ---")
+    print(f"{'report':<30} {'stage':<20} {'linear calls':>12} {'prefilter calls':>16} {'linear s':>9} {'prefilter s':>12}")
+    for row in results:
+        linear, prefilter = row["linear"], row["prefilter"]
+        linear_s = linear["seconds_to_first_yes"]
+        prefilter_s = prefilter["seconds_to_first_yes"]
+        print(f"{row['report'][:30]:<30} {row['stage']:<20} {linear['llm_calls']:>12} {prefilter['llm_calls']:>16} "
+              f"{linear_s if linear_s is None else round(linear_s, 2)!s:>9} "
+              f"{prefilter_s if prefilter_s is None else round(prefilter_s, 2)!s:>12}")
+        if linear["found_pages"] != prefilter["found_pages"]:
+            print(f"  note: linear found {linear['found_pages']}, pre-filter found {prefilter['found_pages']}")
+
+    if results:
+        linear_calls = [row["linear"]["llm_calls"] for row in results]
+        prefilter_calls = [row["prefilter"]["llm_calls"] for row in results]
+        print(f"\nMean LLM calls per stage: linear {statistics.mean(linear_calls):.1f}, "
+              f"pre-filter {statistics.mean(prefilter_calls):.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
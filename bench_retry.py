@@ -0,0 +1,83 @@
+"""
+Compares the old fixed retry (3 attempts, 2 s apart, Retry-After ignored)
+with the adaptive policy in retry_policy.py, against the local stub server
+throttled to a fixed capacity and injecting some 503s.
+
+    python bench_retry.py --calls 60 --workers 8 --capacity 5 --error-rate 0.05
+"""
+import argparse
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_openai_server import start_stub_server
+
+
+def run_calls(ai_agent, client, calls, workers):
+    text = "Financial highlights for the year. " * 50
+
+    def one_call(_):
+        response = ai_agent.get_ai_response(client, ai_agent.HEADERS, text, "extract", stream=False)
+        return not response.strip().startswith('{"error"')
+
+    started = time.perf_counter()
+    # Each retry logs a line to stderr; keep the report readable.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull), \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one_call, range(calls)))
+    return sum(results), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retry policy benchmark against a throttled stub")
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--capacity", type=float, default=5.0, help="Requests per second the stub serves")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["OPENROUTER_API_KEY"] = "stub"
+    import ai_agent
+    import retry_policy
+
+    class FixedPolicy(retry_policy.RetryPolicy):
+        def backoff(self, attempt, retry_after=None, throttled=False):
+            return 2.0
+
+    class NoBreaker(retry_policy.CircuitBreaker):
+        def before_call(self):
+            pass
+
+    class NoThrottle(retry_policy.AdaptiveThrottle):
+        def wait(self):
+            return time.monotonic()
+
+    configs = [
+        ("fixed", FixedPolicy(max_attempts=3), NoBreaker(), NoThrottle()),
+        ("adaptive", retry_policy.RetryPolicy(), retry_policy.CircuitBreaker(), retry_policy.AdaptiveThrottle()),
+    ]
+
+    print(f"--- {args.calls} calls on {args.workers} threads, stub capacity {args.capacity}/s, "
+          f"{args.error_rate:.0%} injected 503s ---")
+    for label, policy, breaker, throttle in configs:
+        server = start_stub_server(latency=args.latency, answer='{"ok": true}', capacity=args.capacity,
+                                   error_rate=args.error_rate, seed=args.seed)
+        os.environ["OPENROUTER_BASE_URL"] = server.base_url
+        ai_agent.DEFAULT_POLICY = policy
+        ai_agent.CIRCUIT_BREAKER = breaker
+        ai_agent.THROTTLE = throttle
+        client = ai_agent.create_client()
+
+        succeeded, elapsed = run_calls(ai_agent, client, args.calls, args.workers)
+        statuses = dict(sorted(server.status_counts.items()))
+        print(f"{label:<9} {succeeded}/{args.calls} succeeded in {elapsed:6.2f}s   "
+              f"{succeeded / elapsed:5.2f} ok calls/s   {server.request_count} requests   statuses {statuses}")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures per-window finder latency with streaming early termination versus
+waiting for the full completion, against the local stub server imitating a
+reasoning model (thinking tokens, the answer, then an explanation).
+
+    python bench_streaming.py --calls 10 --reasoning-tokens 40 --tail-tokens 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+from stub_openai_server import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming finder latency benchmark")
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--reasoning-tokens", type=int, default=40)
+    parser.add_argument("--tail-tokens", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per generated token")
+    args = parser.parse_args()
+
+    server = start_stub_server(
+        answer="NO", reasoning_tokens=args.reasoning_tokens,
+        tail_tokens=args.tail_tokens, token_latency=args.token_latency
+    )
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ["OPENROUTER_API_KEY"] = "stub"
+
+    import ai_agent
+
+    client = ai_agent.get_shared_client()
+    text = "Directors' report and corporate governance. " * 200
+
+    results = {}
+    for label, stream in (("full", False), ("streaming", True)):
+        timings = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            response = ai_agent.get_ai_response(client, ai_agent.HEADERS, text, "find", stream=stream)
+            timings.append(time.perf_counter() - start)
+            if "NO" not in response.upper():
+                raise RuntimeError(f"Unexpected finder response in {label} mode: {response[:80]}")
+        results[label] = timings
+
+    print(f"\n--- Finder latency per window ({args.calls} calls, "
+          f"{args.reasoning_tokens} reasoning + {args.tail_tokens} tail tokens) ---")
+    for label, timings in results.items():
+        print(f"{label:<10} mean {statistics.mean(timings) * 1000:8.1f} ms   "
+              f"p50 {statistics.median(timings) * 1000:8.1f} ms")
+    saving = 1 - statistics.mean(results["streaming"]) / statistics.mean(results["full"])
+    print(f"\nStreaming cuts per-window finder latency by {saving * 100:.0f}%.")
+
+
+if __name__ == "__main__":
+    main()
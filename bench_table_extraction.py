@@ -0,0 +1,102 @@
+"""
+Compares the size of the extractor input with and without table
+extraction (ingest_processor.extraction_text): estimated tokens per
+extraction for the full window text against the tables alone, and the time
+table detection takes per page.
+
+Without a corpus it generates synthetic annual reports (see
+synthetic_reports.py) and also checks that every amount in their
+statements reaches the extractor.
+
+With a corpus, the windows come from a labels file as in bench_prefilter.py
+(1-based pages):
+
+    {"hdfc_2024.pdf": {"find": [12], "find_balance_sheet": [180]}}
+
+    python bench_table_extraction.py --reports 5
+    python bench_table_extraction.py reports/ --labels labels.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import ingest_processor
+import synthetic_reports
+import telemetry
+from pdf_document import PdfDocument
+
+
+def measure(pdf, window):
+    ingest_processor.TABLE_EXTRACTION = False
+    full = ingest_processor.extraction_text(pdf, window)
+    ingest_processor.TABLE_EXTRACTION = True
+    pdf.tables.clear()
+    started = time.perf_counter()
+    compact = ingest_processor.extraction_text(pdf, window)
+    seconds = time.perf_counter() - started
+    return full, compact, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table extraction benchmark")
+    parser.add_argument("corpus", nargs="?", help="Directory of sample PDF reports (needs --labels)")
+    parser.add_argument("--labels", help="JSON file of labelled pages per report")
+    parser.add_argument("--reports", type=int, default=3, help="Synthetic reports to generate without a corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    temp_dir = None
+    printed = {}
+    if args.corpus:
+        if not args.labels:
+            parser.error("a corpus needs --labels")
+        with open(args.labels) as f:
+            labels = json.load(f)
+        paths = {name: os.path.join(args.corpus, name) for name in labels}
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        labels, paths = {}, {}
+        for number in range(args.reports):
+            name = f"synthetic_{number + 1}.pdf"
+            paths[name] = os.path.join(temp_dir.name, name)
+            labels[name], printed[name] = synthetic_reports.write_report(paths[name], rng)
+
+    sizes = {"summary": ([], []), "balance_sheet": ([], [])}
+    page_seconds = []
+    missing = 0
+    print(f"{'report':<28} {'extraction':<14} {'full tokens':>12} {'table tokens':>13} {'ratio':>7}")
+    for name, path in paths.items():
+        with PdfDocument(path) as pdf:
+            for section, mode, size in (("summary", "find", ingest_processor.SUMMARY_CHUNK_SIZE),
+                                        ("balance_sheet", "find_balance_sheet", ingest_processor.BALANCE_SHEET_CHUNK_SIZE)):
+                for page in labels[name].get(mode, []):
+                    window = (page - 1, min(page - 1 + size, len(pdf)))
+                    full, compact, seconds = measure(pdf, window)
+                    page_seconds.append(seconds / (window[1] - window[0]))
+                    full_tokens, compact_tokens = telemetry.estimate_tokens(full), telemetry.estimate_tokens(compact)
+                    sizes[section][0].append(full_tokens)
+                    sizes[section][1].append(compact_tokens)
+                    print(f"{name:<28} {section:<14} {full_tokens:>12} {compact_tokens:>13} {full_tokens / compact_tokens:>6.1f}x")
+                    if name in printed and section == "balance_sheet":
+                        missing += sum(1 for amount in printed[name] if amount in full and amount not in compact)
+
+    print()
+    for section, (full, compact) in sizes.items():
+        if full:
+            print(f"{section:<14} mean tokens per extraction {statistics.mean(full):8.0f} -> {statistics.mean(compact):6.0f} "
+                  f"({sum(full) / sum(compact):.1f}x smaller)")
+    if page_seconds:
+        print(f"table detection {statistics.mean(page_seconds) * 1000:.1f} ms/page")
+    if printed:
+        print(f"statement amounts in the window but missing from the tables: {missing}")
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
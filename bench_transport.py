@@ -0,0 +1,82 @@
+"""
+Compares the plain-text and Base64 transports on a real report: payload
+size, prompt tokens (from the API's `usage`) and latency per call.
+
+    python bench_transport.py uploads/report.pdf --windows 5
+    python bench_transport.py uploads/report.pdf --stub
+
+--stub answers from the local stub server, whose token counts are a flat
+4-characters-per-token estimate; run without it to see the real model's
+token counts.
+"""
+import argparse
+import os
+import statistics
+import time
+
+STAGES = [("find", 3), ("find_balance_sheet", 10)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text vs Base64 transport benchmark")
+    parser.add_argument("pdf", help="PDF report to sample windows from")
+    parser.add_argument("--windows", type=int, default=5, help="Windows per finder stage")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub server instead of the API")
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_openai_server import start_stub_server
+        server = start_stub_server(answer="NO")
+        os.environ["OPENROUTER_BASE_URL"] = server.base_url
+        os.environ["OPENROUTER_API_KEY"] = "stub"
+
+    import ai_agent
+    import ingest_processor
+    from pdf_document import PdfDocument
+
+    client = ai_agent.get_shared_client()
+    # Warm the connection pool so the first timed call is not penalised.
+    client.chat.completions.create(
+        extra_headers=ai_agent.HEADERS,
+        model=ai_agent.MODEL_NAME,
+        messages=ai_agent.build_messages("warm-up", "find")
+    )
+    results = {transport: {"chars": [], "prompt_tokens": [], "seconds": []} for transport in ai_agent.TRANSPORTS}
+
+    with PdfDocument(args.pdf) as pdf:
+        for mode, chunk_size in STAGES:
+            starts = range(0, len(pdf), chunk_size - 1)
+            for start_page in list(starts)[:args.windows]:
+                text_chunk = pdf.window(start_page, start_page + chunk_size)
+                for transport in ai_agent.TRANSPORTS:
+                    agent_input = ingest_processor.encode_for_transport(text_chunk, transport)
+                    messages = ai_agent.build_messages(agent_input, mode, transport)
+                    started = time.perf_counter()
+                    completion = client.chat.completions.create(
+                        extra_headers=ai_agent.HEADERS,
+                        model=ai_agent.MODEL_NAME,
+                        messages=messages
+                    )
+                    elapsed = time.perf_counter() - started
+                    usage = completion.usage
+                    results[transport]["chars"].append(sum(len(m["content"]) for m in messages))
+                    results[transport]["prompt_tokens"].append(usage.prompt_tokens if usage else 0)
+                    results[transport]["seconds"].append(elapsed)
+
+    print(f"\n--- Transport comparison ({len(results['text']['seconds'])} calls each) ---")
+    print(f"{'transport':<10} {'mean chars':>12} {'mean prompt tokens':>20} {'mean latency s':>16}")
+    for transport, data in results.items():
+        print(f"{transport:<10} {statistics.mean(data['chars']):>12.0f} "
+              f"{statistics.mean(data['prompt_tokens']):>20.0f} {statistics.mean(data['seconds']):>16.2f}")
+
+    text_tokens = sum(results["text"]["prompt_tokens"])
+    base64_tokens = sum(results["base64"]["prompt_tokens"])
+    if base64_tokens:
+        print(f"\nPlain text uses {100 * (1 - text_tokens / base64_tokens):.0f}% fewer prompt tokens than Base64.")
+    text_seconds = sum(results["text"]["seconds"])
+    base64_seconds = sum(results["base64"]["seconds"])
+    print(f"Total latency: text {text_seconds:.1f} s, base64 {base64_seconds:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Times bulk validation (validation.validate_reports) over synthetic reports
+in the stored shape, against checking the same reports one at a time. About
+a third of the values are strings with units ("1,23,456 crore",
+"45.6 lakh", "(120)") and --broken of the reports fail an identity.
+
+    python bench_validation.py --reports 10000
+"""
+import argparse
+import random
+import time
+
+import validation
+
+
+def synthetic_report(rng, broken):
+    def amount(value):
+        style = rng.random()
+        if style < 0.1:
+            return f"{value * 100:,.0f} lakh"
+        if style < 0.2:
+            return f"{value:,} crore"
+        if style < 0.3:
+            return f"Rs. {value:,}"
+        return value
+
+    assets = rng.randint(50_000, 2_500_000)
+    equity = assets // rng.randint(8, 12)
+    liabilities = assets - equity
+    loans, investments = assets * 6 // 10, assets * 3 // 10
+    deposits, borrowings = liabilities * 8 // 10, liabilities // 10
+    capital = equity // 20
+    if broken:
+        assets *= 10
+
+    return {
+        "data": {
+            "balance_sheet_size_cr": amount(assets),
+            "profit_after_tax_cr": amount(assets // 80),
+            "deposits_cr": amount(deposits),
+            "advances_cr": amount(loans),
+            "return_on_equity_percent": f"{rng.uniform(5, 20):.2f}%",
+            "dividend_per_share_inr": round(rng.uniform(1, 25), 1),
+        },
+        "balance_sheet": {
+            "total_assets": amount(assets),
+            "total_liabilities": amount(liabilities),
+            "total_shareholders_equity": amount(equity),
+            "asset_breakdown": {
+                "cash_and_cash_equivalents": amount(assets // 20),
+                "loans_receivable": amount(loans),
+                "investments": amount(investments),
+                "property_plant_equipment": amount(assets // 100),
+                "other_assets": amount(assets - loans - investments - assets // 20 - assets // 100),
+            },
+            "liability_breakdown": {
+                "deposits": amount(deposits),
+                "borrowings": amount(borrowings),
+                "other_liabilities": amount(liabilities - deposits - borrowings),
+            },
+            "equity_breakdown": {
+                "equity_share_capital": amount(capital),
+                "reserves_and_surplus": amount(equity - capital),
+                "other_equity": None,
+            },
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk validation benchmark")
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--broken", type=float, default=0.05, help="Share of reports that fail an identity")
+    parser.add_argument("--sample", type=int, default=1000, help="Reports checked one at a time for comparison")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reports = [synthetic_report(rng, rng.random() < args.broken) for _ in range(args.reports)]
+
+    started = time.perf_counter()
+    _, _, failures = validation.validate_reports(reports)
+    batch_seconds = time.perf_counter() - started
+    flagged = int(failures.any(axis=1).sum())
+
+    sample = reports[:args.sample]
+    started = time.perf_counter()
+    for report in sample:
+        validation.check_section("summary", report)
+        validation.check_section("balance_sheet", report["balance_sheet"])
+    single_seconds = (time.perf_counter() - started) / max(len(sample), 1) * len(reports)
+
+    print(f"--- {len(reports)} reports, {flagged} flagged ---")
+    print(f"batch       {batch_seconds:7.2f}s   {len(reports) / batch_seconds:9.0f} reports/s")
+    print(f"one by one  {single_seconds:7.2f}s   {len(reports) / single_seconds:9.0f} reports/s  (estimated from {len(sample)})")
+    for check, count in failures.sum().items():
+        if count:
+            print(f"  {check:<45} {int(count):>7}")
+
+
+if __name__ == "__main__":
+    main()
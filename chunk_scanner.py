@@ -0,0 +1,122 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Each acquire() takes one token, blocking until
+    one is available; tokens refill at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose state lives in shared memory. Processes started with
+    it (e.g. as a pool initializer argument) all draw from one budget.
+    """
+
+    def __init__(self, rate, capacity, context=multiprocessing):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.lock = context.Lock()
+        self._tokens = context.Value("d", float(capacity), lock=False)
+        self._updated = context.Value("d", time.monotonic(), lock=False)
+
+    @property
+    def tokens(self):
+        return self._tokens.value
+
+    @tokens.setter
+    def tokens(self, value):
+        self._tokens.value = value
+
+    @property
+    def updated(self):
+        return self._updated.value
+
+    @updated.setter
+    def updated(self, value):
+        self._updated.value = value
+
+
+def scan_windows(windows, check_window, max_workers=4):
+    """
+    Runs check_window(window) over the windows with up to max_workers calls
+    in flight, and returns the index of the first window (in list order) for
+    which it returned True, or None.
+
+    Once a match is found no further windows are dispatched, and queued
+    windows after it are cancelled; windows before it are still awaited so
+    the earliest match wins, exactly as a sequential scan would.
+    """
+    state = {"best": None}
+    state_lock = threading.Lock()
+
+    def superseded(index):
+        with state_lock:
+            return state["best"] is not None and index > state["best"]
+
+    def run(index):
+        # Skip windows that lost the race before they reached the API.
+        if superseded(index):
+            return False
+        return check_window(windows[index])
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    in_flight = {}
+    next_index = 0
+    try:
+        while True:
+            while len(in_flight) < max_workers and next_index < len(windows) and not superseded(next_index):
+                in_flight[executor.submit(run, next_index)] = next_index
+                next_index += 1
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                if future.result():
+                    with state_lock:
+                        if state["best"] is None or index < state["best"]:
+                            state["best"] = index
+
+            for future, index in list(in_flight.items()):
+                if superseded(index) and future.cancel():
+                    del in_flight[future]
+
+            if state["best"] is not None and all(index > state["best"] for index in in_flight.values()):
+                break
+    finally:
+        # Windows after the match that are already running are left to
+        # finish in the background; their answers cannot change the result.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return state["best"]
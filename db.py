@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+
+import pymongo
+
+# "mongomock://" runs against an in-memory mongomock server in this process
+# (benchmarks and offline runs; needs the mongomock package).
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27018/")
+MOCK_URI_SCHEME = "mongomock://"
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "bank_data")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+REPORTS_COLLECTION = "reports"
+ANALYTICS_COLLECTION = "bank_year_metrics"
+# Every collection this module owns; anything else in the database is a
+# legacy per-bank collection (see migrate_collections.py).
+OWNED_COLLECTIONS = (REPORTS_COLLECTION, ANALYTICS_COLLECTION)
+# A successful ping is trusted for this many seconds before pinging again.
+MONGO_HEALTH_CHECK_INTERVAL = float(os.getenv("MONGO_HEALTH_CHECK_INTERVAL", "30"))
+
+_client = None
+_client_pid = None
+_last_healthy = 0.0
+_lock = threading.Lock()
+_indexed_collections = set()
+
+
+def get_client():
+    """
+    Returns the process-wide MongoClient, creating it on first use. Every
+    caller shares its connection pool; a forked child creates its own.
+    """
+    global _client, _client_pid, _last_healthy
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            if MONGO_URI.startswith(MOCK_URI_SCHEME):
+                _client = create_mock_client()
+            else:
+                _client = pymongo.MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+                )
+            _client_pid = os.getpid()
+            _last_healthy = 0.0
+        return _client
+
+
+def create_mock_client():
+    """
+    An in-memory mongomock client for MONGO_URI=mongomock://. Its data lives
+    in this process only: job queue workers and batch_ingest.py pool
+    workers each see their own, empty database.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError("MONGO_URI is mongomock:// but the mongomock package is not installed")
+    return mongomock.MongoClient()
+
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+def check_health(timeout=None):
+    """
+    Pings the server unless a ping succeeded within the last
+    MONGO_HEALTH_CHECK_INTERVAL seconds. `timeout` (seconds) caps how long
+    the ping may wait for a server. Raises pymongo errors if it is down.
+    """
+    global _last_healthy
+    if time.monotonic() - _last_healthy < MONGO_HEALTH_CHECK_INTERVAL:
+        return True
+
+    client = get_client()
+    if timeout is None:
+        client.admin.command("ping")
+    else:
+        with pymongo.timeout(timeout):
+            client.admin.command("ping")
+    _last_healthy = time.monotonic()
+    return True
+
+
+def get_reports_collection():
+    """
+    Returns the single `reports` collection, creating its indexes once per
+    process: (bank_key, report_year) for per-bank lookups, report_year
+    for cross-bank queries such as "all banks for 2024-25", the page
+    fingerprints used to match a re-uploaded report to its earlier version,
+    and the content hashes of the files it was ingested from.
+    """
+    collection = get_db()[REPORTS_COLLECTION]
+    key = (os.getpid(), collection.name)
+    if key not in _indexed_collections:
+        collection.create_index([("bank_key", pymongo.ASCENDING), ("report_year", pymongo.DESCENDING)])
+        collection.create_index([("report_year", pymongo.DESCENDING)])
+        collection.create_index([("page_fingerprints", pymongo.ASCENDING)])
+        collection.create_index([("content_hashes", pymongo.ASCENDING)])
+        _indexed_collections.add(key)
+    return collection
+
+
+def get_analytics_collection(metrics=()):
+    """
+    Returns the `bank_year_metrics` collection (one row per bank and
+    report year, see analytics.py), creating its indexes once per process:
+    bank_key for time series, and (report_year, metric) for each of
+    `metrics` so per-year rankings are read straight off an index.
+    """
+    collection = get_db()[ANALYTICS_COLLECTION]
+    key = (os.getpid(), collection.name)
+    if key not in _indexed_collections:
+        collection.create_index([("bank_key", pymongo.ASCENDING), ("year_start", pymongo.ASCENDING)])
+        collection.create_index([("report_id", pymongo.ASCENDING)])
+        for metric in metrics:
+            collection.create_index([("report_year", pymongo.ASCENDING), (metric, pymongo.DESCENDING)])
+        _indexed_collections.add(key)
+    return collection
+
+
+def close_client():
+    global _client, _client_pid, _last_healthy
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        _last_healthy = 0.0
@@ -1,76 +1,167 @@
 import os
-import json
-import pymongo
-import fitz  
 import time
 import subprocess 
 import sys 
 import base64 
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def get_text_from_file_chunk(file_path, start_page, end_page):
+import ai_agent
+import analytics
+from bank_names import normalize_bank_name
+import db
+import json_scanner
+import reingest
+import response_cache
+import table_extractor
+import telemetry
+import validation
+from chunk_scanner import TokenBucket, scan_windows
+from pdf_document import PdfDocument
+
+# Finder windows dispatched at once, and an optional fixed API budget shared
+# by every concurrent call in this process (calls per second, plus burst
+# size). Off by default (0): the adaptive throttle in retry_policy.py paces
+# calls to the provider's actual limits, and a fixed budget would cap them
+# below those.
+FINDER_CONCURRENCY = int(os.getenv("FINDER_CONCURRENCY", "4"))
+API_RATE_PER_SECOND = float(os.getenv("API_RATE_PER_SECOND", "0"))
+API_RATE_BURST = int(os.getenv("API_RATE_BURST", "4"))
+
+API_RATE_LIMITER = TokenBucket(API_RATE_PER_SECOND, API_RATE_BURST)
+
+_agent_calls = 0
+_agent_calls_lock = threading.Lock()
+
+def get_agent_call_count():
+    """Number of AI agent calls (cache hits excluded) made by this process."""
+    return _agent_calls
+
+# Responses are cached on disk by chunk text, prompt type and the models
+# routed for it (ai_agent.ROUTER), so re-ingesting an unchanged PDF does not spend API quota again.
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+
+_response_cache = None
+_response_cache_pid = None
+
+def get_response_cache():
+    """Returns this process's response cache, or None if caching is off."""
+    global _response_cache, _response_cache_pid
+    if not AI_CACHE_ENABLED:
+        return None
+    if _response_cache is None or _response_cache_pid != os.getpid():
+        try:
+            _response_cache = response_cache.ResponseCache()
+            _response_cache_pid = os.getpid()
+        except Exception as e:
+            print(f"  [Cache] Response cache unavailable, continuing without it: {e}")
+            return None
+    return _response_cache
+
+def parse_ai_response(raw_text, mode):
     """
-    Extracts text from a specific page range of a PDF.
+    Returns the JSON object the agent answered a `mode` prompt with, picked
+    out of any surrounding text and coerced to the prompt's schema (see
+    json_scanner). Raises json_scanner.ResponseParseError if there is none.
     """
-    full_text = ""
-    try:
-        with fitz.open(file_path) as doc:
-            if end_page > len(doc):
-                end_page = len(doc)
-            for page_num in range(start_page, end_page):
-                page = doc.load_page(page_num)
-                full_text += page.get_text()
-        return full_text
-    except Exception as e:
-        print(f"Error reading PDF chunk {file_path} (Pages {start_page}-{end_page}): {e}")
-        return None
+    return json_scanner.parse_response(raw_text, ai_agent.RESPONSE_SCHEMAS.get(mode))
 
-def get_pdf_page_count(file_path):
-    """Gets the total number of pages in a PDF."""
-    try:
-        with fitz.open(file_path) as doc:
-            return len(doc)
-    except Exception as e:
-        print(f"Error opening PDF to get page count: {e}")
-        return 0
+AI_AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_agent.py")
+
+# "inprocess" reuses one long-lived client for every call; "subprocess"
+# runs ai_agent.py in a fresh interpreter per call for isolation.
+AI_AGENT_MODE = os.getenv("AI_AGENT_MODE", "inprocess")
+
+# Chunks go to the model as plain text. Base64 is only used when set as
+# the transport, or as a retry for a chunk the text transport failed on
+# when AI_TRANSPORT_FALLBACK=base64.
+AI_TRANSPORT = os.getenv("AI_TRANSPORT", "text")
+AI_TRANSPORT_FALLBACK = os.getenv("AI_TRANSPORT_FALLBACK", "")
+
+CONTROL_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
 
-def clean_ai_response(raw_text):
+def encode_for_transport(text_input, transport):
+    """Encodes a chunk for the given transport ("text" or "base64")."""
+    if transport == "base64":
+        text_bytes = text_input.encode('utf-8', errors='ignore')
+        return base64.b64encode(text_bytes).decode('ascii')
+    # Drop lone surrogates and control characters PDFs sometimes contain.
+    clean_text = text_input.encode('utf-8', errors='ignore').decode('utf-8')
+    return CONTROL_CHARS_RE.sub(" ", clean_text)
+
+def call_ai_agent(text_input, mode, agent_mode=None, transport=None):
     """
-    Cleans the AI's JSON response, removing markdown and whitespace.
+    Sends the text to the AI agent and returns its raw response, either
+    in-process or via the ai_agent.py script.
     """
-    print("  [Cleaner] Cleaning raw AI response...")
-    try:
-        start_index = raw_text.index('{')
-        end_index = raw_text.rindex('}')
-        json_string = raw_text[start_index:end_index+1]
-        print("  [Cleaner] Response cleaned.")
-        return json_string
-    except ValueError:
-        print("  [Cleaner] No JSON object found in response.")
-        return raw_text
+    global _agent_calls
+    agent_mode = agent_mode or AI_AGENT_MODE
+    transport = transport or AI_TRANSPORT
+
+    with telemetry.span("agent_call", kind="agent_call", prompt_type=mode, agent_mode=agent_mode, transport=transport) as call_span:
+        cache = get_response_cache()
+        cache_key = None
+        if cache:
+            cache_key = response_cache.make_key(
+                text_input, mode, ai_agent.ROUTER.route_key(mode), ai_agent.system_prompt_for(mode, transport) or ""
+            )
+            cached_response = cache.get(cache_key)
+            call_span.set(cache_hit=cached_response is not None)
+            if cached_response is not None:
+                print(f"  [Cache] Hit for '{mode}' call, skipping the AI agent.")
+                return cached_response
+
+        wait_started = time.perf_counter()
+        API_RATE_LIMITER.acquire()
+        call_span.set(rate_limit_wait_ms=round((time.perf_counter() - wait_started) * 1000, 3))
+        with _agent_calls_lock:
+            _agent_calls += 1
+
+        print(f"  [Processor] Calling the AI agent in '{mode}' mode ({agent_mode}, {transport} transport)...")
+
+        agent_input = encode_for_transport(text_input, transport)
+
+        if agent_mode == "subprocess":
+            response = run_ai_agent_subprocess(agent_input, mode, transport)
+        else:
+            try:
+                response = ai_agent.ask_agent(agent_input, mode, transport)
+            except Exception as e:
+                print(f"  [Processor Error] In-process AI agent call failed: {e}")
+                response = None
+
+        failed = not response or not response.strip() or response.strip().startswith('{"error"')
+        if failed:
+            call_span.set(error=(response or "no response").strip()[:200])
+        if failed and AI_TRANSPORT_FALLBACK and AI_TRANSPORT_FALLBACK != transport:
+            print(f"  [Processor] '{transport}' transport failed, retrying with '{AI_TRANSPORT_FALLBACK}'...")
+            return call_ai_agent(text_input, mode, agent_mode, AI_TRANSPORT_FALLBACK)
 
-def call_ai_agent(text_input, mode):
+        # Only answers in the prompt type's form are kept: a retry should
+        # ask the model again rather than replay one it could not use.
+        if cache and not failed and ai_agent.usable_answer(response, mode):
+            cache.put(cache_key, response)
+        return response
+
+def run_ai_agent_subprocess(agent_input, mode, transport):
     """
-    Runs the ai_agent.py script, piping the text as a Base64 string.
+    Runs the ai_agent.py script in its own interpreter, piping the input.
     """
-    process_args = [sys.executable, "ai_agent.py", mode]
-    
-    print(f"  [Processor] Converting text to Base64 and calling 'ai_agent.py' in '{mode}' mode...")
+    process_args = [sys.executable, AI_AGENT_SCRIPT, mode, transport]
     
     try:
-        text_bytes = text_input.encode('utf-8', errors='ignore')
-        base64_bytes = base64.b64encode(text_bytes)
-        base64_text_input = base64_bytes.decode('ascii')
-        
         process = subprocess.Popen(
             process_args,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            encoding='utf-8' 
+            encoding='utf-8',
+            env=telemetry.child_environment()
         )
         
-        stdout_data, stderr_data = process.communicate(input=base64_text_input)
+        stdout_data, stderr_data = process.communicate(input=agent_input)
         
         if process.returncode != 0:
             print(f"  [AI Agent Error] Subprocess failed with code {process.returncode}")
@@ -86,174 +177,868 @@ def call_ai_agent(text_input, mode):
         print(f"  [Processor Error] Failed to run subprocess: {e}")
         return None
 
-def save_to_db(data_to_save, collection_name, document_id=None):
+def bank_name_fields(bank_name):
+    """The extracted, canonical and key forms of a bank name, as stored on a report."""
+    bank_key, display_name = normalize_bank_name(bank_name)
+    return {"bank_name_extracted": bank_name, "bank_name": display_name, "bank_key": bank_key}
+
+def save_to_db(data_to_save, bank_name, document_id=None, extra_fields=None, replace_id=None):
     """
-    Saves or updates data in MongoDB. Imports pymongo locally.
+    Saves a new report to the shared `reports` collection, tagged with the
+    normalized bank key and display name, or adds the balance sheet
+    (`data_to_save`) to an existing one. `extra_fields` are stored as well.
+    With `replace_id`, the new report replaces that stored one (an earlier
+    version of the same report) under its ID instead of being inserted.
+    The report's row in the analytics collection is updated to match.
     """
-    import pymongo 
-    
-    db_client = None
-    try:
-        print("\nConnecting to MongoDB...")
-        db_client = pymongo.MongoClient("mongodb://localhost:27018/", serverSelectionTimeoutMS=30000) 
-        db_client.server_info()
-        print("MongoDB connection successful.")
-        db = db_client["bank_data"]
-        
-        safe_collection_name = collection_name.lower().replace(" ", "_").replace(".", "").replace("&", "and")
-        bank_collection = db[safe_collection_name]
-        
-        if document_id:
-            print(f"Updating document ID {document_id} in collection {safe_collection_name}...")
-            bank_collection.update_one(
-                {'_id': document_id},
-                {'$set': {'data': data_to_save}}
-            )
-            print("Successfully updated document with detailed data.")
-        else:
-            print(f"Inserting new document into collection {safe_collection_name}...")
-            insert_result = bank_collection.insert_one(data_to_save)
+    with telemetry.span("save_to_db", kind="stage", update=bool(document_id)) as save_span:
+        try:
+            db.check_health()
+            reports = db.get_reports_collection()
+            
+            if document_id:
+                print(f"Updating document ID {document_id} in collection {reports.name}...")
+                reports.update_one(
+                    {'_id': document_id},
+                    {'$set': {'balance_sheet': data_to_save, **(extra_fields or {})}}
+                )
+                print("Successfully updated document with detailed data.")
+                analytics.refresh_report(document_id, reports)
+                return document_id
+
+            data_to_save.update(bank_name_fields(bank_name))
+            data_to_save.update(extra_fields or {})
+
+            if replace_id:
+                print(f"Replacing document ID {replace_id} in collection {reports.name}...")
+                reports.replace_one({'_id': replace_id}, data_to_save)
+                print("Successfully replaced the earlier version.")
+                analytics.refresh_report(replace_id, reports)
+                ingest_trace = telemetry.current_trace()
+                if ingest_trace:
+                    ingest_trace.attributes["document_id"] = replace_id
+                return replace_id
+
+            print(f"Inserting new document for '{data_to_save['bank_name']}' into collection {reports.name}...")
+            insert_result = reports.insert_one(data_to_save)
             print(f"Successfully inserted new document. ID: {insert_result.inserted_id}")
-            if db_client: db_client.close()
-            print("MongoDB connection closed.")
+            analytics.refresh_report(insert_result.inserted_id, reports)
+            ingest_trace = telemetry.current_trace()
+            if ingest_trace:
+                ingest_trace.attributes["document_id"] = insert_result.inserted_id
             return insert_result.inserted_id 
 
-        if db_client: db_client.close()
-        print("MongoDB connection closed.")
-        return document_id
+        except Exception as e:
+            print(f"MongoDB connection/insertion failed: {e}")
+            save_span.set(error=str(e))
+            return None
 
+def save_timings(document_id, timings):
+    """Stores a run's timing breakdown on its report document."""
+    try:
+        db.get_reports_collection().update_one({'_id': document_id}, {'$set': {'timings': timings}})
     except Exception as e:
-        print(f"MongoDB connection/insertion failed: {e}")
-        if db_client: db_client.close()
+        print(f"  [Telemetry] Could not store timings for {document_id}: {e}")
+
+
+# Local pre-filter: windows are scored on keywords and number density
+# before any LLM call, checked best-first, and skipped below the threshold.
+FINDER_PREFILTER = os.getenv("FINDER_PREFILTER", "1") == "1"
+PREFILTER_MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", "1.0"))
+PREFILTER_NUMBER_WEIGHT = 4.0
+
+PREFILTER_KEYWORDS = {
+    "find": {
+        "financial highlights": 3.0,
+        "key highlights": 2.0,
+        "at a glance": 2.0,
+        "performance": 1.0,
+        "overview": 1.0,
+        "net profit": 1.0,
+        "profit after tax": 1.0,
+        "deposits": 1.0,
+        "advances": 1.0,
+        "return on equity": 1.0,
+        "dividend": 0.5,
+    },
+    "find_balance_sheet": {
+        "balance sheet": 3.0,
+        "consolidated balance sheet": 2.0,
+        "assets": 1.0,
+        "liabilities": 1.0,
+        "capital and liabilities": 1.5,
+        "shareholders": 0.5,
+        "cash and cash equivalents": 1.0,
+        "borrowings": 1.0,
+        "loans": 0.5,
+        "total assets": 1.5,
+    },
+}
+
+NUMBER_TOKEN_RE = re.compile(r"^\(?-?[\d,]+(\.\d+)?\)?%?$")
+
+def score_window(text, mode):
+    """
+    Scores how likely a window is to hold the table the finder `mode` looks
+    for: weighted keyword hits plus the share of tokens that are numbers.
+    """
+    lowered = text.lower()
+    keyword_score = sum(weight for keyword, weight in PREFILTER_KEYWORDS.get(mode, {}).items() if keyword in lowered)
+
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    numeric_ratio = sum(1 for token in tokens if NUMBER_TOKEN_RE.match(token)) / len(tokens)
+    return keyword_score + PREFILTER_NUMBER_WEIGHT * numeric_ratio
+
+def rank_windows(pdf, windows, *modes):
+    """
+    Orders windows best-first by score_window and splits off those below
+    PREFILTER_MIN_SCORE. Returns (candidates, skipped), skipped in page order.
+    With several modes a window scores its best across them.
+    """
+    scores = {window: max(score_window(pdf.window(*window), mode) for mode in modes) for window in windows}
+    ranked = sorted(windows, key=lambda window: -scores[window])
+    candidates = [window for window in ranked if scores[window] >= PREFILTER_MIN_SCORE]
+    skipped = [window for window in windows if scores[window] < PREFILTER_MIN_SCORE]
+    return candidates, skipped
+
+# Batched finder: several labelled windows go into one request, up to this
+# many (estimated) tokens, and the model returns a verdict per window.
+FINDER_BATCH_TOKENS = int(os.getenv("FINDER_BATCH_TOKENS", "24000"))
+CHARS_PER_TOKEN = 4
+
+def pack_batches(pdf, windows, token_budget):
+    """Groups windows, keeping their order, into batches that fit token_budget."""
+    batches = []
+    current = []
+    current_tokens = 0
+    for window in windows:
+        window_tokens = len(pdf.window(*window)) // CHARS_PER_TOKEN + 1
+        if current and current_tokens + window_tokens > token_budget:
+            batches.append(tuple(current))
+            current = []
+            current_tokens = 0
+        current.append(window)
+        current_tokens += window_tokens
+    if current:
+        batches.append(tuple(current))
+    return batches
+
+def build_batch_text(pdf, batch):
+    parts = []
+    for number, (start_page, end_page) in enumerate(batch, 1):
+        header = f"=== WINDOW {number} (pages {start_page + 1}-{min(end_page, len(pdf))}) ==="
+        parts.append(header + "\n" + pdf.window(start_page, end_page))
+    return "\n\n".join(parts)
+
+def parse_batch_verdicts(response_text, batch_size):
+    """
+    Reads the batched finder's JSON. Returns {window_number: score} for the
+    windows marked YES, or None if the response cannot be used.
+    """
+    try:
+        verdicts = parse_ai_response(response_text, "find_batch").get("windows")
+    except Exception:
+        return None
+    if not isinstance(verdicts, list):
         return None
 
+    matches = {}
+    for verdict in verdicts:
+        if not isinstance(verdict, dict):
+            continue
+        try:
+            number = int(verdict.get("window"))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= batch_size or str(verdict.get("verdict", "")).strip().upper() != "YES":
+            continue
+        try:
+            matches[number] = float(verdict.get("score", 1.0))
+        except (TypeError, ValueError):
+            matches[number] = 1.0
+    return matches
 
-def process_file(file_path):
-    print("--- Starting File Processing (Base64 Mode) ---")
-    
-    total_pages = get_pdf_page_count(file_path)
+# Targets of the multi-label "find_both" finder used by the single-pass pipeline.
+FIND_TARGETS = ("summary", "balance_sheet")
+
+def parse_multi_verdicts(response_text, batch_size):
+    """
+    Reads the multi-label finder's JSON. Returns {target: {window_number:
+    score}} with the windows marked YES for each of FIND_TARGETS, or None if
+    the response cannot be used.
+    """
+    try:
+        verdicts = parse_ai_response(response_text, "find_both").get("windows")
+    except Exception:
+        return None
+    if not isinstance(verdicts, list):
+        return None
+
+    matches = {target: {} for target in FIND_TARGETS}
+    for verdict in verdicts:
+        if not isinstance(verdict, dict):
+            continue
+        try:
+            number = int(verdict.get("window"))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= batch_size:
+            continue
+        for target in FIND_TARGETS:
+            if str(verdict.get(target, "")).strip().upper() != "YES":
+                continue
+            try:
+                matches[target][number] = float(verdict.get(f"{target}_score", 1.0))
+            except (TypeError, ValueError):
+                matches[target][number] = 1.0
+    return matches
+
+def page_windows(total_pages, chunk_size, chunk_overlap):
+    return [(i, i + chunk_size) for i in range(0, total_pages, chunk_size - chunk_overlap)]
+
+def find_chunks_single_pass(pdf, chunk_size, chunk_overlap, label, windows=None, targets=FIND_TARGETS):
+    """
+    Walks page windows once, classifying each for every target in
+    FIND_TARGETS with the "find_both" prompt. Returns {target: (start_page,
+    end_page)} for the targets that were found. Windows are pre-filtered and
+    batched as in find_chunk, and the scan stops once each of `targets` has
+    a match; per target, the earliest-ranked matching batch wins. `windows`
+    limits the scan to those windows instead of the whole document.
+    """
+    total_pages = len(pdf)
+    if windows is None:
+        windows = page_windows(total_pages, chunk_size, chunk_overlap)
+    batch_order = {}
+    hits = {target: {} for target in FIND_TARGETS}
+    hits_lock = threading.Lock()
+    stage_span = telemetry.current_span()
+
+    def classify(batch):
+        try:
+            batch_text = build_batch_text(pdf, batch)
+        except Exception as e:
+            print(f"Error reading PDF chunks for batch in {pdf.file_path}: {e}")
+            return None
+        response_text = call_ai_agent(batch_text, "find_both")
+        if not response_text or response_text.strip().startswith('{"error"'):
+            return None
+        return parse_multi_verdicts(response_text, len(batch))
+
+    def check_batch(batch):
+        with telemetry.span("finder_batch", kind="window", parent=stage_span, prompt_type="find_both", windows=len(batch)) as window_span:
+            pages = ", ".join(f"{start_page + 1}-{min(end_page, total_pages)}" for start_page, end_page in batch)
+            window_span.set(pages=pages)
+            print(f"  [{label}] Analyzing {len(batch)} window(s) for both targets (pages {pages})...")
+            verdicts = classify(batch)
+
+            if verdicts is None and len(batch) > 1:
+                print(f"  [{label}] Batch response unusable, checking its windows one by one.")
+                verdicts = {target: {} for target in FIND_TARGETS}
+                for number, window in enumerate(batch, 1):
+                    single = classify((window,)) or {}
+                    for target, matches in single.items():
+                        if matches:
+                            verdicts[target][number] = matches[1]
+            if verdicts is None:
+                print(f"  [{label}] AI Agent returned an unusable response for pages {pages}.")
+                return False
+
+            print(f"  [{label}] Verdicts (window: score): {verdicts}")
+            window_span.set(matches={target: len(matches) for target, matches in verdicts.items()})
+            with hits_lock:
+                for target, matches in verdicts.items():
+                    if matches:
+                        # Highest score wins; ties go to the earlier (better-ranked) window.
+                        best_number = max(matches, key=lambda number: (matches[number], -number))
+                        hits[target][batch_order[batch]] = batch[best_number - 1]
+                return all(hits[target] for target in targets)
+
+    scan_passes = [windows]
+    if FINDER_PREFILTER:
+        candidates, skipped = rank_windows(pdf, windows, "find", "find_balance_sheet")
+        print(f"  [{label}] Pre-filter kept {len(candidates)} of {len(windows)} windows.")
+        # Skipped windows are only checked if a target is still missing.
+        scan_passes = [candidates, skipped]
+
+    for pass_windows in scan_passes:
+        batches = pack_batches(pdf, pass_windows, FINDER_BATCH_TOKENS)
+        for batch in batches:
+            batch_order[batch] = len(batch_order)
+        scan_windows(batches, check_batch, max_workers=FINDER_CONCURRENCY)
+        if all(hits[target] for target in targets):
+            break
+
+    return {target: target_hits[min(target_hits)] for target, target_hits in hits.items() if target_hits}
+
+def find_chunk(pdf, chunk_size, chunk_overlap, mode, label):
+    """
+    Scans page windows concurrently with the finder prompt `mode` and
+    returns (start_page, end_page, text) of the first window the agent says
+    YES to, or None. With the pre-filter on, windows are checked best-score
+    first; otherwise in page order. With batching on, windows are sent in
+    batches and the best-scoring YES of the first matching batch wins.
+    """
+    total_pages = len(pdf)
+    windows = page_windows(total_pages, chunk_size, chunk_overlap)
+    texts = {}
+    batch_choices = {}
+    stage_span = telemetry.current_span()
+
+    def check_window(window):
+        with telemetry.span("finder_window", kind="window", parent=stage_span, prompt_type=mode, windows=1) as window_span:
+            start_page, end_page = window
+            window_span.set(pages=f"{start_page + 1}-{min(end_page, total_pages)}")
+            print(f"  [{label}] Analyzing pages {start_page + 1}-{min(end_page, total_pages)}...")
+
+            try:
+                text_chunk = pdf.window(start_page, end_page)
+            except Exception as e:
+                print(f"Error reading PDF chunk {pdf.file_path} (Pages {start_page}-{end_page}): {e}")
+                return False
+            if not text_chunk: return False
+
+            finder_response_raw = call_ai_agent(text_chunk, mode)
+            if not finder_response_raw or finder_response_raw.strip().startswith('{"error"'):
+                print(f"  [{label}] AI Agent returned an error for pages {start_page + 1}-{min(end_page, total_pages)}: {(finder_response_raw or '').strip()}")
+                return False
+
+            finder_response = finder_response_raw.strip().upper()
+            print(f"  [{label}] Response for pages {start_page + 1}-{min(end_page, total_pages)}: {finder_response}")
+            window_span.set(verdict="YES" if "YES" in finder_response else "NO")
+            if "YES" in finder_response:
+                texts[window] = text_chunk
+                return True
+            return False
+
+    def check_batch(batch):
+        if len(batch) == 1:
+            if check_window(batch[0]):
+                batch_choices[batch] = batch[0]
+                return True
+            return False
+
+        with telemetry.span("finder_batch", kind="window", parent=stage_span, prompt_type=f"{mode}_batch", windows=len(batch)) as window_span:
+            pages = ", ".join(f"{start_page + 1}-{min(end_page, total_pages)}" for start_page, end_page in batch)
+            window_span.set(pages=pages)
+            print(f"  [{label}] Analyzing {len(batch)} windows in one request (pages {pages})...")
+            try:
+                batch_text = build_batch_text(pdf, batch)
+            except Exception as e:
+                print(f"Error reading PDF chunks for batch in {pdf.file_path}: {e}")
+                return False
+
+            response_text = call_ai_agent(batch_text, f"{mode}_batch")
+            verdicts = None
+            if response_text and not response_text.strip().startswith('{"error"'):
+                verdicts = parse_batch_verdicts(response_text, len(batch))
+
+            if verdicts is None:
+                print(f"  [{label}] Batch response unusable, checking its windows one by one.")
+                for window in batch:
+                    if check_window(window):
+                        batch_choices[batch] = window
+                        return True
+                return False
+
+            print(f"  [{label}] Batch verdicts (window: score): {verdicts or 'all NO'}")
+            window_span.set(matches=len(verdicts))
+            if not verdicts:
+                return False
+            # Highest score wins; ties go to the earlier (better-ranked) window.
+            best_number = max(verdicts, key=lambda number: (verdicts[number], -number))
+            window = batch[best_number - 1]
+            texts[window] = pdf.window(*window)
+            batch_choices[batch] = window
+            return True
+
+    scan_passes = [windows]
+    if FINDER_PREFILTER:
+        candidates, skipped = rank_windows(pdf, windows, mode)
+        print(f"  [{label}] Pre-filter kept {len(candidates)} of {len(windows)} windows.")
+        # Skipped windows are only checked if no candidate matched.
+        scan_passes = [candidates, skipped]
+
+    for pass_windows in scan_passes:
+        if FINDER_BATCH_TOKENS > 0:
+            batches = pack_batches(pdf, pass_windows, FINDER_BATCH_TOKENS)
+            found_index = scan_windows(batches, check_batch, max_workers=FINDER_CONCURRENCY)
+            found_window = batch_choices[batches[found_index]] if found_index is not None else None
+        else:
+            found_index = scan_windows(pass_windows, check_window, max_workers=FINDER_CONCURRENCY)
+            found_window = pass_windows[found_index] if found_index is not None else None
+
+        if found_window:
+            start_page, end_page = found_window
+            return start_page, end_page, texts[found_window]
+
+    return None
+
+
+def report_progress(progress, stage, fraction):
+    """Passes stage/progress to the caller's callback, if it gave one."""
+    if not progress:
+        return
+    try:
+        progress(stage, fraction)
+    except Exception as e:
+        print(f"  [Processor] Progress callback failed: {e}")
+
+def process_file(file_path, progress=None):
+    """
+    Runs the full ingest for one PDF. `progress`, if given, is called as
+    progress(stage, fraction) as the pipeline moves through its stages.
+    """
+    print(f"--- Starting File Processing ({AI_TRANSPORT} transport) ---")
+
+    with telemetry.trace(file=os.path.basename(file_path), pipeline=PIPELINE_MODE) as ingest_trace:
+        report_progress(progress, "opening", 0.0)
+        try:
+            with telemetry.span("open_pdf", kind="stage"):
+                pdf = PdfDocument(file_path)
+        except Exception as e:
+            print(f"Error opening PDF {file_path}: {e}")
+            return False
+
+        cache = get_response_cache()
+        cache_stats_start = cache.stats() if cache else None
+        try:
+            with pdf:
+                return process_document(pdf, progress)
+        finally:
+            if cache:
+                cache_stats = cache.stats()
+                hits = cache_stats["hits"] - cache_stats_start["hits"]
+                misses = cache_stats["misses"] - cache_stats_start["misses"]
+                print(f"\n[Cache] This run: {hits} hits, {misses} misses.")
+            timings = ingest_trace.breakdown()
+            print(f"[Telemetry] Stage timings (ms): {timings['stages_ms']}")
+            if ingest_trace.attributes.get("document_id"):
+                save_timings(ingest_trace.attributes["document_id"], timings)
+
+# Finder window sizes in pages, and the overlap between neighbouring windows.
+SUMMARY_CHUNK_SIZE = 3
+BALANCE_SHEET_CHUNK_SIZE = 10
+CHUNK_OVERLAP = 1
+
+# "single_pass" classifies every window for both targets in one walk of the
+# document and extracts both concurrently; "two_stage" is the original
+# summary-then-balance-sheet workflow with a finder pass per stage.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "single_pass")
+
+def extract_summary(text_chunk, stage="Stage 1"):
+    """Runs the summary extractor on a chunk. Returns the parsed JSON or None."""
+    with telemetry.span("extract_summary", kind="stage"):
+        print("\n  [Extractor] Sending summary chunk to Extractor...")
+        extractor_response_text = call_ai_agent(text_chunk, "extract")
+
+        if not extractor_response_text or extractor_response_text.strip().startswith('{"error"'):
+            print(f"\nError: [{stage}] Failed to extract summary: {extractor_response_text}")
+            return None
+
+        print(f"  [Extractor] AI Raw Response:\n{extractor_response_text}")
+
+        try:
+            base_document = parse_ai_response(extractor_response_text, "extract")
+            print("Successfully parsed summary JSON.")
+        except Exception as e:
+            print(f"Error: [{stage}] Failed to parse summary JSON: {e}")
+            return None
+
+        if not base_document.get("bank_name"):
+            print(f"Error: [{stage}] Summary JSON has no 'bank_name'. Aborting.")
+            return None
+        return base_document
+
+def extract_balance_sheet(text_chunk, stage="Stage 2"):
+    """Runs the balance sheet extractor on a chunk. Returns the parsed JSON or None."""
+    with telemetry.span("extract_balance_sheet", kind="stage"):
+        print("\n  [BS Extractor] Sending balance sheet chunk to Extractor...")
+        bs_extractor_response_text = call_ai_agent(text_chunk, "extract_balance_sheet")
+
+        if not bs_extractor_response_text or bs_extractor_response_text.strip().startswith('{"error"'):
+            print(f"\nError: [{stage}] Failed to extract balance sheet: {bs_extractor_response_text}")
+            return None
+
+        print(f"  [BS Extractor] AI Raw Response:\n{bs_extractor_response_text}")
+
+        try:
+            detailed_data = parse_ai_response(bs_extractor_response_text, "extract_balance_sheet")
+            print("Successfully parsed detailed balance sheet JSON.")
+            return detailed_data
+        except Exception as e:
+            print(f"Error: [{stage}] Failed to parse detailed JSON: {e}")
+            return None
+
+EXTRACTORS = {"summary": extract_summary, "balance_sheet": extract_balance_sheet}
+
+# Extractors are sent only the tables of their window (see table_extractor.py)
+# when those hold at least TABLE_MIN_AMOUNT_SHARE of the window's amounts;
+# otherwise, e.g. for highlights written as prose, the window's full text.
+TABLE_EXTRACTION = os.getenv("TABLE_EXTRACTION", "1") == "1"
+TABLE_MIN_AMOUNT_SHARE = float(os.getenv("TABLE_MIN_AMOUNT_SHARE", "0.5"))
+AMOUNT_RE = re.compile(r"\d[\d,]*[.,]\d+")
+
+def extraction_text(pdf, window):
+    """The extractor input for a (start_page, end_page) window: its tables, or its full text."""
+    text = pdf.window(*window)
+    if not TABLE_EXTRACTION:
+        return text
+    pages = f"{window[0] + 1}-{min(window[1], len(pdf))}"
+    tables = pdf.table_window(*window)
+    amounts = AMOUNT_RE.findall(text)
+    if not tables or not amounts:
+        return text
+    in_tables = set(AMOUNT_RE.findall(tables))
+    share = sum(1 for amount in amounts if amount in in_tables) / len(amounts)
+    if share < TABLE_MIN_AMOUNT_SHARE:
+        print(f"  [Tables] Tables in pages {pages} hold {share:.0%} of their amounts; sending the full text.")
+        return text
+    tables = table_extractor.TABLE_TEXT_NOTE + tables
+    print(f"  [Tables] Sending the tables of pages {pages}: "
+          f"{telemetry.estimate_tokens(tables)} instead of {telemetry.estimate_tokens(text)} tokens.")
+    return tables
+
+def extract_checked(section, text_chunk, stage):
+    """
+    Extracts "summary" or "balance_sheet" from a window, then normalizes and
+    checks the values (see validation.py). If a check fails, the same window
+    is extracted once more with the failures named in the input, and the
+    result failing fewer checks is kept. Returns (extracted, issues);
+    issues is None when validation is off.
+    """
+    extract = EXTRACTORS[section]
+    extracted = extract(text_chunk, stage)
+    if extracted is None or not validation.VALIDATION_ENABLED:
+        return extracted, None
+
+    extracted, issues = validation.check_section(section, extracted)
+    if issues and validation.VALIDATION_REEXTRACT:
+        print(f"  [Validation] {section} failed {', '.join(issues)}. Re-extracting its pages...")
+        with telemetry.span("reextract", kind="stage", section=section, issues=len(issues)):
+            retry = extract(validation.reextract_hint(issues) + text_chunk, stage)
+        if retry is not None:
+            retry, retry_issues = validation.check_section(section, retry)
+            if len(retry_issues) < len(issues):
+                extracted, issues = retry, retry_issues
+    if issues:
+        print(f"  [Validation] Warning: {section} saved with failed checks: {', '.join(issues)}")
+    return extracted, issues
+
+def process_document(pdf, progress=None):
+    """
+    Runs the find/extract workflow selected by PIPELINE_MODE over an open
+    PdfDocument. All finder and extractor calls share its page cache, so no
+    page is extracted twice.
+    """
+    total_pages = len(pdf)
     if total_pages == 0: return False
-    print(f"File has {total_pages} pages. Starting agent workflow...")
+    print(f"File has {total_pages} pages. Starting agent workflow ({PIPELINE_MODE})...")
+
+    existing = find_processed_report(pdf)
+    if existing:
+        print(f"--- Already ingested as report {existing['_id']} ({existing.get('bank_name')}); skipping. ---")
+        return True
+
+    # Large documents: extract page text ahead on a process pool while the
+    # workflow reads pages as they arrive.
+    pdf.prefetch()
+
+    # A new version of a stored report updates it, even when its changes
+    # call for the full workflow.
+    previous = None
+    if reingest.REINGEST_ENABLED:
+        match = match_previous_version(pdf)
+        if match:
+            previous, overlap = match
+            result = process_reingest(pdf, previous, overlap, progress)
+            if result is not None:
+                return result
+
+    if PIPELINE_MODE == "two_stage":
+        return process_two_stage(pdf, progress, previous)
+    return process_single_pass(pdf, progress, previous)
+
+def find_processed_report(pdf):
+    """The stored report ingested from a byte-identical file, if any."""
+    try:
+        return db.get_reports_collection().find_one({"content_hashes": pdf.sha256()}, {"bank_name": 1})
+    except Exception as e:
+        print(f"  [Dedup] Could not look up the file hash: {e}")
+        return None
+
+def fingerprint_fields(pdf, summary_window, previous=None):
+    """
+    What a new report stores so that later versions can be matched against
+    it. A report replacing `previous`, its stored earlier version, keeps
+    that version's file hashes and counts one more revision.
+    """
+    fields = {
+        "content_hashes": [pdf.sha256()],
+        "page_fingerprints": pdf.fingerprints(),
+        "source_pages": {"summary": [summary_window[0], min(summary_window[1], len(pdf))]},
+    }
+    if previous:
+        previous_hashes = [content_hash for content_hash in previous.get("content_hashes") or [] if content_hash != pdf.sha256()]
+        fields["content_hashes"] = previous_hashes + fields["content_hashes"]
+        fields["revision"] = previous.get("revision", 0) + 1
+    return fields
+
+def validation_fields(section, issues, update=False):
+    """The failed checks to store with a report, as a new document's field or a $set."""
+    if issues is None:
+        return {}
+    if update:
+        return {f"validation.{section}": issues}
+    return {"validation": {section: issues}}
+
+def match_previous_version(pdf):
+    """(stored report, page overlap) for the earlier version of this upload, or None."""
+    with telemetry.span("match_previous_version", kind="stage"):
+        try:
+            return reingest.find_previous_version(db.get_reports_collection(), pdf.fingerprints())
+        except Exception as e:
+            print(f"  [Reingest] Could not look up earlier versions: {e}")
+            return None
+
+def process_reingest(pdf, previous, overlap, progress=None):
+    """
+    Handles an upload that is a new version of `previous`, a stored report
+    sharing `overlap` of its pages. Summary and balance sheet pages that are
+    unchanged, even if moved, keep their stored extraction; otherwise only
+    the windows around changed pages are scanned again, and the stored
+    report is updated in place. A report stored without a balance sheet is
+    only searched for one among the changed pages. Returns None when the
+    changes call for the full workflow.
+    """
+    total_pages = len(pdf)
+    fingerprints = pdf.fingerprints()
+    old_fingerprints = previous["page_fingerprints"]
+    source_pages = previous.get("source_pages") or {}
+    if not source_pages.get("summary"):
+        return None
+
+    changed = reingest.changed_pages(old_fingerprints, fingerprints)
+    print(f"\n--- REINGEST: Matches report {previous['_id']} ({overlap:.0%} of pages shared, {len(changed)} changed page(s)) ---")
+
+    summary_window = reingest.locate_window(old_fingerprints, source_pages["summary"], fingerprints)
+    rescan = [] if summary_window else ["summary"]
+    had_balance_sheet = bool(source_pages.get("balance_sheet"))
+    balance_sheet_window = None
+    if had_balance_sheet:
+        balance_sheet_window = reingest.locate_window(old_fingerprints, source_pages["balance_sheet"], fingerprints)
+        if balance_sheet_window is None:
+            rescan.append("balance_sheet")
+    elif changed:
+        rescan.append("balance_sheet")
+
+    found = {}
+    if rescan and changed:
+        windows = reingest.affected_windows(page_windows(total_pages, SUMMARY_CHUNK_SIZE, CHUNK_OVERLAP), changed)
+        print(f"  [Reingest] Re-scanning {len(windows)} window(s) around changed pages for: {', '.join(rescan)}.")
+        report_progress(progress, "finding", 0.05)
+        with telemetry.span("find_both", kind="stage"):
+            found = find_chunks_single_pass(pdf, SUMMARY_CHUNK_SIZE, CHUNK_OVERLAP, "Reingest Finder", windows=windows, targets=rescan)
+
+    summary_changed = "summary" in rescan
+    if summary_changed:
+        if "summary" not in found:
+            print("  [Reingest] Summary pages changed and were not found near the changes; running the full workflow.")
+            return None
+        summary_window = found["summary"]
+    balance_sheet_changed = "balance_sheet" in found
+    if had_balance_sheet and "balance_sheet" in rescan and not balance_sheet_changed:
+        # Keeping the stored extraction would pair it with the new pages.
+        print("  [Reingest] Balance sheet pages changed and were not found near the changes; running the full workflow.")
+        return None
+    if balance_sheet_changed:
+        start_page = found["balance_sheet"][0]
+        balance_sheet_window = (start_page, min(start_page + BALANCE_SHEET_CHUNK_SIZE, total_pages))
+
+    base_document = detailed_data = summary_issues = balance_sheet_issues = None
+    if summary_changed or balance_sheet_changed:
+        report_progress(progress, "extracting", 0.5)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            summary_future = balance_sheet_future = None
+            if summary_changed:
+                summary_future = executor.submit(telemetry.in_current_trace(extract_checked), "summary", extraction_text(pdf, summary_window), "Reingest")
+            if balance_sheet_changed:
+                balance_sheet_future = executor.submit(telemetry.in_current_trace(extract_checked), "balance_sheet", extraction_text(pdf, balance_sheet_window), "Reingest")
+            base_document, summary_issues = summary_future.result() if summary_future else (None, None)
+            detailed_data, balance_sheet_issues = balance_sheet_future.result() if balance_sheet_future else (None, None)
+        if (summary_changed and base_document is None) or (balance_sheet_changed and detailed_data is None):
+            return False
+
+    updates = {
+        "page_fingerprints": fingerprints,
+        "source_pages.summary": [summary_window[0], min(summary_window[1], total_pages)],
+    }
+    if balance_sheet_window:
+        updates["source_pages.balance_sheet"] = [balance_sheet_window[0], min(balance_sheet_window[1], total_pages)]
+    if base_document:
+        base_document.update(bank_name_fields(base_document["bank_name"]))
+        updates.update(base_document)
+        updates.update(validation_fields("summary", summary_issues, update=True))
+    if detailed_data is not None:
+        updates["balance_sheet"] = detailed_data
+        updates.update(validation_fields("balance_sheet", balance_sheet_issues, update=True))
+
+    report_progress(progress, "saving_summary", 0.9)
+    with telemetry.span("save_to_db", kind="stage", update=True) as save_span:
+        try:
+            db.check_health()
+            reports = db.get_reports_collection()
+            reports.update_one({"_id": previous["_id"]}, {"$set": updates, "$inc": {"revision": 1}, "$addToSet": {"content_hashes": pdf.sha256()}})
+            analytics.refresh_report(previous["_id"], reports)
+        except Exception as e:
+            print(f"MongoDB update failed: {e}")
+            save_span.set(error=str(e))
+            return False
+    ingest_trace = telemetry.current_trace()
+    if ingest_trace:
+        ingest_trace.attributes["document_id"] = previous["_id"]
+
+    reused = [target for target, stored in (("summary", True), ("balance_sheet", had_balance_sheet)) if stored and target not in rescan]
+    reextracted = [target for target, changed_target in (("summary", summary_changed), ("balance_sheet", balance_sheet_changed)) if changed_target]
+    print(f"\n--- Process Finished Successfully (Reingest): reused {', '.join(reused) or 'nothing'}, "
+          f"re-extracted {', '.join(reextracted) or 'nothing'} ---")
+    return True
+
+def process_single_pass(pdf, progress=None, previous=None):
+    """
+    Finds the summary and the balance sheet in one walk of the document,
+    then extracts both at the same time. The summary is saved first and the
+    balance sheet added to it, as in the two-stage workflow. The report
+    replaces `previous`, its stored earlier version, if given.
+    """
+    total_pages = len(pdf)
+
+    print("\n--- SINGLE PASS: Finding Summary and Balance Sheet ---")
+    report_progress(progress, "finding", 0.05)
+    with telemetry.span("find_both", kind="stage"):
+        found = find_chunks_single_pass(pdf, SUMMARY_CHUNK_SIZE, CHUNK_OVERLAP, "Finder")
+
+    if "summary" not in found:
+        print("\nError: [Single Pass] Could not find summary. Aborting.")
+        return False
+    summary_window = found["summary"]
+    print(f"  [Finder] Found potential summary in pages {summary_window[0] + 1}-{min(summary_window[1], total_pages)}.")
+
+    # The finder flags where the balance sheet starts; extract the usual
+    # larger window from there, since the statement runs over several pages.
+    balance_sheet_window = None
+    if "balance_sheet" in found:
+        start_page = found["balance_sheet"][0]
+        balance_sheet_window = (start_page, start_page + BALANCE_SHEET_CHUNK_SIZE)
+        print(f"  [Finder] Found potential Balance Sheet in pages {start_page + 1}-{min(balance_sheet_window[1], total_pages)}.")
+
+    report_progress(progress, "extracting", 0.5)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summary_future = executor.submit(telemetry.in_current_trace(extract_checked), "summary", extraction_text(pdf, summary_window), "Single Pass")
+        balance_sheet_future = None
+        if balance_sheet_window:
+            balance_sheet_future = executor.submit(telemetry.in_current_trace(extract_checked), "balance_sheet", extraction_text(pdf, balance_sheet_window), "Single Pass")
+        base_document, summary_issues = summary_future.result()
+        detailed_data, balance_sheet_issues = balance_sheet_future.result() if balance_sheet_future else (None, None)
+
+    if base_document is None:
+        return False
+
+    bank_name = base_document["bank_name"]
+    report_progress(progress, "saving_summary", 0.9)
+    extra_fields = fingerprint_fields(pdf, summary_window, previous)
+    extra_fields.update(validation_fields("summary", summary_issues))
+    new_document_id = save_to_db(base_document, bank_name, document_id=None, extra_fields=extra_fields,
+                                 replace_id=previous["_id"] if previous else None)
+    if not new_document_id:
+        print("Error: [Single Pass] Failed to save base document to MongoDB. Aborting.")
+        return False
+
+    if not balance_sheet_window:
+        print("\nWarning: [Single Pass] Could not find detailed Balance Sheet. Process finished with summary data only.")
+        return True
+    if detailed_data is None:
+        return False
+
+    report_progress(progress, "saving_balance_sheet", 0.95)
+    save_to_db(detailed_data, bank_name, document_id=new_document_id, extra_fields={
+        "source_pages.balance_sheet": [balance_sheet_window[0], min(balance_sheet_window[1], total_pages)],
+        **validation_fields("balance_sheet", balance_sheet_issues, update=True),
+    })
+    print("\n--- Process Finished Successfully (Single Pass) ---")
+    return True
+
+def process_two_stage(pdf, progress=None, previous=None):
+    """
+    The original workflow: find and extract the summary, then the balance
+    sheet. The report replaces `previous`, its stored earlier version, if given.
+    """
+    total_pages = len(pdf)
 
-    CHUNK_SIZE = 3
-    CHUNK_OVERLAP = 1
-    API_COOLDOWN = 3
-    
     print("\n--- STAGE 1: Finding Summary ---")
+    report_progress(progress, "finding_summary", 0.05)
     found_chunk = None
-    for i in range(0, total_pages, CHUNK_SIZE - CHUNK_OVERLAP):
-        start_page = i
-        end_page = i + CHUNK_SIZE
-        print(f"  [Finder] Analyzing pages {start_page + 1}-{min(end_page, total_pages)}...")
-        
-        text_chunk = get_text_from_file_chunk(file_path, start_page, end_page)
-        if not text_chunk: continue
-            
-        finder_response_raw = call_ai_agent(text_chunk, "find")
-        if not finder_response_raw or finder_response_raw.strip().startswith('{"error"'):
-            print(f"  [Finder] AI Agent returned an error: {finder_response_raw.strip()}")
-            time.sleep(API_COOLDOWN)
-            continue
-            
-        finder_response = finder_response_raw.strip().upper()
-        print(f"  [Finder] Response: {finder_response}")
-        if "YES" in finder_response:
-            print(f"  [Finder] Found potential summary in pages {start_page + 1}-{min(end_page, total_pages)}.")
-            found_chunk = text_chunk
-            break 
-        
-        print(f"  [Cooldown] Waiting {API_COOLDOWN} seconds...")
-        time.sleep(API_COOLDOWN)
+    with telemetry.span("find_summary", kind="stage"):
+        found = find_chunk(pdf, SUMMARY_CHUNK_SIZE, CHUNK_OVERLAP, "find", "Finder")
+    if found:
+        start_page, end_page, found_chunk = found
+        print(f"  [Finder] Found potential summary in pages {start_page + 1}-{min(end_page, total_pages)}.")
     
     if not found_chunk:
         print("\nError: [Stage 1] Could not find summary. Aborting.")
         return False
         
-    print("\n  [Extractor] Sending summary chunk to Extractor...")
-    extractor_response_text = call_ai_agent(found_chunk, "extract")
-    
-    if not extractor_response_text or extractor_response_text.strip().startswith('{"error"}'):
-        print(f"\nError: [Stage 1] Failed to extract summary: {extractor_response_text}")
-        return False
-        
-    print(f"  [Extractor] AI Raw Response:\n{extractor_response_text}")
-    
-    base_document = None
-    try:
-        cleaned_json = clean_ai_response(extractor_response_text)
-        base_document = json.loads(cleaned_json)
-        print("Successfully parsed summary JSON.")
-    except Exception as e:
-        print(f"Error: [Stage 1] Failed to parse summary JSON: {e}")
+    report_progress(progress, "extracting_summary", 0.35)
+    summary_window = (start_page, end_page)
+    base_document, summary_issues = extract_checked("summary", extraction_text(pdf, summary_window), "Stage 1")
+    if base_document is None:
         return False
 
-    bank_name = base_document.get("bank_name")
-    if not bank_name:
-        print("Error: [Stage 1] Summary JSON has no 'bank_name'. Aborting.")
-        return False
-        
-    new_document_id = save_to_db(base_document, bank_name, document_id=None)
+    bank_name = base_document["bank_name"]
+    report_progress(progress, "saving_summary", 0.45)
+    extra_fields = fingerprint_fields(pdf, summary_window, previous)
+    extra_fields.update(validation_fields("summary", summary_issues))
+    new_document_id = save_to_db(base_document, bank_name, document_id=None, extra_fields=extra_fields,
+                                 replace_id=previous["_id"] if previous else None)
     if not new_document_id:
         print("Error: [Stage 1] Failed to save base document to MongoDB. Aborting.")
         return False
         
     print("\n--- STAGE 2: Finding Full Balance Sheet ---")
-    BALANCE_SHEET_CHUNK_SIZE = 10 
+    report_progress(progress, "finding_balance_sheet", 0.5)
     found_balance_sheet_chunk = None
-
-    for i in range(0, total_pages, BALANCE_SHEET_CHUNK_SIZE - CHUNK_OVERLAP):
-        start_page = i
-        end_page = i + BALANCE_SHEET_CHUNK_SIZE
-        print(f"  [BS Finder] Analyzing pages {start_page + 1}-{min(end_page, total_pages)}...")
-        
-        text_chunk = get_text_from_file_chunk(file_path, start_page, end_page)
-        if not text_chunk: continue
-        
-        finder_response_raw = call_ai_agent(text_chunk, "find_balance_sheet")
-        if not finder_response_raw or finder_response_raw.strip().startswith('{"error"'):
-            print(f"  [BS Finder] AI Agent returned an error: {finder_response_raw.strip()}")
-            time.sleep(API_COOLDOWN)
-            continue
-            
-        finder_response = finder_response_raw.strip().upper()
-        print(f"  [BS Finder] Response: {finder_response}")
-        if "YES" in finder_response:
-            print(f"  [BS Finder] Found potential Balance Sheet in pages {start_page + 1}-{min(end_page, total_pages)}.")
-            found_balance_sheet_chunk = text_chunk
-            break 
-        
-        print(f"  [Cooldown] Waiting {API_COOLDOWN} seconds...")
-        time.sleep(API_COOLDOWN)
+    with telemetry.span("find_balance_sheet", kind="stage"):
+        found = find_chunk(pdf, BALANCE_SHEET_CHUNK_SIZE, CHUNK_OVERLAP, "find_balance_sheet", "BS Finder")
+    if found:
+        start_page, end_page, found_balance_sheet_chunk = found
+        print(f"  [BS Finder] Found potential Balance Sheet in pages {start_page + 1}-{min(end_page, total_pages)}.")
 
     if not found_balance_sheet_chunk:
         print("\nWarning: [Stage 2] Could not find detailed Balance Sheet. Process finished with summary data only.")
         return True 
 
-    print("\n  [BS Extractor] Sending balance sheet chunk to Extractor...")
-    bs_extractor_response_text = call_ai_agent(found_balance_sheet_chunk, "extract_balance_sheet")
-
-    if not bs_extractor_response_text or bs_extractor_response_text.strip().startswith('{"error"}'):
-        print(f"\nError: [Stage 2] Failed to extract balance sheet: {bs_extractor_response_text}")
+    report_progress(progress, "extracting_balance_sheet", 0.8)
+    detailed_data, balance_sheet_issues = extract_checked("balance_sheet", extraction_text(pdf, (start_page, end_page)), "Stage 2")
+    if detailed_data is None:
         return False
 
-    print(f"  [BS Extractor] AI Raw Response:\n{bs_extractor_response_text}")
-
     try:
-        cleaned_json = clean_ai_response(bs_extractor_response_text)
-        detailed_data = json.loads(cleaned_json)
-        print("Successfully parsed detailed balance sheet JSON.")
-        
-        save_to_db(detailed_data, bank_name, document_id=new_document_id)
+        report_progress(progress, "saving_balance_sheet", 0.95)
+        save_to_db(detailed_data, bank_name, document_id=new_document_id, extra_fields={
+            "source_pages.balance_sheet": [start_page, min(end_page, total_pages)],
+            **validation_fields("balance_sheet", balance_sheet_issues, update=True),
+        })
         print("\n--- Process Finished Successfully (Two-Stage) ---")
         return True
 
     except Exception as e:
-        print(f"Error: [Stage 2] Failed to parse or save detailed JSON: {e}")
+        print(f"Error: [Stage 2] Failed to save detailed JSON: {e}")
         return False
 
 
 if __name__ == "__main__":
-    print("--- Running in Test Mode (Base64 Mode) ---")
+    print(f"--- Running in Test Mode ({AI_TRANSPORT} transport) ---")
     
     test_file = "uploads/download2.pdf"
     
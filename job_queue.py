@@ -0,0 +1,268 @@
+import argparse
+import atexit
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+import uuid
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("jobs", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Seconds a stopping worker gets to finish its job before it is terminated
+# (the job is re-queued when workers next start).
+JOB_SHUTDOWN_TIMEOUT = float(os.getenv("JOB_SHUTDOWN_TIMEOUT", "30"))
+
+JOB_FIELDS = (
+    "id", "file_path", "filename", "status", "stage", "progress", "message",
+    "created_at", "started_at", "finished_at", "worker_pid", "content_hash"
+)
+
+
+def connect():
+    directory = os.path.dirname(JOB_DB_PATH)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db():
+    conn = connect()
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_pid INTEGER,
+                content_hash TEXT
+            )
+        """)
+        # Queues created before uploads were content-addressed lack the column.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "content_hash" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash, status)")
+    finally:
+        conn.close()
+
+
+def enqueue_job(file_path, filename, content_hash=None):
+    """Adds a file to the queue and returns its job ID straight away."""
+    job_id, _ = enqueue_unique_job(file_path, filename, content_hash)
+    return job_id
+
+
+def enqueue_unique_job(file_path, filename, content_hash=None):
+    """
+    Like enqueue_job, but if a job for the same content_hash is already
+    queued or running, returns that job instead of adding another.
+    Returns (job_id, created).
+    """
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if content_hash:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE content_hash = ? AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                print(f"[Jobs] {file_path} is already being processed by job {row[0]}")
+                return row[0], False
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, file_path, filename, status, stage, progress, created_at, content_hash) "
+            "VALUES (?, ?, ?, 'queued', 'queued', 0, ?, ?)",
+            (job_id, file_path, filename, time.time(), content_hash)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    print(f"[Jobs] Queued job {job_id} for {file_path}")
+    return job_id, True
+
+
+def get_job(job_id):
+    conn = connect()
+    try:
+        row = conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(zip(JOB_FIELDS, row)) if row else None
+
+
+def claim_next_job(worker_pid):
+    """Atomically moves the oldest queued job to 'running' and returns it."""
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if not row:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', stage = 'starting', started_at = ?, worker_pid = ? WHERE id = ?",
+            (time.time(), worker_pid, row[0])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return get_job(row[0])
+
+
+def update_job(job_id, **fields):
+    if not fields:
+        return
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn = connect()
+    try:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        conn.close()
+
+
+def worker_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def requeue_interrupted_jobs():
+    """Puts jobs left 'running' by a worker that has since died back in the queue."""
+    conn = connect()
+    try:
+        running = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        interrupted = [(job_id,) for job_id, pid in running if not worker_alive(pid)]
+        conn.executemany(
+            "UPDATE jobs SET status = 'queued', stage = 'queued', progress = 0, worker_pid = NULL WHERE id = ?",
+            interrupted
+        )
+        if interrupted:
+            print(f"[Jobs] Re-queued {len(interrupted)} interrupted job(s).")
+    finally:
+        conn.close()
+
+
+def run_job(job):
+    from ingest_processor import process_file
+
+    job_id = job["id"]
+
+    def report_progress(stage, progress):
+        update_job(job_id, stage=stage, progress=progress)
+
+    print(f"[Jobs] Worker {os.getpid()} processing job {job_id} ({job['file_path']})")
+    try:
+        success = process_file(job["file_path"], progress=report_progress)
+    except Exception as e:
+        print(f"[Jobs] Job {job_id} raised an error: {e}")
+        update_job(job_id, status="failed", message=str(e), finished_at=time.time())
+        return
+
+    if success:
+        update_job(job_id, status="done", stage="done", progress=1.0, finished_at=time.time())
+    else:
+        update_job(job_id, status="failed", message="Processing failed. Check the worker log.", finished_at=time.time())
+
+
+def worker_loop(stop_event=None, poll_interval=JOB_POLL_INTERVAL):
+    """Claims and runs queued jobs one at a time until stop_event is set."""
+    try:
+        while stop_event is None or not stop_event.is_set():
+            job = claim_next_job(os.getpid())
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            run_job(job)
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; the parent stops the workers.
+        pass
+    finally:
+        pdf_document = sys.modules.get("pdf_document")
+        if pdf_document:
+            pdf_document.shutdown_page_pool()
+
+
+def start_workers(count=JOB_WORKERS):
+    """
+    Starts `count` worker processes running worker_loop and returns
+    (processes, stop_event). The workers are not daemons, so that they can
+    extract large PDFs on a process pool of their own (see
+    pdf_document.py); they are stopped with stop_workers, which also runs
+    when the caller exits.
+    """
+    init_db()
+    requeue_interrupted_jobs()
+
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    processes = []
+    for _ in range(count):
+        process = context.Process(target=worker_loop, args=(stop_event,))
+        process.start()
+        processes.append(process)
+    atexit.register(stop_workers, processes, stop_event)
+    print(f"[Jobs] Started {count} worker process(es).")
+    return processes, stop_event
+
+
+def stop_workers(processes, stop_event, timeout=JOB_SHUTDOWN_TIMEOUT):
+    """
+    Asks the workers to stop after their current job and waits up to
+    `timeout` seconds in all, then terminates any still running.
+    """
+    stop_event.set()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+    running = [process for process in processes if process.is_alive()]
+    for process in running:
+        process.terminate()
+        process.join()
+    if running:
+        print(f"[Jobs] Terminated {len(running)} worker(s) still busy after {timeout:g}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingest job worker pool")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    args = parser.parse_args()
+
+    processes, stop_event = start_workers(args.workers)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("[Jobs] Stopping workers...")
+        stop_workers(processes, stop_event)
+
+
+if __name__ == "__main__":
+    main()
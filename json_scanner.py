@@ -0,0 +1,223 @@
+"""
+Pulls the JSON object out of a model response. Models wrap it in markdown
+fences, explain themselves before or after it, quote example snippets with
+braces in their reasoning, or leave trailing commas. Instead of slicing from
+the first "{" to the last "}", ObjectScanner finds every complete top-level
+object (braces inside string values do not count), and parse_response
+takes the last one that parses and fits the expected schema, coercing its
+values to the schema's types.
+
+Uses orjson when it is installed, json otherwise.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SIGNIFICANT_RE = re.compile(r'[{}"\\]')
+JSON_OBJECT_START_RE = re.compile(r'\{\s*["“]')
+TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+PLAIN_NUMBER_RE = re.compile(r"^(\()?([-+]?)(\d[\d,]*(?:\.\d+)?|\.\d+)\)?$")
+NULL_STRINGS = {"", "null", "none", "n/a", "na", "nil", "-", "not found", "not available"}
+
+
+class ResponseParseError(ValueError):
+    """Raised when a response holds no usable JSON object."""
+
+
+class ObjectScanner:
+    """
+    Finds complete top-level {...} objects in text fed to it piece by piece,
+    e.g. as a response streams in. Strings and escapes are tracked inside
+    objects only, so quotes in the surrounding prose are harmless.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.start = None
+        self.in_string = False
+        self.skip_to = 0
+        self.truncated = False
+
+    def feed(self, chunk):
+        """Adds text; returns the objects (as strings) completed by it."""
+        self.text += chunk
+        objects = []
+        for match in SIGNIFICANT_RE.finditer(self.text, self.pos):
+            index = match.start()
+            if index < self.skip_to:
+                continue
+            char = match.group()
+            if self.in_string:
+                if char == "\\":
+                    self.skip_to = index + 2
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if char == "{":
+                    self.start, self.depth = index, 1
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    objects.append(self.text[self.start:index + 1])
+                    self.start = None
+        self.pos = len(self.text)
+        return objects
+
+    def finish(self):
+        """
+        Call at the end of the text. A "{" that never closed (a stray brace
+        in prose, or a truncated object) may have swallowed real objects
+        after it, so the text after it is scanned again. Sets `truncated`
+        if the text ends inside something that looks like a JSON object,
+        i.e. the answer was cut off.
+        """
+        objects = []
+        scanner = self
+        while scanner.depth:
+            if JSON_OBJECT_START_RE.match(scanner.text, scanner.start):
+                self.truncated = True
+            rest = ObjectScanner()
+            objects.extend(rest.feed(scanner.text[scanner.start + 1:]))
+            scanner = rest
+        return objects
+
+
+def find_objects(text):
+    """All complete top-level objects in `text`, in order."""
+    scanner = ObjectScanner()
+    objects = scanner.feed(text)
+    objects.extend(scanner.finish())
+    return objects
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def load_candidate(candidate):
+    """Parses one candidate, then retries with trailing commas and smart quotes fixed."""
+    try:
+        return loads(candidate)
+    except ValueError:
+        pass
+    repaired = TRAILING_COMMA_RE.sub(r"\1", candidate.translate(SMART_QUOTES))
+    if repaired == candidate:
+        return None
+    try:
+        return loads(repaired)
+    except ValueError:
+        return None
+
+
+def matches_schema(value, schema):
+    """An object fits a schema if it has at least one of the schema's top-level keys."""
+    if not isinstance(value, dict):
+        return False
+    return schema is None or any(key in value for key in schema)
+
+
+def last_matching_object(text, schema=None):
+    """
+    The last top-level object in `text` that parses and fits `schema`, or
+    None. A candidate that does not parse (a stray "{" in prose that closed
+    on the real object's last "}") is searched inside for nested objects.
+    If the text ends inside an object (the answer was cut off, e.g. at the
+    token limit), earlier objects are only drafts or examples: None.
+    """
+    scanner = ObjectScanner()
+    candidates = scanner.feed(text)
+    candidates.extend(scanner.finish())
+    if scanner.truncated:
+        return None
+    while candidates:
+        candidate = candidates.pop()
+        value = load_candidate(candidate)
+        if value is None:
+            candidates.extend(find_objects(candidate[1:-1]))
+            continue
+        if matches_schema(value, schema):
+            return value
+    return None
+
+
+def coerce_number(value, spec):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float) and spec == "integer" and value.is_integer():
+        return int(value)
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if text.lower() in NULL_STRINGS:
+        return None
+    match = PLAIN_NUMBER_RE.match(text)
+    if not match:
+        # Units and currency ("12 lakh", "Rs. 5") are left for validation.py.
+        return value
+    number = float(match.group(3).replace(",", ""))
+    if match.group(1) or match.group(2) == "-":
+        number = -number
+    if spec == "integer" and number.is_integer():
+        return int(number)
+    return number
+
+
+def coerce(value, spec):
+    """
+    Coerces a parsed value to a schema: numbers sent as strings ("1,234",
+    "(56)") become numbers, "null"/"N/A" become None, numbers for string
+    fields become strings, and a nested object sent as a JSON string is
+    parsed. Anything else is returned unchanged.
+    """
+    if isinstance(spec, dict):
+        if isinstance(value, str):
+            value = last_matching_object(value, spec) or value
+        if not isinstance(value, dict):
+            return value
+        return {key: coerce(item, spec[key]) if key in spec else item for key, item in value.items()}
+    if isinstance(spec, list):
+        if not isinstance(value, list):
+            return value
+        return [coerce(item, spec[0]) for item in value]
+    if spec in ("integer", "float"):
+        return coerce_number(value, spec)
+    if spec == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        if isinstance(value, str) and value.strip().lower() in ("null", "none"):
+            return None
+    return value
+
+
+def parse_response(text, schema=None):
+    """
+    Returns the last JSON object in a model response that fits `schema`,
+    coerced to it. Raises ResponseParseError if there is none.
+    """
+    if not isinstance(text, str):
+        raise ResponseParseError("Response is not text")
+    stripped = text.strip()
+    value = None
+    # Fast path: the whole response is the object.
+    if stripped.startswith("{") and stripped.endswith("}"):
+        value = load_candidate(stripped)
+        if not matches_schema(value, schema):
+            value = None
+    if value is None:
+        value = last_matching_object(text, schema)
+    if value is None:
+        raise ResponseParseError("No JSON object matching the expected schema in response")
+    return coerce(value, schema) if schema else value
@@ -0,0 +1,88 @@
+"""
+Moves reports from the old one-collection-per-bank layout into the single
+`reports` collection, adding the normalized bank_key and display name.
+
+    python migrate_collections.py --dry-run
+    python migrate_collections.py
+    python migrate_collections.py --drop-old
+
+Documents keep their _id, so re-running the migration is safe. Reports
+saved before the balance sheet had its own field kept it under "data";
+it is moved to "balance_sheet", both in migrated documents and in those
+already in `reports`.
+"""
+import argparse
+
+import analytics
+import db
+import validation
+from bank_names import normalize_bank_name
+
+SKIPPED_COLLECTIONS = {*db.OWNED_COLLECTIONS, "sheets"}
+
+
+def legacy_collection_names(bank_db):
+    return sorted(
+        name for name in bank_db.list_collection_names()
+        if name not in SKIPPED_COLLECTIONS and not name.startswith("system.")
+    )
+
+
+def migrate_collection(bank_db, reports, collection_name, dry_run=False):
+    migrated = 0
+    for doc in bank_db[collection_name].find():
+        extracted_name = doc.get("bank_name_extracted") or doc.get("bank_name") or collection_name.replace("_", " ")
+        bank_key, display_name = normalize_bank_name(extracted_name)
+        doc["bank_name_extracted"] = extracted_name
+        doc["bank_name"] = display_name
+        doc["bank_key"] = bank_key
+        doc["migrated_from"] = collection_name
+        doc = validation.upgrade_legacy_layout(doc)
+        if not dry_run:
+            reports.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+            analytics.refresh_report(doc["_id"], reports)
+        migrated += 1
+    return migrated
+
+
+def move_legacy_balance_sheets(reports, dry_run=False):
+    """Moves balance sheets stored under "data" in `reports` to "balance_sheet"."""
+    moved = 0
+    legacy_filter = {"balance_sheet": None, "data": {"$type": "object"}}
+    for doc in reports.find(legacy_filter, {"data": 1}):
+        if not validation.is_legacy_balance_sheet(doc.get("data")):
+            continue
+        if not dry_run:
+            reports.update_one({"_id": doc["_id"]}, {"$set": {"balance_sheet": doc["data"]}, "$unset": {"data": ""}})
+            analytics.refresh_report(doc["_id"], reports)
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-bank collections into the reports collection")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--drop-old", action="store_true", help="Drop each legacy collection after migrating it")
+    args = parser.parse_args()
+
+    db.check_health()
+    bank_db = db.get_db()
+    reports = db.get_reports_collection()
+
+    total = 0
+    for collection_name in legacy_collection_names(bank_db):
+        migrated = migrate_collection(bank_db, reports, collection_name, dry_run=args.dry_run)
+        total += migrated
+        print(f"{collection_name}: {migrated} document(s) {'would be ' if args.dry_run else ''}migrated.")
+        if args.drop_old and not args.dry_run:
+            bank_db[collection_name].drop()
+            print(f"{collection_name}: dropped.")
+
+    moved = move_legacy_balance_sheets(reports, dry_run=args.dry_run)
+    print(f"{reports.name}: {moved} balance sheet(s) {'would be ' if args.dry_run else ''}moved out of 'data'.")
+
+    print(f"\nDone. {total} document(s) {'would be ' if args.dry_run else ''}migrated into '{reports.name}'.")
+
+
+if __name__ == "__main__":
+    main()
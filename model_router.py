@@ -0,0 +1,175 @@
+"""
+Routes each prompt type to an ordered list of models. The finders (the
+YES/NO and batched verdict calls, most of the traffic) and the extractors
+each get their own list, so finder throughput can be bought with a cheap,
+fast model without giving up extraction quality. The first model of a list
+is tried first; the next one is used when it fails, times out or answers in
+a form the caller cannot use.
+
+Every model has its own concurrency limit (calls in flight in this process)
+and timeout, and the router keeps latency and answer-quality figures per
+model and prompt type.
+
+    AI_FINDER_MODELS=google/gemini-2.0-flash-001,tngtech/deepseek-r1t2-chimera:free
+    AI_EXTRACTOR_MODELS=tngtech/deepseek-r1t2-chimera:free
+    AI_MODEL_CONCURRENCY=google/gemini-2.0-flash-001=16,tngtech/deepseek-r1t2-chimera:free=2
+    AI_MODEL_TIMEOUT=google/gemini-2.0-flash-001=20
+"""
+import collections
+import contextlib
+import os
+import threading
+import time
+
+DEFAULT_MODEL = os.getenv("AI_MODEL", "tngtech/deepseek-r1t2-chimera:free")
+EXTRACTOR_PROMPT_TYPES = ("extract", "extract_balance_sheet")
+# Calls in flight per model (0: no limit beyond the connection pool) and
+# seconds before a call is abandoned for the next model.
+DEFAULT_CONCURRENCY = int(os.getenv("AI_MODEL_DEFAULT_CONCURRENCY", "0"))
+DEFAULT_TIMEOUT = float(os.getenv("AI_MODEL_DEFAULT_TIMEOUT", "600"))
+# Latencies kept per model and prompt type for the percentiles.
+LATENCY_WINDOW = 1000
+
+OUTCOMES = ("ok", "unusable", "timeout", "error")
+
+
+class ModelTimeoutError(TimeoutError):
+    """Raised when a model takes longer than its timeout to answer."""
+
+
+def model_list(value):
+    """"a, b" -> ["a", "b"]."""
+    return [model.strip() for model in (value or "").split(",") if model.strip()]
+
+
+def model_settings(value, cast):
+    """
+    "a=16,b=2" -> {"a": 16, "b": 2}. Model names may contain ":" and "/",
+    so each entry is split at its last "=". Raises ValueError for an entry
+    without one.
+    """
+    settings = {}
+    for entry in model_list(value):
+        model, separator, setting = entry.rpartition("=")
+        if not separator or not model.strip():
+            raise ValueError(f"Expected model=value, got {entry!r}")
+        settings[model.strip()] = cast(setting)
+    return settings
+
+
+def routes_from_environment(prompt_types):
+    """
+    {prompt_type: [model, ...]} from AI_MODELS_<PROMPT_TYPE>, else
+    AI_EXTRACTOR_MODELS or AI_FINDER_MODELS, else [AI_MODEL].
+    """
+    finder_models = model_list(os.getenv("AI_FINDER_MODELS"))
+    extractor_models = model_list(os.getenv("AI_EXTRACTOR_MODELS"))
+    routes = {}
+    for prompt_type in prompt_types:
+        models = model_list(os.getenv(f"AI_MODELS_{prompt_type.upper()}"))
+        if not models:
+            models = extractor_models if prompt_type in EXTRACTOR_PROMPT_TYPES else finder_models
+        routes[prompt_type] = models or [DEFAULT_MODEL]
+    return routes
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else None
+
+
+class ModelRouter:
+    """
+    Holds the routes, the per-model limits and the figures recorded for
+    each (model, prompt type). Shared by every caller in the process.
+    """
+
+    def __init__(self, routes, concurrency=None, timeouts=None,
+                 default_concurrency=DEFAULT_CONCURRENCY, default_timeout=DEFAULT_TIMEOUT):
+        self.routes = routes
+        self.concurrency = concurrency or {}
+        self.timeouts = timeouts or {}
+        self.default_concurrency = default_concurrency
+        self.default_timeout = default_timeout
+        self.slots = {}
+        self.figures = {}
+        self.lock = threading.Lock()
+
+    def models_for(self, prompt_type):
+        """The models to try for a prompt type, in order."""
+        return self.routes.get(prompt_type) or [DEFAULT_MODEL]
+
+    def route_key(self, prompt_type):
+        """
+        Names the route of a prompt type, for cache keys: its model, or the
+        models it falls back through.
+        """
+        return ",".join(self.models_for(prompt_type))
+
+    def timeout_for(self, model):
+        return self.timeouts.get(model, self.default_timeout)
+
+    @contextlib.contextmanager
+    def slot(self, model):
+        """Holds one of the model's concurrency slots, waiting for one if all are taken."""
+        limit = self.concurrency.get(model, self.default_concurrency)
+        if limit <= 0:
+            yield
+            return
+        with self.lock:
+            semaphore = self.slots.get(model)
+            if semaphore is None:
+                semaphore = self.slots[model] = threading.BoundedSemaphore(limit)
+        with semaphore:
+            yield
+
+    def record(self, model, prompt_type, outcome, seconds=None, fell_back=False):
+        """
+        Records one routed call: its outcome (one of OUTCOMES), the seconds
+        the model took to answer, if it did, and whether the next model was
+        tried after it.
+        """
+        with self.lock:
+            figures = self.figures.get((model, prompt_type))
+            if figures is None:
+                figures = self.figures[(model, prompt_type)] = {
+                    "outcomes": dict.fromkeys(OUTCOMES, 0),
+                    "fallbacks": 0,
+                    "latencies": collections.deque(maxlen=LATENCY_WINDOW),
+                }
+            figures["outcomes"][outcome] += 1
+            figures["fallbacks"] += bool(fell_back)
+            if seconds is not None:
+                figures["latencies"].append(seconds)
+
+    def stats(self):
+        """
+        [{"model", "prompt_type", "calls", "ok", "unusable", "timeout",
+        "error", "fallbacks", "accuracy", "p50_seconds", "p95_seconds"}]:
+        accuracy is the share of answers the caller could use.
+        """
+        with self.lock:
+            snapshot = [(key, dict(figures["outcomes"]), figures["fallbacks"], list(figures["latencies"]))
+                        for key, figures in sorted(self.figures.items())]
+        rows = []
+        for (model, prompt_type), outcomes, fallbacks, latencies in snapshot:
+            answered = outcomes["ok"] + outcomes["unusable"]
+            rows.append({
+                "model": model,
+                "prompt_type": prompt_type,
+                "calls": sum(outcomes.values()),
+                **outcomes,
+                "fallbacks": fallbacks,
+                "accuracy": outcomes["ok"] / answered if answered else None,
+                "p50_seconds": percentile(latencies, 0.5),
+                "p95_seconds": percentile(latencies, 0.95),
+            })
+        return rows
+
+
+def router_from_environment(prompt_types):
+    return ModelRouter(
+        routes_from_environment(prompt_types),
+        concurrency=model_settings(os.getenv("AI_MODEL_CONCURRENCY"), int),
+        timeouts=model_settings(os.getenv("AI_MODEL_TIMEOUT"), float),
+    )
@@ -0,0 +1,285 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+import table_extractor
+import telemetry
+from upload_store import file_sha256
+
+# Documents with at least this many pages keep their page cache in a
+# memory-mapped file on disk instead of in memory (0 disables spilling).
+SPILL_PAGE_THRESHOLD = int(os.getenv("PDF_SPILL_PAGE_THRESHOLD", "300"))
+# Documents with at least this many pages have their text extracted on a
+# pool of PDF_PAGE_WORKERS processes, PDF_PAGE_BATCH_SIZE pages per task,
+# while the pipeline reads pages as they arrive (fewer than 2 workers
+# disables it).
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "200"))
+PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(min(os.cpu_count() or 1, 4))))
+PAGE_BATCH_SIZE = int(os.getenv("PDF_PAGE_BATCH_SIZE", "8"))
+
+_page_pool = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+# In a pool worker: the document it last read, kept open for the next batch.
+_worker_documents = {}
+
+
+def fingerprint_text(text):
+    """
+    A short hash of a page's text with whitespace collapsed, so re-rendered
+    but otherwise identical pages match. Blank pages get None.
+    """
+    normalized = " ".join(text.split())
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8", errors="replace")).hexdigest()[:16]
+
+
+def get_page_pool(workers):
+    """
+    The process pool page extraction runs on, created on first use and kept
+    for later documents so its workers start only once.
+    """
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_workers != workers:
+            if _page_pool is not None:
+                _page_pool.shutdown(wait=False, cancel_futures=True)
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _page_pool_workers = workers
+        return _page_pool
+
+
+def shutdown_page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=True, cancel_futures=True)
+            _page_pool = None
+
+
+def extract_page_texts(document_key, start_page, end_page):
+    """Runs in a pool worker: the texts of pages [start_page, end_page)."""
+    document = _worker_documents.get(document_key)
+    if document is None:
+        for previous in _worker_documents.values():
+            previous.close()
+        _worker_documents.clear()
+        document = _worker_documents[document_key] = fitz.open(document_key[0])
+    return [document.load_page(page_num).get_text() for page_num in range(start_page, end_page)]
+
+
+def iter_page_texts(file_path, page_count, workers=PAGE_WORKERS, batch_size=PAGE_BATCH_SIZE):
+    """
+    Yields (page_num, text) for every page in order, extracted in batches by
+    `workers` processes that each hold their own fitz document. A page is
+    yielded as soon as it and every page before it are done, so the caller
+    can start on the first pages while later ones are still being
+    extracted. Closing the iterator early cancels the batches not yet started.
+    """
+    stat = os.stat(file_path)
+    # The modification time and size tell a worker when a path holds a new file.
+    document_key = (file_path, stat.st_mtime_ns, stat.st_size)
+    pool = get_page_pool(workers)
+    starts = range(0, page_count, batch_size)
+    futures = [pool.submit(extract_page_texts, document_key, start, min(start + batch_size, page_count)) for start in starts]
+    try:
+        for start_page, future in zip(starts, futures):
+            for offset, text in enumerate(future.result()):
+                yield start_page + offset, text
+    except BrokenProcessPool:
+        shutdown_page_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class MmapPageStore:
+    """
+    Append-only on-disk store for page texts, read back through mmap so that
+    large reports do not keep every page string resident in memory.
+    """
+
+    def __init__(self, page_count, spill_dir=None):
+        self.file = tempfile.TemporaryFile(dir=spill_dir)
+        self.offsets = [None] * page_count
+        self.size = 0
+        self.map = None
+
+    def __contains__(self, page_num):
+        return self.offsets[page_num] is not None
+
+    def __setitem__(self, page_num, text):
+        data = text.encode("utf-8", errors="replace")
+        self.file.seek(self.size)
+        self.file.write(data)
+        self.file.flush()
+        self.offsets[page_num] = (self.size, len(data))
+        self.size += len(data)
+
+    def __getitem__(self, page_num):
+        offset, length = self.offsets[page_num]
+        if length == 0:
+            return ""
+        if self.map is None or len(self.map) < offset + length:
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        return self.map[offset:offset + length].decode("utf-8")
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+class PdfDocument:
+    """
+    A PDF opened once for the whole ingest. Each page's text is extracted at
+    most once, on first use, and every window (3-page finder windows,
+    10-page balance-sheet windows, ...) is served by joining cached pages.
+    Large documents can be extracted ahead on a process pool (prefetch).
+    """
+
+    def __init__(self, file_path, spill=None, spill_dir=None):
+        self.file_path = file_path
+        self.doc = fitz.open(file_path)
+        self.page_count = len(self.doc)
+        self.lock = threading.Lock()
+        self.page_ready = threading.Condition(self.lock)
+        self.content_hash = None
+        self.tables = {}
+        self.prefetch_thread = None
+        self.prefetching = False
+        self.closed = False
+
+        if spill is None:
+            spill = 0 < SPILL_PAGE_THRESHOLD <= self.page_count
+        if spill:
+            self.pages = MmapPageStore(self.page_count, spill_dir=spill_dir)
+        else:
+            self.pages = {}
+
+    def __len__(self):
+        return self.page_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def page_text(self, page_num):
+        """
+        Returns the text of one page, extracting it on first access. While a
+        prefetch is running, waits for the page to arrive instead.
+        """
+        with self.lock:
+            while self.prefetching and page_num not in self.pages:
+                self.page_ready.wait()
+            if page_num not in self.pages:
+                started = time.perf_counter()
+                self.pages[page_num] = self.doc.load_page(page_num).get_text()
+                telemetry.add_time("pdf_text", time.perf_counter() - started)
+            return self.pages[page_num]
+
+    def prefetch(self, workers=None):
+        """
+        Starts extracting every page's text in the background with
+        iter_page_texts when the document has at least
+        PARALLEL_PAGE_THRESHOLD pages. Returns whether it started.
+        """
+        workers = PAGE_WORKERS if workers is None else workers
+        if workers < 2 or self.page_count < max(PARALLEL_PAGE_THRESHOLD, 2) or self.prefetch_thread:
+            return False
+        if multiprocessing.current_process().daemon:
+            # Daemon processes cannot start a pool.
+            print("  [PDF] Running in a daemon process; extracting pages one at a time.")
+            return False
+        print(f"  [PDF] Extracting {self.page_count} pages on {workers} processes.")
+        self.prefetching = True
+        self.prefetch_thread = threading.Thread(target=telemetry.in_current_trace(self.run_prefetch), args=(workers,), daemon=True)
+        self.prefetch_thread.start()
+        return True
+
+    def run_prefetch(self, workers):
+        started = time.perf_counter()
+        pages = iter_page_texts(self.file_path, self.page_count, workers)
+        try:
+            for page_num, text in pages:
+                with self.page_ready:
+                    if self.closed:
+                        break
+                    if page_num not in self.pages:
+                        self.pages[page_num] = text
+                    self.page_ready.notify_all()
+        except Exception as e:
+            print(f"  [PDF] Parallel page extraction failed, continuing page by page: {e}")
+        finally:
+            pages.close()
+            with self.page_ready:
+                self.prefetching = False
+                self.page_ready.notify_all()
+            telemetry.add_time("pdf_text_parallel", time.perf_counter() - started)
+
+    def iter_pages(self, start_page=0, end_page=None):
+        """Yields (page_num, text) lazily over a page range."""
+        end_page = self.page_count if end_page is None else min(end_page, self.page_count)
+        for page_num in range(start_page, end_page):
+            yield page_num, self.page_text(page_num)
+
+    def window(self, start_page, end_page):
+        """Returns the text of pages [start_page, end_page) from the cache."""
+        return "".join(text for _, text in self.iter_pages(start_page, end_page))
+
+    def page_tables(self, page_num):
+        """Returns the compact table text of one page (see table_extractor.py), detecting it on first access."""
+        with self.lock:
+            if page_num not in self.tables:
+                started = time.perf_counter()
+                self.tables[page_num] = table_extractor.page_table_text(self.doc.load_page(page_num))
+                telemetry.add_time("pdf_tables", time.perf_counter() - started)
+            return self.tables[page_num]
+
+    def table_window(self, start_page, end_page):
+        """
+        Returns the tables of pages [start_page, end_page), each page's
+        headed by its number, or "" if none of the pages holds a table.
+        """
+        end_page = min(end_page, self.page_count)
+        parts = []
+        for page_num in range(start_page, end_page):
+            text = self.page_tables(page_num)
+            if text:
+                parts.append(f"[Page {page_num + 1}]\n{text}\n")
+        return "".join(parts)
+
+    def sha256(self):
+        """SHA-256 of the file itself, the key uploads are stored under."""
+        if self.content_hash is None:
+            self.content_hash = file_sha256(self.file_path)
+        return self.content_hash
+
+    def fingerprints(self):
+        """Returns fingerprint_text of every page, in page order."""
+        return [fingerprint_text(text) for _, text in self.iter_pages()]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        if self.prefetch_thread:
+            self.prefetch_thread.join()
+        with self.lock:
+            if isinstance(self.pages, MmapPageStore):
+                self.pages.close()
+            self.doc.close()
@@ -0,0 +1,81 @@
+"""
+Matching a re-uploaded report (say, a corrected version) to the version
+already ingested, by the page fingerprints stored on every report, and
+working out which of its pages changed.
+"""
+import os
+
+REINGEST_ENABLED = os.getenv("REINGEST_ENABLED", "1") == "1"
+# Share of distinct pages two uploads must have in common to count as
+# versions of the same report.
+REINGEST_MIN_OVERLAP = float(os.getenv("REINGEST_MIN_OVERLAP", "0.5"))
+REINGEST_MAX_CANDIDATES = 20
+
+
+def page_overlap(old_fingerprints, new_fingerprints):
+    old_pages = set(old_fingerprints) - {None}
+    new_pages = set(new_fingerprints) - {None}
+    if not old_pages or not new_pages:
+        return 0.0
+    return len(old_pages & new_pages) / max(len(old_pages), len(new_pages))
+
+
+def find_previous_version(reports, fingerprints):
+    """
+    Returns (document, overlap) for the stored report sharing the most pages
+    with `fingerprints`, if at least REINGEST_MIN_OVERLAP of them, else None.
+    """
+    distinct = sorted(set(fingerprints) - {None})
+    if not distinct:
+        return None
+
+    candidates = reports.find(
+        {"page_fingerprints": {"$in": distinct}},
+        {"page_fingerprints": 1, "source_pages": 1, "bank_name": 1, "report_year": 1,
+         "content_hashes": 1, "revision": 1}
+    ).limit(REINGEST_MAX_CANDIDATES)
+
+    best, best_overlap = None, 0.0
+    for candidate in candidates:
+        overlap = page_overlap(candidate.get("page_fingerprints") or [], fingerprints)
+        if overlap > best_overlap:
+            best, best_overlap = candidate, overlap
+    if best is None or best_overlap < REINGEST_MIN_OVERLAP:
+        return None
+    return best, best_overlap
+
+
+def locate_window(old_fingerprints, window, new_fingerprints):
+    """
+    Finds the pages of `window` (start, end) of the old version, unchanged
+    and in order, in the new version. Returns the new (start, end), which
+    may have moved if pages were added or removed before it, or None.
+    """
+    start_page, end_page = window
+    wanted = old_fingerprints[start_page:end_page]
+    if not wanted or all(fingerprint is None for fingerprint in wanted):
+        return None
+
+    # Prefer the match closest to where the window used to be.
+    matches = [
+        offset for offset in range(len(new_fingerprints) - len(wanted) + 1)
+        if new_fingerprints[offset:offset + len(wanted)] == wanted
+    ]
+    if not matches:
+        return None
+    new_start = min(matches, key=lambda offset: abs(offset - start_page))
+    return new_start, new_start + (end_page - start_page)
+
+
+def changed_pages(old_fingerprints, new_fingerprints):
+    """Pages of the new version whose text appears nowhere in the old one."""
+    old_pages = set(old_fingerprints)
+    return {
+        page_num for page_num, fingerprint in enumerate(new_fingerprints)
+        if fingerprint is not None and fingerprint not in old_pages
+    }
+
+
+def affected_windows(windows, pages):
+    """The windows (start, end) that contain at least one of `pages`."""
+    return [window for window in windows if any(window[0] <= page_num < window[1] for page_num in pages)]
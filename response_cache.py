@@ -0,0 +1,131 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.getenv("AI_CACHE_PATH", os.path.join("cache", "ai_responses.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Writes between recounts of the stored bytes. The count is kept up to date
+# as this process writes, but other processes sharing the file change it too.
+CACHE_RECOUNT_WRITES = 1000
+
+
+def make_key(text, prompt_type, model, system_prompt=""):
+    """
+    Content-addressed cache key: the chunk text hash, the prompt type, the
+    model name and the prompt wording (so a prompt rewrite invalidates it).
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    key_source = "\0".join([text_hash, prompt_type, model, prompt_hash])
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk (SQLite) cache of AI responses with a TTL and least-recently-used
+    eviction once the stored responses exceed max_bytes. The stored bytes
+    are tracked as responses are written and deleted rather than summed on
+    every write; they are recounted before evicting and every
+    CACHE_RECOUNT_WRITES writes.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self.writes_since_recount = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+        self.purge_expired()
+
+    def get(self, key):
+        """Returns the cached response for key, or None on a miss."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total_bytes -= len(row[0].encode("utf-8", errors="replace"))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode("utf-8", errors="replace"))
+        with self.lock:
+            replaced = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self.total_bytes += size - (replaced[0] if replaced else 0)
+            self.writes_since_recount += 1
+            if self.writes_since_recount >= CACHE_RECOUNT_WRITES:
+                self._recount()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _recount(self):
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.writes_since_recount = 0
+
+    def _evict(self):
+        self._recount()
+        if self.total_bytes <= self.max_bytes:
+            return
+        to_delete = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def purge_expired(self):
+        with self.lock:
+            if self.ttl_seconds > 0:
+                self.conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+                self.conn.commit()
+            self._recount()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
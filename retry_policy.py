@@ -0,0 +1,199 @@
+import email.utils
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("AI_RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "30"))
+# Longest Retry-After we honour; anything larger is treated as this.
+RETRY_AFTER_MAX = float(os.getenv("AI_RETRY_AFTER_MAX", "120"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+# Gap between call starts the throttle opens with on the first 429, and its ceiling.
+THROTTLE_START_INTERVAL = 0.05
+THROTTLE_MAX_INTERVAL = float(os.getenv("AI_THROTTLE_MAX_INTERVAL", "10"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+def error_status(error):
+    """The HTTP status of an API error, or None if there was no response."""
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def is_retryable(error):
+    """
+    Timeouts, dropped connections, 429s and 5xx responses are worth another
+    try. Other 4xx responses (bad key, bad request, unknown model) and
+    anything that is not an API error fail straight away.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError)):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return False
+
+
+def retry_after_seconds(error):
+    """Reads Retry-After (seconds or an HTTP date) or retry-after-ms from an error response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return min(max(float(value) / 1000, 0.0), RETRY_AFTER_MAX)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped at max_delay."""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, retry_after=None, throttled=False):
+        """
+        Seconds to wait before retry number `attempt` (0-based). After a 429
+        the shared AdaptiveThrottle paces the retry, so there is no extra
+        wait. Otherwise a server's Retry-After wins over the computed delay,
+        plus a little jitter so that callers told the same time do not all
+        return at once.
+        """
+        if throttled:
+            return 0.0
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Shared by every caller in the process. After failure_threshold
+    retryable failures in a row (5xx, timeouts, dropped connections) the
+    circuit opens and calls fail fast for reset_seconds; then one probe call
+    is let through, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        """Raises CircuitOpenError while the circuit is open."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.probing:
+                raise CircuitOpenError("AI API circuit breaker is open after repeated failures")
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    print(f"  [Retry] Circuit breaker opened after {self.failures} consecutive failures.")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class AdaptiveThrottle:
+    """
+    Paces call starts to what the provider accepts, for every caller in the
+    process. A 429 doubles the gap between calls and holds all of them back
+    until its Retry-After; each success shrinks the gap by 10%, so the call
+    rate climbs back until the provider pushes back again. 429s for calls
+    booked before the last widening are the same overload and do not widen
+    it again.
+    """
+
+    def __init__(self, start_interval=THROTTLE_START_INTERVAL, max_interval=THROTTLE_MAX_INTERVAL):
+        self.start_interval = start_interval
+        self.max_interval = max_interval
+        self.interval = 0.0
+        self.next_slot = 0.0
+        self.widened_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until this caller's slot comes up. Returns when the slot was
+        booked, to pass to on_throttled if the call gets a 429.
+        """
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+        return now
+
+    def on_throttled(self, retry_after=None, booked_at=None):
+        with self.lock:
+            now = time.monotonic()
+            if booked_at is None or booked_at >= self.widened_at:
+                self.interval = min(self.max_interval, max(self.interval * 2, self.start_interval))
+                self.widened_at = now
+            hold = retry_after if retry_after is not None else self.interval
+            self.next_slot = max(self.next_slot, now + hold)
+
+    def on_success(self):
+        with self.lock:
+            self.interval *= 0.9
+            if self.interval < self.start_interval / 10:
+                self.interval = 0.0
+
+
+DEFAULT_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = CircuitBreaker()
+THROTTLE = AdaptiveThrottle()
@@ -0,0 +1,368 @@
+"""
+A local stand-in for the OpenRouter chat completions endpoint, used by the
+benchmark scripts so they can run without network access or API quota.
+
+Run it directly:
+    python stub_openai_server.py --port 8099 --answer NO
+
+then point the agent at it:
+    OPENROUTER_BASE_URL=http://127.0.0.1:8099/v1 OPENROUTER_API_KEY=stub
+
+To imitate a reasoning model, --reasoning-tokens and --tail-tokens add
+thinking tokens before the answer and explanation tokens after it, each
+taking --token-latency seconds to "generate". Requests with "stream": true
+get them as server-sent events; max_tokens is honoured either way.
+
+To exercise retry handling, --rate-limit-rate and --error-rate answer that
+share of requests with 429 (carrying Retry-After) or 503, and --capacity
+answers 429 to any request beyond that many per second, like a provider
+that is being throttled.
+
+To exercise model routing, --model-latency MODEL=SECONDS replaces
+--latency for requests naming that model, and --failing-model answers
+requests for a model with 404, like a model that has been withdrawn.
+
+--canned answers every prompt type of ai_agent.py the way a model would
+for the reports of synthetic_reports.py instead of with --answer: finders
+say YES to windows holding the highlights or balance sheet title, the
+batched finders return per-window JSON verdicts, and the extractors return
+fixed figures that pass validation.py's checks.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import model_router
+
+# What the canned finders look for, as titled by synthetic_reports.py.
+CANNED_MARKERS = {"summary": "FINANCIAL HIGHLIGHTS", "balance_sheet": "BALANCE SHEET AS AT"}
+CANNED_FINDER_TARGETS = {
+    "find": "summary", "find_batch": "summary",
+    "find_balance_sheet": "balance_sheet", "find_balance_sheet_batch": "balance_sheet",
+}
+WINDOW_HEADER_RE = re.compile(r"^=== WINDOW (\d+) \(pages [^)]*\) ===$", re.M)
+BANK_NAME_RE = re.compile(r"FINANCIAL HIGHLIGHTS - ([^\n|]+)")
+CANNED_SUMMARY_DATA = {
+    "balance_sheet_size_cr": 2500000, "profit_after_tax_cr": 25000, "deposits_cr": 1900000,
+    "advances_cr": 1600000, "return_on_equity_percent": 14.2, "dividend_per_share_inr": 19.5,
+}
+CANNED_BALANCE_SHEET = {
+    "unit": "crore",
+    "total_assets": 2500000, "total_liabilities": 2250000, "total_shareholders_equity": 250000,
+    "asset_breakdown": {"cash_and_cash_equivalents": 150000, "loans_receivable": 1600000, "investments": 600000,
+                        "property_plant_equipment": 20000, "other_assets": 130000},
+    "liability_breakdown": {"deposits": 1900000, "borrowings": 250000, "other_liabilities": 100000},
+    "equity_breakdown": {"equity_share_capital": 10000, "reserves_and_surplus": 240000, "other_equity": None},
+}
+
+_prompt_types = None
+_prompt_types_lock = threading.Lock()
+
+
+def estimate_tokens(char_count):
+    return (char_count + 3) // 4
+
+
+def prompt_types():
+    """{system prompt: (prompt_type, transport)} for every prompt of ai_agent.py."""
+    global _prompt_types
+    with _prompt_types_lock:
+        if _prompt_types is None:
+            import ai_agent
+            _prompt_types = {
+                ai_agent.system_prompt_for(prompt_type, transport): (prompt_type, transport)
+                for prompt_type in ai_agent.MAX_TOKENS for transport in ai_agent.TRANSPORTS
+            }
+        return _prompt_types
+
+
+def canned_answer(request_data):
+    """The answer a model would give to a request about a synthetic report."""
+    messages = request_data.get("messages", [])
+    system_prompt = next((m.get("content") for m in messages if m.get("role") == "system"), "")
+    text = next((m.get("content") for m in messages if m.get("role") == "user"), "") or ""
+    prompt_type, transport = prompt_types().get(system_prompt, (None, None))
+    if transport == "base64":
+        text = base64.b64decode(text).decode("utf-8", errors="replace")
+
+    def verdict(target, window_text):
+        return "YES" if CANNED_MARKERS[target] in window_text else "NO"
+
+    if prompt_type in ("find", "find_balance_sheet"):
+        return verdict(CANNED_FINDER_TARGETS[prompt_type], text)
+    if prompt_type in ("find_batch", "find_balance_sheet_batch", "find_both"):
+        parts = WINDOW_HEADER_RE.split(text)[1:]
+        windows = []
+        for number, window_text in zip(parts[::2], parts[1::2]):
+            entry = {"window": int(number)}
+            targets = ("summary", "balance_sheet") if prompt_type == "find_both" else (CANNED_FINDER_TARGETS[prompt_type],)
+            for target in targets:
+                answer = verdict(target, window_text)
+                score = 0.95 if answer == "YES" else 0.05
+                if prompt_type == "find_both":
+                    entry.update({target: answer, f"{target}_score": score})
+                else:
+                    entry.update({"verdict": answer, "score": score})
+            windows.append(entry)
+        return json.dumps({"windows": windows})
+    if prompt_type == "extract":
+        match = BANK_NAME_RE.search(text)
+        return json.dumps({
+            "bank_name": match.group(1).strip() if match else "Stub Bank Ltd",
+            "report_year": "2024-25",
+            "schema_type": "annual_report_summary",
+            "data": CANNED_SUMMARY_DATA,
+        })
+    if prompt_type == "extract_balance_sheet":
+        return json.dumps(CANNED_BALANCE_SHEET)
+    return "NO"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive between calls.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        try:
+            request_data = json.loads(body)
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        self.server.count_request()
+        model = request_data.get("model", "")
+        if model in self.server.failing_models:
+            self.server.count_status(404)
+            self.send_json(404, {"error": {"message": f"No endpoints found for {model}", "code": 404}})
+            return
+
+        failure = self.server.injected_failure()
+        if failure:
+            status, retry_after = failure
+            headers = {"Retry-After": f"{retry_after:.3f}"} if retry_after is not None else None
+            self.send_json(status, {"error": {"message": f"Injected {status} from stub", "code": status}}, headers)
+            return
+
+        latency = self.server.model_latency.get(model, self.server.latency)
+        if latency:
+            time.sleep(latency)
+
+        # Rough usage figures (about 4 characters per token) so that callers
+        # reading `usage` see numbers proportional to what they sent.
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in request_data.get("messages", []))
+        prompt_tokens = estimate_tokens(prompt_chars)
+
+        tokens = self.server.completion_tokens(self.server.answer_for(request_data))
+        max_tokens = request_data.get("max_tokens")
+        finish_reason = "stop"
+        if max_tokens and len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = "length"
+
+        if request_data.get("stream"):
+            self.stream_completion(request_data, tokens, finish_reason)
+            return
+
+        time.sleep(self.server.token_latency * len(tokens))
+        answer = "".join(text for kind, text in tokens if kind == "content")
+        self.send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request_data.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": finish_reason
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)
+            }
+        })
+
+    def stream_completion(self, request_data, tokens, finish_reason):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta, finish=None):
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request_data.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+
+        try:
+            for kind, text in tokens:
+                time.sleep(self.server.token_latency)
+                self.write_event(chunk({kind: text}))
+            self.write_event(chunk({}, finish_reason))
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early, which is what finders do.
+            self.close_connection = True
+
+    def write_event(self, payload):
+        self.write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, answer="NO", reasoning_tokens=0, tail_tokens=0, token_latency=0.0,
+                 rate_limit_rate=0.0, error_rate=0.0, retry_after=1.0, capacity=0.0, seed=None, canned=False, model_latency=None, failing_models=()):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.failing_models = set(failing_models)
+        self.answer = answer
+        self.canned = canned
+        self.reasoning_tokens = reasoning_tokens
+        self.tail_tokens = tail_tokens
+        self.token_latency = token_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.request_count = 0
+        self.status_counts = {}
+        self._count_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._capacity_tokens = capacity
+        self._capacity_updated = time.monotonic()
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up waiting (a timeout) are not an error here.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def count_status(self, status):
+        with self._count_lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def injected_failure(self):
+        """Returns (status, retry_after) for a request that should fail, else None."""
+        with self._count_lock:
+            status, retry_after = None, None
+            if self.capacity > 0:
+                now = time.monotonic()
+                self._capacity_tokens = min(self.capacity, self._capacity_tokens + (now - self._capacity_updated) * self.capacity)
+                self._capacity_updated = now
+                if self._capacity_tokens >= 1:
+                    self._capacity_tokens -= 1
+                else:
+                    status, retry_after = 429, (1 - self._capacity_tokens) / self.capacity
+            if status is None:
+                roll = self._random.random()
+                if roll < self.rate_limit_rate:
+                    status, retry_after = 429, self.retry_after
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    status = 503
+            status_key = status or 200
+            self.status_counts[status_key] = self.status_counts.get(status_key, 0) + 1
+            return (status, retry_after) if status else None
+
+    def answer_for(self, request_data):
+        return canned_answer(request_data) if self.canned else self.answer
+
+    def completion_tokens(self, answer):
+        """The (kind, text) tokens of one completion, reasoning first."""
+        tokens = [("reasoning", "hmm ")] * self.reasoning_tokens
+        tokens.append(("content", answer))
+        tokens += [("content", " because")] * self.tail_tokens
+        return tokens
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_stub_server(port=0, **options):
+    """Starts the stub on a background thread and returns the server."""
+    server = StubServer(("127.0.0.1", port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--answer", default="NO", help="Content returned for every completion")
+    parser.add_argument("--reasoning-tokens", type=int, default=0, help="Thinking tokens sent before the answer")
+    parser.add_argument("--tail-tokens", type=int, default=0, help="Explanation tokens sent after the answer")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds to generate each token")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--capacity", type=float, default=0.0, help="Requests per second served before answering 429 (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the injected failures")
+    parser.add_argument("--canned", action="store_true", help="Answer each prompt type as for synthetic_reports.py reports")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="Latency for requests naming MODEL (repeatable)")
+    parser.add_argument("--failing-model", action="append", default=[], metavar="MODEL",
+                        help="Answer requests for MODEL with 404 (repeatable)")
+    args = parser.parse_args()
+
+    server = StubServer(
+        ("127.0.0.1", args.port), latency=args.latency, answer=args.answer,
+        reasoning_tokens=args.reasoning_tokens, tail_tokens=args.tail_tokens, token_latency=args.token_latency,
+        rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate, retry_after=args.retry_after,
+        capacity=args.capacity, seed=args.seed, canned=args.canned,
+        model_latency=model_router.model_settings(",".join(args.model_latency), float),
+        failing_models=args.failing_model
+    )
+    print(f"Stub server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Generates synthetic bank annual reports (PyMuPDF) for the benchmarks: prose
+chapters with the odd figure in them, a financial highlights table, a
+balance sheet and a profit and loss account laid out with spaces, ruled
+schedules and notes. Page counts and where the tables sit are chosen by the
+caller; the labels returned mark the summary and balance sheet pages in the
+format of bench_prefilter.py's labels file.
+
+    python synthetic_reports.py samples/ --reports 10 --pages 40 200 --seed 1
+
+writes samples/synthetic_1.pdf ... and samples/labels.json.
+"""
+import argparse
+import json
+import os
+import random
+
+import fitz
+
+WORDS = ("the bank continued to strengthen its franchise across segments while maintaining "
+         "prudent risk management digital adoption customer deposits retail lending grew "
+         "during the year supported by branch expansion and improved asset quality").split()
+BALANCE_SHEET_ROWS = [
+    ("CAPITAL AND LIABILITIES", None), ("Capital", 1), ("Reserves and Surplus", 1), ("Deposits", 1),
+    ("Borrowings", 1), ("Other Liabilities and Provisions", 1), ("Total", 1), ("ASSETS", None),
+    ("Cash and Balances with Reserve Bank of India", 1), ("Balances with Banks and Money at Call", 1),
+    ("Investments", 1), ("Advances", 1), ("Fixed Assets", 1), ("Other Assets", 1), ("Total", 1),
+    ("Contingent Liabilities", 1), ("Bills for Collection", 1),
+]
+PROFIT_AND_LOSS_ROWS = [
+    ("INCOME", None), ("Interest Earned", 1), ("Other Income", 1), ("Total", 1), ("EXPENDITURE", None),
+    ("Interest Expended", 1), ("Operating Expenses", 1), ("Provisions and Contingencies", 1), ("Total", 1),
+    ("NET PROFIT FOR THE YEAR", 1), ("Profit brought forward", 1), ("APPROPRIATIONS", None),
+    ("Transfer to Statutory Reserve", 1), ("Dividend", 1), ("Balance carried over", 1),
+]
+HIGHLIGHTS_ROWS = [
+    ("Balance Sheet Size", 1), ("Deposits", 1), ("Advances", 1), ("Net Profit", 1),
+    ("Return on Equity (%)", 0), ("Dividend per Share (₹)", 0), ("Capital Adequacy Ratio (%)", 0),
+]
+# The highlights page is titled HIGHLIGHTS_TITLE + " - " + the bank's name.
+HIGHLIGHTS_TITLE = "FINANCIAL HIGHLIGHTS"
+BALANCE_SHEET_TITLE = "BALANCE SHEET AS AT 31ST MARCH 2025"
+
+
+def indian_amount(value):
+    """1234567 -> "12,34,567"."""
+    digits = str(value)
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ",".join([head] + groups + [tail])
+
+
+def prose(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def add_prose_page(doc, rng, title):
+    page = doc.new_page()
+    page.insert_text((50, 50), title, fontsize=13)
+    lines = []
+    while len(lines) < 54:
+        lines.append(prose(rng, 14))
+        if rng.random() < 0.15:
+            lines.append(f"Net interest income rose {rng.uniform(2, 25):.1f}% to ₹ "
+                         f"{indian_amount(rng.randint(10_000, 90_000))} crore.")
+    page.insert_text((50, 80), lines, fontsize=9, lineheight=13 / 9)
+
+
+def add_statement_page(doc, rng, title, rows, amounts, ruled=False):
+    """A statement with a current and a previous year column. Returns the amounts printed."""
+    page = doc.new_page()
+    page.insert_text((50, 50), title, fontsize=12)
+    page.insert_text((430, 68), "(₹ in crore)", fontsize=9)
+    page.insert_text((50, 92), "Particulars", fontsize=9)
+    page.insert_text((320, 92), "Schedule", fontsize=9)
+    page.insert_text((385, 92), "As at 31.03.2025", fontsize=9)
+    page.insert_text((485, 92), "As at 31.03.2024", fontsize=9)
+    printed = []
+    y = 112
+    for label, kind in rows:
+        page.insert_text((50, y), label, fontsize=9)
+        if kind is not None:
+            if kind:
+                current, previous = (indian_amount(rng.randint(*amounts)) for _ in range(2))
+            else:
+                current, previous = (f"{rng.uniform(1, 25):.2f}" for _ in range(2))
+            for text, right in ((current, 455), (previous, 555)):
+                page.insert_text((right - fitz.get_text_length(text, fontsize=9), y), text, fontsize=9)
+                printed.append(text)
+            if rng.random() < 0.5:
+                page.insert_text((330, y), str(rng.randint(1, 18)), fontsize=9)
+        if ruled:
+            page.draw_line((45, y + 4), (560, y + 4))
+        y += 17
+    if ruled:
+        page.draw_line((45, 97), (560, 97))
+        for x in (45, 310, 370, 465, 560):
+            page.draw_line((x, 80), (x, y - 13))
+        page.draw_line((45, 80), (560, 80))
+    y += 20
+    page.insert_text((50, y), [prose(rng, 15) for _ in range(4)], fontsize=8, lineheight=1.5)
+    return printed
+
+
+def write_report(path, rng, pages=19, summary_page=7, balance_sheet_page=10, schedules=4,
+                 bank_name="Synthetic Bank Ltd"):
+    """
+    Writes a report of `pages` pages with the highlights on `summary_page`
+    and the balance sheet on `balance_sheet_page` (both 1-based), followed
+    by the profit and loss account and up to `schedules` ruled schedules.
+    Every other page is prose. Returns ({"find": [summary_page],
+    "find_balance_sheet": [balance_sheet_page]}, the statement amounts printed).
+    """
+    statements = {balance_sheet_page: "balance_sheet", balance_sheet_page + 1: "profit_and_loss"}
+    for number in range(1, schedules + 1):
+        statements[balance_sheet_page + 1 + number] = number
+    if not 1 <= summary_page <= pages or not 1 <= balance_sheet_page <= pages:
+        raise ValueError(f"Table pages must be within 1-{pages}")
+    if summary_page in statements:
+        raise ValueError(f"Summary page {summary_page} falls on the statements after the balance sheet")
+
+    doc = fitz.open()
+    printed = []
+    for page_num in range(1, pages + 1):
+        statement = statements.get(page_num)
+        if page_num == summary_page:
+            printed += add_statement_page(doc, rng, f"{HIGHLIGHTS_TITLE} - {bank_name}", HIGHLIGHTS_ROWS, (5_000, 25_00_000))
+        elif statement == "balance_sheet":
+            printed += add_statement_page(doc, rng, BALANCE_SHEET_TITLE, BALANCE_SHEET_ROWS, (500, 25_00_000))
+        elif statement == "profit_and_loss":
+            printed += add_statement_page(doc, rng, "PROFIT AND LOSS ACCOUNT FOR THE YEAR ENDED 31ST MARCH 2025",
+                                          PROFIT_AND_LOSS_ROWS, (100, 2_00_000))
+        elif statement:
+            rows = [(f"Item {item} of schedule {statement}", 1) for item in range(1, 9)] + [("Total", 1)]
+            printed += add_statement_page(doc, rng, f"SCHEDULE {statement}", rows, (10, 5_00_000), ruled=True)
+        elif page_num < min(summary_page, balance_sheet_page):
+            add_prose_page(doc, rng, f"Management Discussion and Analysis ({page_num})")
+        elif page_num < max(summary_page, balance_sheet_page):
+            add_prose_page(doc, rng, f"Directors' Report ({page_num})")
+        else:
+            add_prose_page(doc, rng, f"Notes to Accounts ({page_num})")
+    doc.save(path)
+    doc.close()
+    return {"find": [summary_page], "find_balance_sheet": [balance_sheet_page]}, printed
+
+
+def random_layout(rng, pages, schedules=4):
+    """
+    Random (summary_page, balance_sheet_page) for a report of `pages` pages:
+    the highlights in its first third, the balance sheet after them with
+    room for the statements that follow it.
+    """
+    if pages < schedules + 4:
+        raise ValueError(f"A report needs at least {schedules + 4} pages")
+    summary_page = rng.randint(1, max(1, pages // 3))
+    balance_sheet_page = rng.randint(summary_page + 1, pages - schedules - 1)
+    return summary_page, balance_sheet_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic annual reports")
+    parser.add_argument("output", help="Directory to write the PDFs and labels.json to")
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, nargs=2, default=[40, 120], metavar=("MIN", "MAX"))
+    parser.add_argument("--schedules", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.makedirs(args.output, exist_ok=True)
+    labels = {}
+    for number in range(1, args.reports + 1):
+        name = f"synthetic_{number}.pdf"
+        pages = rng.randint(*args.pages)
+        summary_page, balance_sheet_page = random_layout(rng, pages, args.schedules)
+        labels[name], _ = write_report(os.path.join(args.output, name), rng, pages, summary_page, balance_sheet_page,
+                                       args.schedules, bank_name=f"Synthetic Bank {number} Ltd")
+    with open(os.path.join(args.output, "labels.json"), "w") as f:
+        json.dump(labels, f, indent=2)
+    print(f"Wrote {args.reports} report(s) and labels.json to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
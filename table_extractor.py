@@ -0,0 +1,230 @@
+"""
+Finds the tables on a PDF page and renders them compactly for the
+extractors: one row per line, cells separated by " | ", plus the page's
+short title and unit lines ("(₹ in crore)") but none of its prose.
+
+Ruled tables come from PyMuPDF's find_tables. Statements laid out with
+spaces only (most annual reports) are rebuilt from word positions: a
+line's words split into cells at wide gaps, runs of lines ending in
+amounts form a table, and the amounts are aligned into columns on their
+right edges.
+"""
+import os
+import re
+
+# A table needs at least this many rows holding an amount.
+MIN_TABLE_ROWS = int(os.getenv("TABLE_MIN_ROWS", "3"))
+# Points between two words that start a new cell.
+CELL_GAP = 6.0
+# Amounts whose right edges are within this many points share a column.
+COLUMN_TOLERANCE = 12.0
+# Label-only lines ("ASSETS", "Schedule 4") allowed between two amount rows.
+MAX_LABEL_LINES = 3
+# Lines above a table searched for its column header and section label.
+MAX_HEADER_LINES = 2
+MAX_LABEL_CHARS = 40
+MAX_CONTEXT_LINES = 4
+MAX_CONTEXT_CHARS = 120
+
+CELL_SEPARATOR = " | "
+TABLE_TEXT_NOTE = (
+    "The tables found on these pages, one row per line with cells separated by \" | \"; "
+    "each page's title and unit lines come first.\n"
+)
+
+NUMBER_CELL_RE = re.compile(r"^(?:\(?-?(?:₹|Rs\.?)?\s*\d[\d,]*(?:\.\d+)?\)?%?|[-–—]|nil)$", re.IGNORECASE)
+CONTEXT_RE = re.compile(
+    r"crore|lakh|million|billion|thousand|balance sheet|profit and loss|highlights|"
+    r"as at|as on|year ended|consolidated|standalone|schedule",
+    re.IGNORECASE,
+)
+
+
+def is_number(text):
+    return bool(NUMBER_CELL_RE.match(text.strip()))
+
+
+def clean_cell(text):
+    return " ".join((text or "").split())
+
+
+def page_lines(words):
+    """
+    Groups PyMuPDF words (x0, y0, x1, y1, text, ...) into visual lines, top
+    to bottom, each a list of words left to right.
+    """
+    lines = []
+    for word in sorted(words, key=lambda word: ((word[1] + word[3]) / 2, word[0])):
+        middle = (word[1] + word[3]) / 2
+        if lines:
+            line = lines[-1]
+            line_middle = (line[0][1] + line[0][3]) / 2
+            if abs(middle - line_middle) <= (line[0][3] - line[0][1]) / 2:
+                line.append(word)
+                continue
+        lines.append([word])
+    return [sorted(line, key=lambda word: word[0]) for line in lines]
+
+
+def line_cells(line):
+    """Splits a line's words into cells at gaps wider than CELL_GAP: [(x0, x1, text)]."""
+    cells = []
+    for x0, _, x1, _, text, *_ in line:
+        if cells and x0 - cells[-1][1] <= CELL_GAP:
+            start, _, previous = cells[-1]
+            cells[-1] = (start, x1, f"{previous} {text}")
+        else:
+            cells.append((x0, x1, text))
+    return cells
+
+
+def amount_cells(cells):
+    """The trailing run of number cells of a line (its amounts)."""
+    count = 0
+    for _, _, text in reversed(cells):
+        if not is_number(text):
+            break
+        count += 1
+    return cells[len(cells) - count:]
+
+
+def table_regions(lines):
+    """
+    Yields (first, last) line indexes of each run of lines that end in
+    amounts, allowing up to MAX_LABEL_LINES label-only lines inside a run.
+    """
+    first = last = None
+    rows = 0
+    for index, cells in enumerate(lines):
+        if amount_cells(cells):
+            if first is None:
+                first, rows = index, 0
+            last = index
+            rows += 1
+        elif first is not None and index - last > MAX_LABEL_LINES:
+            if rows >= MIN_TABLE_ROWS:
+                yield first, last
+            first = None
+    if first is not None and rows >= MIN_TABLE_ROWS:
+        yield first, last
+
+
+def columns_of(rows):
+    """Clusters the amounts' right edges into columns: [(x0, x1)] left to right."""
+    edges = sorted((x1, x0) for cells in rows for x0, x1, _ in amount_cells(cells))
+    columns = []
+    for x1, x0 in edges:
+        if columns and x1 - columns[-1][2] <= COLUMN_TOLERANCE:
+            left, _, _ = columns[-1]
+            columns[-1] = (min(left, x0), x1, x1)
+        else:
+            columns.append((x0, x1, x1))
+    return [(left, right) for left, right, _ in columns]
+
+
+def nearest_column(columns, x0, x1):
+    """The column a cell belongs to: the one it overlaps most, else the nearest right edge."""
+    overlaps = [min(x1, right) - max(x0, left) for left, right in columns]
+    best = max(range(len(columns)), key=lambda index: overlaps[index])
+    if overlaps[best] > 0:
+        return best
+    return min(range(len(columns)), key=lambda index: abs(columns[index][1] - x1))
+
+
+def aligned_row(cells, columns, amounts_only=True):
+    """A line as [label, column cells...]; cells left of the first column join the label."""
+    values = [""] * len(columns)
+    label = []
+    placed = amount_cells(cells) if amounts_only else [cell for cell in cells if cell[1] > columns[0][0]]
+    for x0, x1, text in cells:
+        if (x0, x1, text) in placed:
+            index = nearest_column(columns, x0, x1)
+            values[index] = f"{values[index]} {text}".strip()
+        else:
+            label.append(text)
+    return [" ".join(label)] + values
+
+
+def word_tables(lines):
+    """Tables rebuilt from word positions: a list of row lists per table."""
+    cell_lines = [line_cells(line) for line in lines]
+    tables = []
+    for first, last in table_regions(cell_lines):
+        columns = columns_of(cell_lines[first:last + 1])
+        rows = [aligned_row(cells, columns) for cells in cell_lines[first:last + 1]]
+        # Above the first amounts: short section labels ("ASSETS") and the
+        # column header, a line with cells over the columns.
+        for _ in range(MAX_HEADER_LINES):
+            above = cell_lines[first - 1] if first > 0 else []
+            if any(x1 > columns[0][0] for _, x1, _ in above):
+                rows.insert(0, aligned_row(above, columns, amounts_only=False))
+                first -= 1
+                break
+            if len(above) != 1 or len(above[0][2]) > MAX_LABEL_CHARS:
+                break
+            rows.insert(0, [above[0][2]] + [""] * len(columns))
+            first -= 1
+        tables.append(((first, last), rows))
+    return tables
+
+
+def ruled_tables(page):
+    """Tables PyMuPDF finds from ruling lines: [(bbox, rows)]."""
+    # find_tables is slow; a page without vector graphics cannot hold a ruled table.
+    if not page.get_cdrawings():
+        return []
+    try:
+        found = page.find_tables()
+    except (AttributeError, ValueError, RuntimeError):
+        return []
+    tables = []
+    for table in found.tables:
+        rows = [[clean_cell(cell) for cell in row] for row in table.extract()]
+        rows = [row for row in rows if any(row)]
+        if sum(1 for row in rows if any(is_number(cell) for cell in row[1:] if cell)) < MIN_TABLE_ROWS:
+            continue
+        # Drop columns that are empty in every row (merged cells leave them behind).
+        keep = [index for index in range(len(rows[0])) if any(row[index] for row in rows)]
+        tables.append((table.bbox, [[row[index] for index in keep] for row in rows]))
+    return tables
+
+
+def render_row(row):
+    if not any(row[1:]):
+        return row[0]
+    return CELL_SEPARATOR.join(row)
+
+
+def inside(word, bbox):
+    x_middle, y_middle = (word[0] + word[2]) / 2, (word[1] + word[3]) / 2
+    return bbox[0] <= x_middle <= bbox[2] and bbox[1] <= y_middle <= bbox[3]
+
+
+def page_table_text(page):
+    """
+    The compact text of a page's tables, headed by its short title and unit
+    lines, or "" if the page holds no table.
+    """
+    ruled = ruled_tables(page)
+    words = [word for word in page.get_text("words") if not any(inside(word, bbox) for bbox, _ in ruled)]
+    lines = page_lines(words)
+    found = word_tables(lines)
+    if not ruled and not found:
+        return ""
+
+    in_tables = set()
+    for (first, last), _ in found:
+        in_tables.update(range(first, last + 1))
+    context = []
+    for index, line in enumerate(lines):
+        text = " ".join(word[4] for word in line)
+        if index not in in_tables and len(text) <= MAX_CONTEXT_CHARS and CONTEXT_RE.search(text):
+            context.append(text)
+            if len(context) >= MAX_CONTEXT_LINES:
+                break
+
+    # Tables in reading order, top to bottom.
+    tables = [(bbox[1], rows) for bbox, rows in ruled]
+    tables.extend((lines[first][0][1], rows) for (first, _), rows in found)
+    tables.sort(key=lambda table: table[0])
+    return "\n".join(context + ["\n".join(render_row(row) for row in rows) for _, rows in tables])
@@ -0,0 +1,368 @@
+"""
+Structured timing for the ingest pipeline. Code opens spans around stages,
+page windows and LLM calls; every finished span is appended as one JSON
+line to TELEMETRY_PATH and added to the current trace's per-document
+breakdown. MetricsAggregator turns the JSON lines into Prometheus text for
+the /metrics endpoint in app.py, so spans written by the job worker
+processes are counted as well.
+
+    with telemetry.trace(file="report.pdf") as ingest_trace:
+        with telemetry.span("find", kind="stage"):
+            ...
+        ingest_trace.breakdown()
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") == "1"
+TELEMETRY_PATH = os.getenv("TELEMETRY_PATH", os.path.join("telemetry", "spans.jsonl"))
+
+# Passed to `python ai_agent.py` subprocesses so their spans join the trace.
+TRACE_ID_ENV = "TELEMETRY_TRACE_ID"
+PARENT_ID_ENV = "TELEMETRY_PARENT_ID"
+
+CHARS_PER_TOKEN = 4
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Numeric span attributes summed into trace breakdowns.
+COUNTED_ATTRIBUTES = ("input_tokens", "output_tokens", "retries", "cache_hit", "rate_limit_wait_ms")
+
+_local = threading.local()
+_write_lock = threading.Lock()
+# The trace of the document being processed. Each thread has its own:
+# threads handed work with in_current_trace(), and spans with a parent,
+# report into the trace they were started in.
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+class Span:
+    def __init__(self, name, kind, trace_id, parent_id, attributes, active_trace=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.trace = active_trace
+        self.started = time.time()
+        self.perf_started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_record(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.started, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "pid": os.getpid(),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """Per-document totals of the spans finished while the trace is current."""
+
+    def __init__(self, trace_id=None, **attributes):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.attributes = attributes
+        self.root = None
+        self.perf_started = time.perf_counter()
+        self.stage_seconds = {}
+        self.kind_seconds = {}
+        self.kind_counts = {}
+        self.totals = dict.fromkeys(COUNTED_ATTRIBUTES, 0)
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        with self.lock:
+            if span.kind == "stage":
+                self.stage_seconds[span.name] = self.stage_seconds.get(span.name, 0.0) + span.duration
+            elif span.kind != "document":
+                self.add_time(span.kind, span.duration)
+            for key in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    self.totals[key] += value
+
+    def add_time(self, kind, seconds):
+        """Adds time spent on work too fine-grained for its own span. Call with the lock held."""
+        self.kind_seconds[kind] = self.kind_seconds.get(kind, 0.0) + seconds
+        self.kind_counts[kind] = self.kind_counts.get(kind, 0) + 1
+
+    def breakdown(self):
+        """
+        The timing summary stored with the ingested document. Window and call
+        times are summed over concurrent work, so they can exceed total_ms.
+        """
+        with self.lock:
+            return {
+                "trace_id": self.trace_id,
+                "total_ms": round((time.perf_counter() - self.perf_started) * 1000, 3),
+                "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stage_seconds.items()},
+                "work_ms": {kind: round(seconds * 1000, 3) for kind, seconds in self.kind_seconds.items()},
+                "counts": dict(self.kind_counts),
+                "input_tokens": self.totals["input_tokens"],
+                "output_tokens": self.totals["output_tokens"],
+                "retries": self.totals["retries"],
+                "cache_hits": self.totals["cache_hit"],
+                "rate_limit_wait_ms": round(self.totals["rate_limit_wait_ms"], 3),
+            }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_span():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def trace(**attributes):
+    """Makes a new Trace current for this thread, under a root "document" span."""
+    new_trace = Trace(**attributes)
+    token = _current_trace.set(new_trace)
+    try:
+        with span("ingest", kind="document", **attributes) as root:
+            new_trace.root = root
+            yield new_trace
+    finally:
+        _current_trace.reset(token)
+
+
+def in_current_trace(function):
+    """`function`, bound to run in this thread's current trace wherever it is called."""
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+@contextmanager
+def span(name, kind="stage", parent=None, **attributes):
+    """
+    Times the enclosed block. The parent is `parent`, else the innermost
+    span open on this thread, else the current trace's root; spans opened
+    on pool threads pass their stage span as `parent` explicitly. The span
+    is counted in its parent's trace.
+    """
+    parent = parent or current_span()
+    active_trace = parent.trace if parent else current_trace()
+    parent = parent or (active_trace.root if active_trace else None)
+    if parent:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    elif active_trace:
+        trace_id, parent_id = active_trace.trace_id, None
+    else:
+        trace_id, parent_id = os.environ.get(TRACE_ID_ENV), os.environ.get(PARENT_ID_ENV)
+
+    new_span = Span(name, kind, trace_id, parent_id, attributes, active_trace)
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(new_span)
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.set(error=str(e))
+        raise
+    finally:
+        stack.pop()
+        new_span.duration = time.perf_counter() - new_span.perf_started
+        if active_trace:
+            active_trace.record(new_span)
+        export(new_span)
+
+
+def annotate(**attributes):
+    """Sets attributes on the innermost span open on this thread, if any."""
+    open_span = current_span()
+    if open_span:
+        open_span.set(**attributes)
+
+
+def add_time(kind, seconds):
+    """Adds untraced work (such as page text extraction) to the trace of this thread's open span, or its current trace."""
+    open_span = current_span()
+    active_trace = open_span.trace if open_span else current_trace()
+    if active_trace:
+        with active_trace.lock:
+            active_trace.add_time(kind, seconds)
+
+
+def child_environment():
+    """os.environ plus the ids a subprocess needs to report into this trace."""
+    env = dict(os.environ)
+    active_trace = current_trace()
+    open_span = current_span() or (active_trace.root if active_trace else None)
+    if open_span and open_span.trace_id:
+        env[TRACE_ID_ENV] = open_span.trace_id
+        env[PARENT_ID_ENV] = open_span.span_id
+    return env
+
+
+def export(finished_span):
+    if not TELEMETRY_ENABLED:
+        return
+    line = json.dumps(finished_span.to_record(), default=str) + "\n"
+    try:
+        with _write_lock:
+            directory = os.path.dirname(TELEMETRY_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(TELEMETRY_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"  [Telemetry] Could not write span: {e}")
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+class MetricsAggregator:
+    """
+    Reads the span log incrementally and keeps running totals for
+    Prometheus. A truncated or replaced log is read again from the start;
+    totals already counted are kept, as Prometheus counters should be.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or TELEMETRY_PATH
+        self.offset = 0
+        self.inode = None
+        self.durations = {}
+        self.llm_calls = {}
+        self.agent_calls = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode = stat.st_ino
+            self.offset = 0
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A worker may be mid-write; only whole lines are consumed.
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            try:
+                self.add(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+        self.offset += complete
+
+    def add(self, record):
+        attributes = record.get("attributes") or {}
+        seconds = record["duration_ms"] / 1000
+        key = (record["kind"], record["name"])
+        buckets, total, count = self.durations.get(key, ([0] * len(HISTOGRAM_BUCKETS), 0.0, 0))
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        self.durations[key] = (buckets, total + seconds, count + 1)
+
+        if attributes.get("error"):
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+        if record["kind"] == "llm_call":
+            llm_key = (attributes.get("prompt_type", ""), attributes.get("model", ""))
+            totals = self.llm_calls.setdefault(llm_key, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "retries": 0,
+                                                         "seconds": 0.0, "outcomes": {}})
+            totals["calls"] += 1
+            for field in ("input_tokens", "output_tokens", "retries"):
+                totals[field] += attributes.get(field) or 0
+            totals["seconds"] += seconds
+            outcome = attributes.get("outcome")
+            if outcome:
+                totals["outcomes"][outcome] = totals["outcomes"].get(outcome, 0) + 1
+        elif record["kind"] == "agent_call":
+            cache = {True: "hit", False: "miss"}.get(attributes.get("cache_hit"), "off")
+            agent_key = (attributes.get("prompt_type", ""), cache)
+            self.agent_calls[agent_key] = self.agent_calls.get(agent_key, 0) + 1
+
+    def render(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self.lock:
+            self.refresh()
+            lines = [
+                "# HELP ingest_span_duration_seconds Duration of ingest pipeline spans.",
+                "# TYPE ingest_span_duration_seconds histogram",
+            ]
+            for (kind, name), (buckets, total, count) in sorted(self.durations.items()):
+                labels = [("kind", kind), ("name", name)]
+                for bound, bucket_count in zip(HISTOGRAM_BUCKETS, buckets):
+                    lines.append(f"ingest_span_duration_seconds_bucket{format_labels(labels + [('le', bound)])} {bucket_count}")
+                lines.append(f"ingest_span_duration_seconds_bucket{format_labels(labels + [('le', '+Inf')])} {count}")
+                lines.append(f"ingest_span_duration_seconds_sum{format_labels(labels)} {total:.6f}")
+                lines.append(f"ingest_span_duration_seconds_count{format_labels(labels)} {count}")
+
+            lines += ["# HELP ingest_span_errors_total Spans that ended with an error.",
+                      "# TYPE ingest_span_errors_total counter"]
+            for (kind, name), count in sorted(self.errors.items()):
+                lines.append(f"ingest_span_errors_total{format_labels([('kind', kind), ('name', name)])} {count}")
+
+            lines += ["# HELP ingest_llm_calls_total Requests sent to the model API.",
+                      "# TYPE ingest_llm_calls_total counter"]
+            for (prompt_type, model), totals in sorted(self.llm_calls.items()):
+                labels = [("prompt_type", prompt_type), ("model", model)]
+                lines.append(f"ingest_llm_calls_total{format_labels(labels)} {totals['calls']}")
+
+            lines += ["# HELP ingest_llm_tokens_total Tokens sent to and received from the model API.",
+                      "# TYPE ingest_llm_tokens_total counter"]
+            for (prompt_type, model), totals in sorted(self.llm_calls.items()):
+                for direction in ("input", "output"):
+                    labels = [("prompt_type", prompt_type), ("model", model), ("direction", direction)]
+                    lines.append(f"ingest_llm_tokens_total{format_labels(labels)} {totals[direction + '_tokens']}")
+
+            lines += ["# HELP ingest_llm_retries_total Model API calls that were retried.",
+                      "# TYPE ingest_llm_retries_total counter"]
+            for (prompt_type, model), totals in sorted(self.llm_calls.items()):
+                labels = [("prompt_type", prompt_type), ("model", model)]
+                lines.append(f"ingest_llm_retries_total{format_labels(labels)} {totals['retries']}")
+
+            lines += ["# HELP ingest_llm_call_seconds_total Time spent in model API calls, retries included.",
+                      "# TYPE ingest_llm_call_seconds_total counter"]
+            for (prompt_type, model), totals in sorted(self.llm_calls.items()):
+                labels = [("prompt_type", prompt_type), ("model", model)]
+                lines.append(f"ingest_llm_call_seconds_total{format_labels(labels)} {totals['seconds']:.6f}")
+
+            lines += ["# HELP ingest_llm_outcomes_total Model API calls by outcome (ok, unusable, timeout, error).",
+                      "# TYPE ingest_llm_outcomes_total counter"]
+            for (prompt_type, model), totals in sorted(self.llm_calls.items()):
+                for outcome, count in sorted(totals["outcomes"].items()):
+                    labels = [("prompt_type", prompt_type), ("model", model), ("outcome", outcome)]
+                    lines.append(f"ingest_llm_outcomes_total{format_labels(labels)} {count}")
+
+            lines += ["# HELP ingest_agent_calls_total AI agent calls by response cache outcome.",
+                      "# TYPE ingest_agent_calls_total counter"]
+            for (prompt_type, cache), count in sorted(self.agent_calls.items()):
+                lines.append(f"ingest_agent_calls_total{format_labels([('prompt_type', prompt_type), ('cache', cache)])} {count}")
+
+            return "\n".join(lines) + "\n"
@@ -21,4 +21,17 @@ except Exception as e:
     print(f"An unexpected error occurred with BSON: {e}")
     exit()
 
+print("\nTesting pandas/NumPy import...")
+try:
+    import numpy
+    import pandas
+    print("pandas/NumPy OK.")
+except ImportError:
+    print("--- ERROR: pandas or NumPy is NOT installed. ---")
+    print("--- Please run: pip install numpy pandas ---")
+    exit()
+except Exception as e:
+    print(f"An unexpected error occurred with pandas/NumPy: {e}")
+    exit()
+
 print("\nAll new imports seem to be working.")
\ No newline at end of file
@@ -0,0 +1,87 @@
+import pytest
+
+import analytics
+import db
+
+BALANCE_SHEET = {"unit": "crore", "total_assets": 1000, "total_liabilities": 900, "total_shareholders_equity": 100}
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db, "get_db", lambda: database)
+    return db.get_reports_collection()
+
+
+def report(bank_key, report_year, profit, **fields):
+    return {"bank_key": bank_key, "bank_name": bank_key.upper(), "report_year": report_year,
+            "data": {"profit_after_tax_cr": profit, "deposits_cr": "2 lakh crore"}, **fields}
+
+
+def save(reports, document):
+    report_id = reports.insert_one(document).inserted_id
+    analytics.refresh_report(report_id, reports)
+    return report_id
+
+
+def test_rows_are_normalized_and_incomplete_reports_skipped():
+    rows = analytics.metric_rows([
+        dict(report("hdfc", "2024-25", "25,000"), _id=1, balance_sheet=BALANCE_SHEET),
+        dict(report("sbi", None, 100), _id=2),
+        {"_id": 3, "report_year": "2024-25", "data": {}},
+    ])
+    [row] = rows
+    assert row["_id"] == "hdfc:2024-25" and row["year_start"] == 2024 and row["report_id"] == 1
+    assert (row["profit_after_tax_cr"], row["deposits_cr"], row["total_assets"]) == (25000, 200000, 1000)
+    assert row["advances_cr"] is None
+
+
+def test_balance_sheet_mixing_units_has_no_metrics():
+    mixed = {"total_assets": "1000 crore", "total_liabilities": 9_000_000, "total_shareholders_equity": 1_000_000}
+    [row] = analytics.metric_rows([dict(report("hdfc", "2024-25", 1), _id=1, balance_sheet=mixed)])
+    assert row["total_assets"] is None and row["profit_after_tax_cr"] == 1
+
+
+def test_refresh_follows_a_report_that_moves_year(reports):
+    report_id = save(reports, report("hdfc", "2023-24", 100))
+    assert analytics.get_collection().find_one({"_id": "hdfc:2023-24"})["profit_after_tax_cr"] == 100
+
+    reports.update_one({"_id": report_id}, {"$set": {"report_year": "2024-25"}})
+    analytics.refresh_report(report_id, reports)
+    assert [row["_id"] for row in analytics.get_collection().find()] == ["hdfc:2024-25"]
+
+    reports.delete_one({"_id": report_id})
+    analytics.refresh_report(report_id, reports)
+    assert analytics.get_collection().count_documents({}) == 0
+
+
+def test_rank_defaults_to_the_latest_year(reports):
+    for bank_key, profit in (("hdfc", 300), ("sbi", 500), ("icici", 400), ("axis", None)):
+        save(reports, report(bank_key, "2024-25", profit))
+    save(reports, report("hdfc", "2023-24", 900))
+
+    year, rows = analytics.rank("profit_after_tax_cr", limit=2)
+    assert year == "2024-25"
+    assert [(row["rank"], row["bank_key"], row["profit_after_tax_cr"]) for row in rows] == [(1, "sbi", 500), (2, "icici", 400)]
+
+    _, rows = analytics.rank("profit_after_tax_cr", bank_keys=["hdfc", "axis"], ascending=True)
+    assert [row["bank_key"] for row in rows] == ["hdfc"]
+    assert analytics.rank("profit_after_tax_cr", report_year="2019-20") == ("2019-20", [])
+
+
+def test_time_series_and_query(reports):
+    for year, profit in (("2022-23", 100), ("2024-25", 300), ("2023-24", 200)):
+        save(reports, report("hdfc", year, profit))
+    save(reports, report("sbi", "2024-25", 50))
+
+    series = analytics.time_series(["profit_after_tax_cr"], from_year=2023)
+    assert [point["profit_after_tax_cr"] for point in series["hdfc"]["points"]] == [200, 300]
+    assert [point["report_year"] for point in series["sbi"]["points"]] == ["2024-25"]
+
+    total, rows = analytics.query(ranges={"profit_after_tax_cr": (100, None)}, sort="profit_after_tax_cr",
+                                  metrics=["profit_after_tax_cr"], limit=2)
+    assert total == 3
+    assert [(row["report_year"], row["profit_after_tax_cr"]) for row in rows] == [("2024-25", 300), ("2023-24", 200)]
+    assert set(rows[0]) == {"bank_key", "bank_name", "report_year", "year_start", "profit_after_tax_cr", "report_id"}
+
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from chunk_scanner import TokenBucket, scan_windows
+
+
+class RecordingCheck:
+    """check_window for scan_windows: YES for `matches`, after `delays` seconds per window."""
+
+    def __init__(self, matches, delays=None):
+        self.matches = set(matches)
+        self.delays = delays or {}
+        self.checked = []
+        self.lock = threading.Lock()
+
+    def __call__(self, window):
+        with self.lock:
+            self.checked.append(window)
+        time.sleep(self.delays.get(window, 0.0))
+        return window in self.matches
+
+
+def test_no_match():
+    check = RecordingCheck(matches=[])
+    assert scan_windows(list(range(10)), check, max_workers=3) is None
+    assert sorted(check.checked) == list(range(10))
+
+
+def test_earliest_match_wins_even_when_a_later_one_answers_first():
+    # Window 5 says YES at once while window 1 is still being checked.
+    check = RecordingCheck(matches=[1, 5], delays={0: 0.05, 1: 0.2})
+    assert scan_windows(list(range(8)), check, max_workers=8) == 1
+
+
+def test_windows_after_the_match_are_not_dispatched():
+    check = RecordingCheck(matches=[2], delays={window: 0.02 for window in range(50)})
+    assert scan_windows(list(range(50)), check, max_workers=2) == 2
+    # Only windows already in flight when window 2 answered may have run.
+    assert max(check.checked) <= 4
+    assert len(check.checked) < 10
+
+
+def test_sequential_scan_with_one_worker():
+    check = RecordingCheck(matches=[3, 6])
+    assert scan_windows(list(range(10)), check, max_workers=1) == 3
+    assert check.checked == [0, 1, 2, 3]
+
+
+def test_empty_window_list():
+    assert scan_windows([], RecordingCheck(matches=[]), max_workers=4) is None
+
+
+def test_token_bucket_paces_acquires_beyond_its_capacity():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # Two tokens are there at once; the other three take 1/50 s each.
+    assert time.monotonic() - started >= 0.05
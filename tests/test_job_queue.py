@@ -0,0 +1,133 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import ingest_processor
+import job_queue
+
+
+@pytest.fixture(autouse=True)
+def job_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs" / "jobs.sqlite3")
+    monkeypatch.setattr(job_queue, "JOB_DB_PATH", path)
+    job_queue.init_db()
+    return path
+
+
+def test_jobs_are_claimed_oldest_first_and_once():
+    first = job_queue.enqueue_job("uploads/a.pdf", "a.pdf")
+    second = job_queue.enqueue_job("uploads/b.pdf", "b.pdf")
+
+    job = job_queue.claim_next_job(worker_pid=101)
+    assert job["id"] == first
+    assert (job["status"], job["stage"], job["worker_pid"]) == ("running", "starting", 101)
+    assert job_queue.claim_next_job(worker_pid=102)["id"] == second
+    assert job_queue.claim_next_job(worker_pid=103) is None
+
+
+def test_concurrent_workers_never_claim_the_same_job():
+    for n in range(20):
+        job_queue.enqueue_job(f"uploads/{n}.pdf", f"{n}.pdf")
+    claimed = []
+
+    def worker(pid):
+        while True:
+            job = job_queue.claim_next_job(pid)
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker, args=(pid,)) for pid in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == len(set(claimed)) == 20
+
+
+def test_jobs_of_dead_workers_are_requeued():
+    orphaned = job_queue.enqueue_job("uploads/a.pdf", "a.pdf")
+    alive = job_queue.enqueue_job("uploads/b.pdf", "b.pdf")
+    # Above the largest PID Linux hands out, so never a live process.
+    job_queue.claim_next_job(worker_pid=2 ** 22 + 12345)
+    job_queue.claim_next_job(worker_pid=os.getpid())
+
+    job_queue.requeue_interrupted_jobs()
+    assert job_queue.get_job(orphaned)["status"] == "queued"
+    assert job_queue.get_job(orphaned)["worker_pid"] is None
+    assert job_queue.get_job(alive)["status"] == "running"
+
+
+@pytest.mark.parametrize("result, status", [(True, "done"), (False, "failed"), (RuntimeError("boom"), "failed")])
+def test_run_job_records_the_outcome_and_progress(monkeypatch, result, status):
+    def process_file(file_path, progress=None):
+        progress("extracting", 0.5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(ingest_processor, "process_file", process_file)
+    job_id = job_queue.enqueue_job("uploads/a.pdf", "a.pdf")
+    job_queue.run_job(job_queue.claim_next_job(os.getpid()))
+
+    job = job_queue.get_job(job_id)
+    assert job["status"] == status
+    assert job["finished_at"] is not None
+    if status == "done":
+        assert (job["stage"], job["progress"]) == ("done", 1.0)
+    else:
+        assert (job["stage"], job["progress"]) == ("extracting", 0.5)
+        assert job["message"]
+
+
+def test_worker_loop_runs_queued_jobs_until_stopped(monkeypatch):
+    stop_event = threading.Event()
+    processed = []
+
+    def process_file(file_path, progress=None):
+        processed.append(file_path)
+        if len(processed) == 2:
+            stop_event.set()
+        return True
+
+    monkeypatch.setattr(ingest_processor, "process_file", process_file)
+    job_queue.enqueue_job("uploads/a.pdf", "a.pdf")
+    job_queue.enqueue_job("uploads/b.pdf", "b.pdf")
+    job_queue.enqueue_job("uploads/c.pdf", "c.pdf")
+
+    job_queue.worker_loop(stop_event, poll_interval=0.01)
+    assert processed == ["uploads/a.pdf", "uploads/b.pdf"]
+    assert job_queue.claim_next_job(os.getpid())["file_path"] == "uploads/c.pdf"
+
+
+def test_same_content_is_queued_once_while_in_progress():
+    job_id, created = job_queue.enqueue_unique_job("uploads/ab/ab12.pdf", "a.pdf", "ab12")
+    assert created
+    assert job_queue.enqueue_unique_job("uploads/ab/ab12.pdf", "copy.pdf", "ab12") == (job_id, False)
+    job_queue.claim_next_job(os.getpid())
+    assert job_queue.enqueue_unique_job("uploads/ab/ab12.pdf", "copy.pdf", "ab12") == (job_id, False)
+
+    job_queue.update_job(job_id, status="failed")
+    retry_id, created = job_queue.enqueue_unique_job("uploads/ab/ab12.pdf", "a.pdf", "ab12")
+    assert created and retry_id != job_id
+    assert job_queue.enqueue_unique_job("uploads/cd/cd34.pdf", "b.pdf", "cd34")[1]
+
+
+def test_stop_workers_waits_for_idle_workers_and_terminates_busy_ones(job_db, monkeypatch):
+    monkeypatch.setenv("JOB_DB_PATH", job_db)
+    monkeypatch.setenv("JOB_POLL_INTERVAL", "0.05")
+    monkeypatch.setattr(job_queue.atexit, "register", lambda *args: None)
+    processes, stop_event = job_queue.start_workers(1)
+    assert not processes[0].daemon
+    # A worker stuck in a long job does not look at the stop event.
+    busy = job_queue.multiprocessing.get_context("spawn").Process(target=time.sleep, args=(60,))
+    busy.start()
+
+    started = time.monotonic()
+    job_queue.stop_workers(processes + [busy], stop_event, timeout=3)
+    assert time.monotonic() - started < 30
+    assert processes[0].exitcode == 0
+    assert busy.exitcode == -signal.SIGTERM
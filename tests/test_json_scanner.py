@@ -0,0 +1,87 @@
+import pytest
+
+import ai_agent
+import json_scanner
+from json_scanner import ResponseParseError, find_objects, parse_response
+
+SUMMARY_SCHEMA = ai_agent.RESPONSE_SCHEMAS["extract"]
+BALANCE_SHEET_SCHEMA = ai_agent.RESPONSE_SCHEMAS["extract_balance_sheet"]
+
+
+def test_whole_response_is_the_object():
+    assert parse_response('{"total_assets": 100}', BALANCE_SHEET_SCHEMA) == {"total_assets": 100}
+
+
+def test_markdown_fences_and_prose_around_the_object():
+    text = 'Here is the data:\n```json\n{"total_assets": 100}\n```\nLet me know if you need more.'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA) == {"total_assets": 100}
+
+
+def test_stray_braces_in_prose_are_ignored():
+    text = 'The schema uses {placeholders} like {x}. Answer: {"total_assets": 5} and a closing } here.'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA) == {"total_assets": 5}
+
+
+def test_unclosed_brace_before_the_object():
+    text = 'Thinking about { the balance sheet...\n{"total_assets": 7}'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA) == {"total_assets": 7}
+
+
+def test_braces_inside_string_values_do_not_count():
+    text = '{"bank_name": "A {weird} } bank", "report_year": "2024-25"}'
+    assert parse_response(text, SUMMARY_SCHEMA)["bank_name"] == "A {weird} } bank"
+
+
+def test_last_object_fitting_the_schema_wins():
+    text = 'Example: {"foo": 1}. Draft: {"total_assets": 1}. Final: {"total_assets": 2} {"note": "done"}'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA) == {"total_assets": 2}
+
+
+def test_trailing_commas_and_smart_quotes_are_repaired():
+    text = '{“total_assets”: 100, "asset_breakdown": {"investments": 5,},}'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA) == {"total_assets": 100, "asset_breakdown": {"investments": 5}}
+
+
+def test_cut_off_object_is_not_answered_with_an_earlier_draft():
+    text = 'Draft: {"total_assets": 1}\nFinal: {"total_assets": 2, "asset_breakdown": {"investm'
+    with pytest.raises(ResponseParseError):
+        parse_response(text, BALANCE_SHEET_SCHEMA)
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "{not json}", "{", None])
+def test_no_usable_object(text):
+    with pytest.raises(ResponseParseError):
+        parse_response(text, BALANCE_SHEET_SCHEMA)
+
+
+def test_schema_coercion():
+    text = ('{"bank_name": 42, "report_year": "2024-25", "data": {"deposits_cr": "1,23,456", '
+            '"profit_after_tax_cr": "(1,234)", "advances_cr": 100.0, "return_on_equity_percent": "14.5", '
+            '"dividend_per_share_inr": "N/A", "balance_sheet_size_cr": "12 lakh"}}')
+    parsed = parse_response(text, SUMMARY_SCHEMA)
+    assert parsed["bank_name"] == "42"
+    assert parsed["data"] == {
+        "deposits_cr": 123456, "profit_after_tax_cr": -1234, "advances_cr": 100,
+        "return_on_equity_percent": 14.5, "dividend_per_share_inr": None,
+        # Units are left for validation.py to convert.
+        "balance_sheet_size_cr": "12 lakh",
+    }
+
+
+def test_nested_object_sent_as_a_string_is_parsed():
+    text = '{"total_assets": 10, "asset_breakdown": "{\\"investments\\": \\"5\\"}"}'
+    assert parse_response(text, BALANCE_SHEET_SCHEMA)["asset_breakdown"] == {"investments": 5}
+
+
+def test_scanner_finds_objects_split_across_chunks():
+    scanner = json_scanner.ObjectScanner()
+    found = []
+    for chunk in ['noise {"a": "x}', '", "b": {"c"', ': 1}} tail {"d": 2}']:
+        found += scanner.feed(chunk)
+    found += scanner.finish()
+    assert found == ['{"a": "x}", "b": {"c": 1}}', '{"d": 2}']
+    assert not scanner.truncated
+
+
+def test_find_objects_in_order():
+    assert find_objects('{"a": 1} text {"b": {"c": 2}}') == ['{"a": 1}', '{"b": {"c": 2}}']
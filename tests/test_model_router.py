@@ -0,0 +1,106 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ai_agent
+import model_router
+import telemetry
+from model_router import ModelRouter, ModelTimeoutError
+
+
+def test_model_settings_split_at_the_last_equals_sign():
+    assert model_router.model_list(" a, b ,,c ") == ["a", "b", "c"]
+    assert model_router.model_settings("vendor/model:free=2,other=16", int) == {"vendor/model:free": 2, "other": 16}
+    with pytest.raises(ValueError):
+        model_router.model_settings("no-setting", int)
+
+
+def test_routes_from_environment(monkeypatch):
+    monkeypatch.setenv("AI_FINDER_MODELS", "fast,backup")
+    monkeypatch.setenv("AI_EXTRACTOR_MODELS", "strong")
+    monkeypatch.setenv("AI_MODELS_FIND_BOTH", "special")
+    routes = model_router.routes_from_environment(("find", "find_both", "extract", "extract_balance_sheet"))
+    assert routes == {"find": ["fast", "backup"], "find_both": ["special"],
+                      "extract": ["strong"], "extract_balance_sheet": ["strong"]}
+    assert ModelRouter(routes).route_key("find") == "fast,backup"
+
+
+def test_slot_limits_calls_in_flight_per_model():
+    router = ModelRouter({}, concurrency={"slow": 2})
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with router.slot("slow"):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+
+def test_stats_report_accuracy_and_latency():
+    router = ModelRouter({})
+    router.record("m", "find", "ok", 1.0)
+    router.record("m", "find", "ok", 3.0)
+    router.record("m", "find", "unusable", 2.0, fell_back=True)
+    router.record("m", "find", "timeout", fell_back=True)
+    [row] = router.stats()
+    assert (row["calls"], row["ok"], row["unusable"], row["timeout"], row["fallbacks"]) == (4, 2, 1, 1, 2)
+    assert row["accuracy"] == pytest.approx(2 / 3)
+    assert (row["p50_seconds"], row["p95_seconds"]) == (2.0, 3.0)
+
+
+class FakeClient:
+    """Answers chat completions from a {model: answer or exception} table."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.calls.append(model)
+        answer = self.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = ModelRouter({"find": ["fast", "backup", "last"], "extract": ["only"]})
+    monkeypatch.setattr(ai_agent, "ROUTER", router)
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", False)
+    return router
+
+
+def test_unusable_and_timed_out_models_fall_back_to_the_next(router):
+    client = FakeClient({"fast": "Maybe?", "backup": ModelTimeoutError("too slow"), "last": "YES"})
+    assert ai_agent.get_ai_response(client, {}, "page text", "find", stream=False) == "YES"
+    assert client.calls == ["fast", "backup", "last"]
+    outcomes = {row["model"]: (row["ok"], row["unusable"], row["timeout"], row["fallbacks"]) for row in router.stats()}
+    assert outcomes == {"fast": (0, 1, 0, 1), "backup": (0, 0, 1, 1), "last": (1, 0, 0, 0)}
+
+
+def test_first_usable_answer_is_returned(router):
+    client = FakeClient({"fast": "NO", "backup": "YES", "last": "YES"})
+    assert ai_agent.get_ai_response(client, {}, "page text", "find", stream=False) == "NO"
+    assert client.calls == ["fast"]
+
+
+def test_last_model_answer_is_returned_even_if_unusable(router):
+    client = FakeClient({"only": "not JSON"})
+    assert ai_agent.get_ai_response(client, {}, "page text", "extract", stream=False) == "not JSON"
+    assert [row["unusable"] for row in router.stats()] == [1]
@@ -0,0 +1,95 @@
+import fitz
+import pytest
+
+import pdf_document
+from pdf_document import MmapPageStore, PdfDocument
+
+
+def write_pdf(path, texts):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((50, 50), text, fontsize=11)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    return write_pdf(str(tmp_path / "report.pdf"), [f"Page {n} of the annual report" for n in range(1, 13)])
+
+
+def test_mmap_page_store_reads_back_what_was_written(tmp_path):
+    store = MmapPageStore(4, spill_dir=str(tmp_path))
+    store[2] = "Balance sheet ₹ in crore"
+    assert 2 in store and 0 not in store
+    assert store[2] == "Balance sheet ₹ in crore"
+    store[0] = ""
+    store[3] = "x" * 100_000
+    assert (store[0], store[3], store[2]) == ("", "x" * 100_000, "Balance sheet ₹ in crore")
+    store.close()
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_pages_are_extracted_once_and_windows_joined(pdf_path, monkeypatch, spill):
+    with PdfDocument(pdf_path, spill=spill) as pdf:
+        assert isinstance(pdf.pages, MmapPageStore) == spill
+        assert len(pdf) == 12
+        assert pdf.page_text(0).strip() == "Page 1 of the annual report"
+        assert pdf.window(0, 3) == "".join(pdf.page_text(n) for n in range(3))
+        assert pdf.window(11, 20) == pdf.page_text(11)
+
+        monkeypatch.setattr(pdf.doc, "load_page", None)
+        assert pdf.page_text(1).strip() == "Page 2 of the annual report"
+        assert [n for n, _ in pdf.iter_pages(11)] == [11]
+
+
+def test_large_documents_spill_to_disk(pdf_path, monkeypatch):
+    monkeypatch.setattr(pdf_document, "SPILL_PAGE_THRESHOLD", 12)
+    with PdfDocument(pdf_path) as pdf:
+        assert isinstance(pdf.pages, MmapPageStore)
+    monkeypatch.setattr(pdf_document, "SPILL_PAGE_THRESHOLD", 13)
+    with PdfDocument(pdf_path) as pdf:
+        assert isinstance(pdf.pages, dict)
+    monkeypatch.setattr(pdf_document, "SPILL_PAGE_THRESHOLD", 0)
+    with PdfDocument(pdf_path) as pdf:
+        assert isinstance(pdf.pages, dict)
+
+
+def test_fingerprints_ignore_whitespace_and_blank_pages():
+    assert pdf_document.fingerprint_text("Total  assets\n1,000") == pdf_document.fingerprint_text("Total assets 1,000 ")
+    assert pdf_document.fingerprint_text(" \n") is None
+
+
+@pytest.fixture
+def page_pool():
+    yield
+    pdf_document.shutdown_page_pool()
+
+
+def test_pool_yields_every_page_in_order(pdf_path, page_pool):
+    with fitz.open(pdf_path) as doc:
+        expected = [page.get_text() for page in doc]
+    pages = list(pdf_document.iter_page_texts(pdf_path, 12, workers=2, batch_size=5))
+    assert pages == list(enumerate(expected))
+
+
+def test_prefetch_fills_the_cache_from_the_pool(pdf_path, page_pool, monkeypatch):
+    monkeypatch.setattr(pdf_document, "PARALLEL_PAGE_THRESHOLD", 12)
+    with PdfDocument(pdf_path, spill=True) as pdf:
+        assert not pdf.prefetch(workers=1)
+        assert pdf.prefetch(workers=2)
+        assert not pdf.prefetch(workers=2)
+        # Readers wait for the pool instead of extracting pages themselves.
+        monkeypatch.setattr(pdf.doc, "load_page", None)
+        assert pdf.page_text(11).strip() == "Page 12 of the annual report"
+        pdf.prefetch_thread.join()
+        assert not pdf.prefetching
+        assert [text.strip() for _, text in pdf.iter_pages()] == [f"Page {n} of the annual report" for n in range(1, 13)]
+
+
+def test_small_documents_are_not_prefetched(pdf_path, monkeypatch):
+    monkeypatch.setattr(pdf_document, "PARALLEL_PAGE_THRESHOLD", 13)
+    with PdfDocument(pdf_path) as pdf:
+        assert not pdf.prefetch(workers=4)
+        assert pdf.prefetch_thread is None
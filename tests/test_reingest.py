@@ -0,0 +1,167 @@
+import pytest
+
+import reingest
+from reingest import affected_windows, changed_pages, locate_window, page_overlap
+
+OLD = [f"page-{n}" for n in range(20)]
+
+
+def test_identical_versions_overlap_fully():
+    assert page_overlap(OLD, list(OLD)) == 1.0
+    assert changed_pages(OLD, list(OLD)) == set()
+
+
+def test_overlap_ignores_empty_pages():
+    assert page_overlap([None, "a", "b"], ["a", "b", None, None]) == 1.0
+    assert page_overlap([None], ["a"]) == 0.0
+
+
+def test_changed_pages_are_those_not_in_the_old_version():
+    new = list(OLD)
+    new[3] = "corrected-3"
+    new.insert(10, "inserted")
+    assert changed_pages(OLD, new) == {3, 10}
+    assert page_overlap(OLD, new) == pytest.approx(19 / 21)
+
+
+def test_moved_pages_are_not_changed():
+    new = OLD[10:] + OLD[:10]
+    assert changed_pages(OLD, new) == set()
+
+
+def test_window_is_found_where_it_moved():
+    new = ["cover", "preface"] + OLD
+    assert locate_window(OLD, (5, 8), new) == (7, 10)
+
+
+def test_window_with_a_changed_page_is_not_found():
+    new = list(OLD)
+    new[6] = "corrected-6"
+    assert locate_window(OLD, (5, 8), new) is None
+
+
+def test_closest_repeat_of_a_window_is_preferred():
+    old = ["x", "y", "z", "w", "a", "b"]
+    new = ["a", "b", "x", "y", "z", "w", "a", "b"]
+    assert locate_window(old, (4, 6), new) == (6, 8)
+
+
+def test_window_of_empty_pages_is_not_located():
+    assert locate_window([None, None, "a"], (0, 2), [None, None, "a"]) is None
+
+
+def test_affected_windows():
+    windows = [(0, 3), (2, 5), (4, 7), (6, 9)]
+    assert affected_windows(windows, {4}) == [(2, 5), (4, 7)]
+    assert affected_windows(windows, set()) == []
+
+
+def test_find_previous_version_picks_the_best_match():
+    mongomock = pytest.importorskip("mongomock")
+    reports = mongomock.MongoClient().db.reports
+    reports.insert_many([
+        {"_id": "close", "page_fingerprints": OLD[:18] + ["other-1", "other-2"]},
+        {"_id": "same", "page_fingerprints": OLD},
+        {"_id": "unrelated", "page_fingerprints": ["u-1", "u-2", "page-0"]},
+    ])
+    document, overlap = reingest.find_previous_version(reports, OLD)
+    assert document["_id"] == "same" and overlap == 1.0
+    assert reingest.find_previous_version(reports, ["u-1", "new-1", "new-2", "new-3", "new-4"]) is None
+
+
+class FakePdf:
+    def __init__(self, fingerprints):
+        self.page_fingerprints = fingerprints
+
+    def fingerprints(self):
+        return self.page_fingerprints
+
+    def sha256(self):
+        return "sha-" + str(hash(tuple(self.page_fingerprints)))
+
+    def prefetch(self):
+        pass
+
+    def __len__(self):
+        return len(self.page_fingerprints)
+
+
+@pytest.fixture
+def stored_reports(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    import ingest_processor
+
+    reports = mongomock.MongoClient().db.reports
+    monkeypatch.setattr(ingest_processor.db, "get_reports_collection", lambda: reports)
+    monkeypatch.setattr(ingest_processor.db, "check_health", lambda: True)
+    monkeypatch.setattr(ingest_processor.analytics, "refresh_report", lambda *args: None)
+    monkeypatch.setattr(ingest_processor, "extraction_text", lambda pdf, window: "")
+    return reports
+
+
+def test_changed_balance_sheet_not_found_falls_back_to_the_full_workflow(stored_reports, monkeypatch):
+    import ingest_processor
+
+    stored_reports.insert_one({"_id": "report", "page_fingerprints": OLD, "content_hashes": ["sha-old"],
+                               "source_pages": {"summary": [2, 5], "balance_sheet": [12, 16]},
+                               "bank_name": "HDFC Bank", "balance_sheet": {"old": True}})
+    monkeypatch.setattr(ingest_processor, "PIPELINE_MODE", "single_pass")
+    # The rescan around the changed page finds nothing; the full walk finds the summary only.
+    monkeypatch.setattr(ingest_processor, "find_chunks_single_pass",
+                        lambda *args, windows=None, **kwargs: {} if windows else {"summary": (2, 5)})
+    monkeypatch.setattr(ingest_processor, "extract_checked",
+                        lambda section, text, stage: ({"bank_name": "HDFC Bank", "net_profit": 2}, None))
+    new = list(OLD)
+    new[13] = "corrected-13"
+
+    previous, overlap = ingest_processor.match_previous_version(FakePdf(new))
+    assert ingest_processor.process_reingest(FakePdf(new), previous, overlap) is None
+
+    assert ingest_processor.process_document(FakePdf(new)) is True
+    assert stored_reports.count_documents({}) == 1
+    report = stored_reports.find_one({"_id": "report"})
+    assert report["page_fingerprints"] == new and report["net_profit"] == 2
+    assert report["revision"] == 1
+    assert report["content_hashes"] == ["sha-old", FakePdf(new).sha256()]
+    # The stored balance sheet came from the old pages.
+    assert "balance_sheet" not in report and "balance_sheet" not in report["source_pages"]
+
+
+def test_unchanged_report_without_a_balance_sheet_is_not_rescanned(stored_reports, monkeypatch):
+    import ingest_processor
+
+    stored_reports.insert_one({"_id": "report", "page_fingerprints": OLD,
+                               "source_pages": {"summary": [2, 5]}, "bank_name": "HDFC Bank"})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("nothing should be scanned or extracted")
+
+    monkeypatch.setattr(ingest_processor, "find_chunks_single_pass", fail)
+    monkeypatch.setattr(ingest_processor, "extract_checked", fail)
+
+    assert ingest_processor.process_document(FakePdf(list(OLD))) is True
+    assert stored_reports.count_documents({}) == 1
+    report = stored_reports.find_one({"_id": "report"})
+    assert report["bank_name"] == "HDFC Bank" and report["revision"] == 1
+    assert "balance_sheet" not in report["source_pages"]
+
+
+def test_report_without_a_balance_sheet_looks_for_one_in_changed_pages(stored_reports, monkeypatch):
+    import ingest_processor
+
+    stored_reports.insert_one({"_id": "report", "page_fingerprints": OLD,
+                               "source_pages": {"summary": [2, 5]}, "bank_name": "HDFC Bank"})
+    scans = []
+
+    def find(*args, windows=None, targets=None, **kwargs):
+        scans.append(targets)
+        return {}
+
+    monkeypatch.setattr(ingest_processor, "find_chunks_single_pass", find)
+    new = list(OLD)
+    new[13] = "corrected-13"
+
+    assert ingest_processor.process_document(FakePdf(new)) is True
+    assert scans == [["balance_sheet"]]
+    report = stored_reports.find_one({"_id": "report"})
+    assert report["page_fingerprints"] == new and "balance_sheet" not in report["source_pages"]
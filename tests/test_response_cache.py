@@ -0,0 +1,104 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "responses.sqlite3")
+
+
+def stored_bytes(cache):
+    return cache.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+def test_key_depends_on_text_prompt_type_model_and_prompt():
+    key = make_key("page text", "find", "model-a", "prompt")
+    assert key == make_key("page text", "find", "model-a", "prompt")
+    assert len({key, make_key("other text", "find", "model-a", "prompt"),
+                make_key("page text", "extract", "model-a", "prompt"),
+                make_key("page text", "find", "model-b", "prompt"),
+                make_key("page text", "find", "model-a", "reworded prompt")}) == 5
+
+
+def test_hits_and_misses(cache_path, clock):
+    cache = ResponseCache(cache_path)
+    assert cache.get("key") is None
+    cache.put("key", "YES")
+    assert cache.get("key") == "YES"
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_expired_responses_are_misses(cache_path, clock):
+    cache = ResponseCache(cache_path, ttl_seconds=10)
+    cache.put("key", "YES")
+    clock.now += 60
+    assert cache.get("key") is None
+    assert cache.total_bytes == stored_bytes(cache) == 0
+
+
+def test_expired_responses_are_purged_on_open(cache_path, clock):
+    ResponseCache(cache_path, ttl_seconds=10).put("key", "YES")
+    clock.now += 60
+    cache = ResponseCache(cache_path, ttl_seconds=10)
+    assert stored_bytes(cache) == 0
+
+
+def test_least_recently_used_responses_are_evicted(cache_path, clock):
+    cache = ResponseCache(cache_path, max_bytes=30)
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 10)
+    assert cache.get("a") is not None
+    cache.put("d", "x" * 10)
+    assert cache.get("b") is None
+    assert all(cache.get(key) for key in ("a", "c", "d"))
+    assert cache.total_bytes == stored_bytes(cache) == 30
+
+
+def test_byte_count_follows_writes_and_replacements(cache_path, clock):
+    cache = ResponseCache(cache_path)
+    cache.put("a", "x" * 10)
+    cache.put("b", "ü" * 5)
+    cache.put("a", "x" * 4)
+    assert cache.total_bytes == stored_bytes(cache) == 14
+
+
+def test_writes_by_other_processes_are_counted_before_evicting(cache_path, clock):
+    cache = ResponseCache(cache_path, max_bytes=30)
+    other = ResponseCache(cache_path, max_bytes=30)
+    other.put("theirs-1", "x" * 10)
+    other.put("theirs-2", "x" * 10)
+    cache.put("mine", "x" * 10)
+    # Only 10 bytes were written here, but the file now holds 30.
+    assert cache.total_bytes == 10
+    cache.put("mine-2", "x" * 25)
+    assert cache.total_bytes == stored_bytes(cache) == 25
+    assert all(cache.get(key) is None for key in ("theirs-1", "theirs-2", "mine"))
+
+
+def test_byte_count_is_recounted_periodically(cache_path, clock, monkeypatch):
+    monkeypatch.setattr(response_cache, "CACHE_RECOUNT_WRITES", 3)
+    cache = ResponseCache(cache_path)
+    ResponseCache(cache_path).put("theirs", "x" * 100)
+    cache.put("a", "x")
+    cache.put("b", "x")
+    assert cache.total_bytes == 2
+    cache.put("c", "x")
+    assert cache.total_bytes == 103 and cache.writes_since_recount == 0
@@ -0,0 +1,119 @@
+import email.utils
+import time
+
+import httpx
+import openai
+import pytest
+
+import retry_policy
+from retry_policy import (AdaptiveThrottle, CircuitBreaker, CircuitOpenError, RetryPolicy, error_status,
+                          is_retryable, retry_after_seconds)
+
+REQUEST = httpx.Request("POST", "http://stub/v1/chat/completions")
+
+
+def status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers, request=REQUEST)
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+@pytest.mark.parametrize("status", [408, 409, 425, 429, 500, 502, 503, 504, 529])
+def test_retryable_statuses(status):
+    assert is_retryable(status_error(status))
+    assert error_status(status_error(status)) == status
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 422])
+def test_other_client_errors_fail_straight_away(status):
+    assert not is_retryable(status_error(status))
+
+
+def test_timeouts_and_dropped_connections_are_retryable():
+    assert is_retryable(openai.APITimeoutError(request=REQUEST))
+    assert is_retryable(openai.APIConnectionError(request=REQUEST))
+    assert is_retryable(httpx.ReadError("connection reset"))
+
+
+def test_errors_without_a_response_are_not_retryable():
+    assert not is_retryable(ValueError("bad input"))
+    assert error_status(ValueError("bad input")) is None
+
+
+def test_retry_after_in_seconds_and_milliseconds():
+    assert retry_after_seconds(status_error(429, {"retry-after": "2.5"})) == 2.5
+    assert retry_after_seconds(status_error(429, {"retry-after-ms": "1500"})) == 1.5
+    # retry-after-ms is the more precise of the two.
+    assert retry_after_seconds(status_error(429, {"retry-after-ms": "100", "retry-after": "1"})) == 0.1
+
+
+def test_retry_after_as_an_http_date():
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert retry_after_seconds(status_error(503, {"retry-after": date})) == pytest.approx(30, abs=2)
+
+
+def test_retry_after_is_capped_and_never_negative():
+    assert retry_after_seconds(status_error(429, {"retry-after": "100000"})) == retry_policy.RETRY_AFTER_MAX
+    assert retry_after_seconds(status_error(429, {"retry-after": "-5"})) == 0.0
+    past = email.utils.formatdate(time.time() - 60, usegmt=True)
+    assert retry_after_seconds(status_error(429, {"retry-after": past})) == 0.0
+
+
+def test_missing_or_unreadable_retry_after():
+    assert retry_after_seconds(status_error(429)) is None
+    assert retry_after_seconds(status_error(429, {"retry-after": "soon"})) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+
+def test_backoff():
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=4.0)
+    for attempt in range(6):
+        assert 0 <= policy.backoff(attempt) <= min(4.0, 2 ** attempt)
+    assert 3.0 <= policy.backoff(0, retry_after=3.0) <= 4.0
+    # After a 429 the shared throttle paces the retry instead.
+    assert policy.backoff(2, retry_after=3.0, throttled=True) == 0.0
+
+
+def test_circuit_breaker_opens_after_consecutive_failures_and_probes_after_reset():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one probe at a time.
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_throttle_widens_on_429_and_recovers_on_success():
+    throttle = AdaptiveThrottle(start_interval=0.05, max_interval=1.0)
+    booked_at = throttle.wait()
+    throttle.on_throttled(booked_at=booked_at)
+    assert throttle.interval == 0.05
+    # A 429 for a call booked before the widening is the same overload.
+    throttle.on_throttled(booked_at=booked_at)
+    assert throttle.interval == 0.05
+    throttle.on_throttled()
+    assert throttle.interval == 0.1
+    for _ in range(30):
+        throttle.on_success()
+    assert throttle.interval == 0.0
@@ -0,0 +1,79 @@
+import random
+
+import fitz
+
+import synthetic_reports
+import table_extractor
+from table_extractor import CELL_SEPARATOR
+
+
+def word(x0, x1, y, text):
+    return (x0, y - 4, x1, y + 4, text, 0, 0, 0)
+
+
+def statement_words():
+    """A balance sheet laid out with spaces: a title, a header and amounts right-aligned in two columns."""
+    words = [word(50, 120, 10, "BALANCE"), word(123, 160, 10, "SHEET"),
+             word(50, 100, 30, "Particulars"), word(380, 455, 30, "31.03.2025"), word(480, 555, 30, "31.03.2024"),
+             word(50, 90, 50, "LIABILITIES")]
+    for y, label, current, previous in ((70, "Capital", "1,234", "1,100"), (90, "Deposits", "45,67,890", "40,00,000"),
+                                        (110, "Borrowings", "-", "12,345"), (130, "Total", "46,81,469", "40,13,445")):
+        words += [word(50, 50 + 6 * len(label), y, label),
+                  word(455 - 5 * len(current), 455, y, current), word(555 - 5 * len(previous), 555, y, previous)]
+    return words
+
+
+def test_words_are_grouped_into_lines_and_cells():
+    lines = table_extractor.page_lines([word(123, 160, 10, "SHEET"), word(200, 230, 31, "x"),
+                                        word(50, 120, 11, "BALANCE"), word(50, 70, 30, "y")])
+    assert [[w[4] for w in line] for line in lines] == [["BALANCE", "SHEET"], ["y", "x"]]
+    cells = table_extractor.line_cells([word(50, 80, 10, "Other"), word(83, 120, 10, "Income"),
+                                        word(300, 340, 10, "1,234"), word(400, 440, 10, "(56)")])
+    assert [text for _, _, text in cells] == ["Other Income", "1,234", "(56)"]
+    assert [text for _, _, text in table_extractor.amount_cells(cells)] == ["1,234", "(56)"]
+
+
+def test_number_cells():
+    for text in ("1,23,456", "(1,234.50)", "-12", "₹ 500", "Rs. 12", "8.5%", "-", "Nil"):
+        assert table_extractor.is_number(text), text
+    for text in ("Schedule", "31st March", "2024-25", ""):
+        assert not table_extractor.is_number(text), text
+
+
+def test_runs_shorter_than_min_table_rows_are_not_tables():
+    row = [(0, 10, "Deposits"), (100, 120, "5")]
+    label = [(0, 10, "ASSETS")]
+    assert list(table_extractor.table_regions([row, label, row, row])) == [(0, 3)]
+    assert list(table_extractor.table_regions([row, row] + [label] * 4 + [row])) == []
+
+
+def test_amounts_are_aligned_into_columns_under_their_header():
+    lines = table_extractor.page_lines(statement_words())
+    [((first, last), rows)] = table_extractor.word_tables(lines)
+    assert (first, last) == (1, 6)
+    assert rows == [
+        ["Particulars", "31.03.2025", "31.03.2024"],
+        ["LIABILITIES", "", ""],
+        ["Capital", "1,234", "1,100"],
+        ["Deposits", "45,67,890", "40,00,000"],
+        ["Borrowings", "-", "12,345"],
+        ["Total", "46,81,469", "40,13,445"],
+    ]
+
+
+def test_page_table_text_keeps_titles_and_tables_but_not_prose(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    synthetic_reports.write_report(path, random.Random(1), pages=6, summary_page=2, balance_sheet_page=4, schedules=1)
+    with fitz.open(path) as doc:
+        prose = table_extractor.page_table_text(doc.load_page(0))
+        balance_sheet = table_extractor.page_table_text(doc.load_page(3)).splitlines()
+        schedule = table_extractor.page_table_text(doc.load_page(5))
+    assert prose == ""
+    assert balance_sheet[0] == synthetic_reports.BALANCE_SHEET_TITLE
+    # The base-14 font the generator writes with has no rupee glyph.
+    assert any(line.endswith("in crore)") for line in balance_sheet)
+    assert balance_sheet[2] == CELL_SEPARATOR.join(["Particulars", "Schedule", "As at 31.03.2025", "As at 31.03.2024"])
+    deposits = next(line for line in balance_sheet if line.startswith("Deposits"))
+    assert len(deposits.split(CELL_SEPARATOR)) == 4
+    assert all(len(line) <= 200 for line in balance_sheet)
+    assert CELL_SEPARATOR in schedule
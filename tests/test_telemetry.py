@@ -0,0 +1,111 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import telemetry
+
+
+@pytest.fixture(autouse=True)
+def span_log(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(telemetry, "TELEMETRY_PATH", str(path))
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", True)
+    return path
+
+
+def read_spans(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_spans_are_written_under_the_trace_root(span_log):
+    with telemetry.trace(file="report.pdf") as ingest_trace:
+        with telemetry.span("find_both", kind="stage") as stage:
+            with telemetry.span("agent_call", kind="agent_call", prompt_type="find_both") as call:
+                call.set(input_tokens=120, cache_hit=False)
+        breakdown = ingest_trace.breakdown()
+
+    records = {record["name"]: record for record in read_spans(span_log)}
+    assert set(records) == {"ingest", "find_both", "agent_call"}
+    assert {record["trace_id"] for record in records.values()} == {ingest_trace.trace_id}
+    assert records["find_both"]["parent_id"] == records["ingest"]["span_id"]
+    assert records["agent_call"]["parent_id"] == stage.span_id
+    assert records["ingest"]["attributes"] == {"file": "report.pdf"}
+    assert "find_both" in breakdown["stages_ms"]
+    assert breakdown["counts"] == {"agent_call": 1}
+    assert breakdown["input_tokens"] == 120
+    assert telemetry.current_trace() is None
+
+
+def test_failing_span_records_the_error(span_log):
+    with pytest.raises(ValueError):
+        with telemetry.span("extract_summary"):
+            raise ValueError("bad JSON")
+    assert read_spans(span_log)[0]["attributes"] == {"error": "bad JSON"}
+
+
+def test_concurrent_traces_keep_their_own_spans():
+    started = threading.Barrier(2)
+    traces = {}
+
+    def ingest(name):
+        with telemetry.trace(file=name) as ingest_trace:
+            started.wait()
+            with telemetry.span("find_both", kind="stage"):
+                telemetry.add_time("pdf_text", 0.5)
+            started.wait()
+            traces[name] = ingest_trace.breakdown()
+
+    threads = [threading.Thread(target=ingest, args=(name,)) for name in ("a.pdf", "b.pdf")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for breakdown in traces.values():
+        assert list(breakdown["stages_ms"]) == ["find_both"]
+        assert breakdown["counts"] == {"pdf_text": 1}
+
+
+def test_pool_threads_report_into_the_trace_they_were_handed():
+    with telemetry.trace(file="report.pdf") as ingest_trace:
+        stage = telemetry.current_span()
+
+        def window():
+            with telemetry.span("finder_window", kind="window", parent=stage):
+                pass
+
+        def extract():
+            with telemetry.span("extract_summary", kind="stage"):
+                pass
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            executor.submit(window).result()
+            executor.submit(telemetry.in_current_trace(extract)).result()
+            # Without the trace, a pool thread's span belongs to no trace.
+            assert executor.submit(telemetry.current_trace).result() is None
+        breakdown = ingest_trace.breakdown()
+    assert breakdown["counts"] == {"window": 1}
+    assert list(breakdown["stages_ms"]) == ["extract_summary"]
+
+
+def test_metrics_are_aggregated_from_the_span_log(span_log):
+    with telemetry.trace(file="report.pdf"):
+        with telemetry.span("llm_call", kind="llm_call", prompt_type="extract", model="m") as call:
+            call.set(input_tokens=100, output_tokens=20, retries=1, outcome="ok")
+        with telemetry.span("agent_call", kind="agent_call", prompt_type="extract", cache_hit=True):
+            pass
+
+    aggregator = telemetry.MetricsAggregator(str(span_log))
+    text = aggregator.render()
+    assert 'ingest_llm_calls_total{prompt_type="extract",model="m"} 1' in text
+    assert 'ingest_llm_tokens_total{prompt_type="extract",model="m",direction="input"} 100' in text
+    assert 'ingest_llm_retries_total{prompt_type="extract",model="m"} 1' in text
+    assert 'ingest_llm_outcomes_total{prompt_type="extract",model="m",outcome="ok"} 1' in text
+    assert 'ingest_agent_calls_total{prompt_type="extract",cache="hit"} 1' in text
+    assert 'ingest_span_duration_seconds_count{kind="document",name="ingest"} 1' in text
+
+    # Only spans added since the last read are counted again.
+    with telemetry.span("llm_call", kind="llm_call", prompt_type="extract", model="m"):
+        pass
+    assert 'ingest_llm_calls_total{prompt_type="extract",model="m"} 2' in aggregator.render()
@@ -0,0 +1,68 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import upload_store
+
+CONTENT = b"%PDF-1.7 annual report " * 1000
+
+
+def stored_files(upload_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), upload_dir)
+                  for root, _, names in os.walk(upload_dir) for name in names)
+
+
+def test_upload_is_stored_under_its_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "UPLOAD_CHUNK_SIZE", 1000)
+    content_hash, path = upload_store.save_stream(io.BytesIO(CONTENT), str(tmp_path), "pdf")
+    assert content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert path == os.path.join(str(tmp_path), content_hash[:2], f"{content_hash}.pdf")
+    assert upload_store.file_sha256(path) == content_hash
+    assert stored_files(tmp_path) == [os.path.relpath(path, tmp_path)]
+
+
+def test_same_content_is_stored_once(tmp_path):
+    first = upload_store.save_stream(io.BytesIO(CONTENT), str(tmp_path), "pdf")
+    second = upload_store.save_stream(io.BytesIO(CONTENT), str(tmp_path), "pdf")
+    other = upload_store.save_stream(io.BytesIO(CONTENT + b"corrected"), str(tmp_path), "pdf")
+    assert first == second
+    assert other[0] != first[0]
+    assert len(stored_files(tmp_path)) == 2
+
+
+def test_hashing_upload_hashes_as_it_writes(tmp_path):
+    upload = upload_store.HashingUpload(str(tmp_path))
+    for start in range(0, len(CONTENT), 4096):
+        upload.write(CONTENT[start:start + 4096])
+    upload.seek(0)
+    assert upload.size == len(CONTENT)
+    content_hash, path = upload.commit("pdf")
+    assert content_hash == hashlib.sha256(CONTENT).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_failed_upload_leaves_no_temp_file(tmp_path):
+    class BrokenStream:
+        def read(self, size):
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        upload_store.save_stream(BrokenStream(), str(tmp_path), "pdf")
+    assert stored_files(tmp_path) == []
+
+
+def test_only_stale_temp_files_are_removed(tmp_path):
+    stale = upload_store.HashingUpload(str(tmp_path))
+    stale.file.close()
+    os.utime(stale.name, (0, 0))
+    fresh = upload_store.HashingUpload(str(tmp_path))
+    _, stored = upload_store.save_stream(io.BytesIO(CONTENT), str(tmp_path), "pdf")
+    os.utime(os.path.dirname(stored), (0, 0))
+
+    assert upload_store.remove_stale_uploads(str(tmp_path)) == 1
+    assert not os.path.exists(stale.name)
+    assert os.path.exists(fresh.name) and os.path.exists(stored)
+    assert upload_store.remove_stale_uploads(str(tmp_path / "missing")) == 0
@@ -0,0 +1,142 @@
+import pytest
+
+import validation
+from validation import check_section, normalize_column
+
+BALANCED = {
+    "total_assets": 1000, "total_liabilities": 900, "total_shareholders_equity": 100,
+    "asset_breakdown": {"cash_and_cash_equivalents": 100, "loans_receivable": 600, "investments": 200,
+                        "property_plant_equipment": 50, "other_assets": 50},
+    "liability_breakdown": {"deposits": 800, "borrowings": 60, "other_liabilities": 40},
+    "equity_breakdown": {"equity_share_capital": 10, "reserves_and_surplus": 90, "other_equity": 0},
+}
+
+
+def summary(**data):
+    return {"bank_name": "Test Bank", "report_year": "2024-25", "data": data}
+
+
+@pytest.mark.parametrize("value, expected", [
+    (1234, 1234.0),
+    ("1,23,456", 123456.0),
+    ("(1,234)", -1234.0),
+    ("-5", -5.0),
+    ("₹ 12.5 crore", 12.5),
+    ("Rs. 12.5 lakh", 0.125),
+    ("250 lakhs", 2.5),
+    ("45 mn", 4.5),
+    ("2 bn", 200.0),
+    ("1.5 lakh crore", 150000.0),
+    ("3 thousand crore", 3000.0),
+])
+def test_amounts_are_converted_to_crore(value, expected):
+    numbers, unparseable = normalize_column([value])
+    assert numbers[0] == pytest.approx(expected)
+    assert not unparseable[0]
+
+
+def test_units_are_not_converted_for_non_amounts():
+    numbers, _ = normalize_column(["12 lakh", "14.5%"], amounts=[False, False])
+    assert list(numbers) == [12.0, 14.5]
+
+
+@pytest.mark.parametrize("value, unparseable", [
+    (None, False), ("N/A", False), ("-", False), ("", False),
+    ("about a lot", True), ([1, 2], True), ({"current": 1}, True), (True, False),
+])
+def test_missing_and_unreadable_values(value, unparseable):
+    numbers, flags = normalize_column([value])
+    assert numbers.isna()[0]
+    assert bool(flags[0]) is unparseable
+
+
+def test_a_balanced_balance_sheet_passes():
+    assert check_section("balance_sheet", BALANCED)[1] == []
+
+
+def test_totals_must_balance():
+    unbalanced = dict(BALANCED, total_shareholders_equity=300)
+    assert "balance_sheet.totals_do_not_balance" in check_section("balance_sheet", unbalanced)[1]
+
+
+def test_liabilities_may_already_include_equity():
+    # Indian balance sheets total "Capital and Liabilities".
+    capital_and_liabilities = dict(BALANCED, total_liabilities=1000)
+    assert "balance_sheet.totals_do_not_balance" not in check_section("balance_sheet", capital_and_liabilities)[1]
+
+
+def test_breakdowns_must_add_up_to_their_totals():
+    broken = dict(BALANCED, asset_breakdown=dict(BALANCED["asset_breakdown"], investments=500))
+    assert check_section("balance_sheet", broken)[1] == ["balance_sheet.asset_breakdown_sum"]
+
+
+def test_a_partial_breakdown_may_not_exceed_its_total():
+    partial = dict(BALANCED, liability_breakdown={"deposits": 800})
+    assert check_section("balance_sheet", partial)[1] == []
+    too_large = dict(BALANCED, liability_breakdown={"deposits": 1200})
+    assert check_section("balance_sheet", too_large)[1] == ["balance_sheet.liability_breakdown_sum"]
+
+
+def test_tolerance_allows_rounding():
+    rounded = dict(BALANCED, total_assets=1005)
+    assert "balance_sheet.totals_do_not_balance" not in check_section("balance_sheet", rounded)[1]
+
+
+def test_summary_checks():
+    normalized, issues = check_section("summary", summary(
+        balance_sheet_size_cr="25 lakh crore", deposits_cr=1900000, advances_cr=1600000,
+        profit_after_tax_cr=25000, return_on_equity_percent="14.2%", dividend_per_share_inr=19.5,
+    ))
+    assert issues == []
+    assert normalized["data"]["balance_sheet_size_cr"] == 2500000
+    assert normalized["data"]["return_on_equity_percent"] == 14.2
+
+    _, issues = check_section("summary", summary(balance_sheet_size_cr=1000, deposits_cr=2000, profit_after_tax_cr=500))
+    assert issues == ["summary.deposits_exceed_balance_sheet", "summary.profit_implausible"]
+
+
+def test_unreadable_values_are_kept_and_flagged():
+    normalized, issues = check_section("balance_sheet", dict(BALANCED, total_assets=[1, 2]))
+    assert normalized["total_assets"] == [1, 2]
+    assert "balance_sheet.unparseable_values" in issues
+
+
+def test_missing_summary_data_is_reported():
+    normalized, issues = check_section("summary", {"bank_name": "Test Bank", "data": None})
+    assert normalized["data"] is None
+    assert issues == ["summary.missing_data"]
+
+
+def test_legacy_balance_sheet_under_data():
+    legacy = {"data": dict(BALANCED)}
+    assert validation.summary_data(legacy) is None
+    assert validation.balance_sheet_data(legacy) == BALANCED
+    assert validation.upgrade_legacy_layout(legacy) == {"balance_sheet": BALANCED}
+
+
+@pytest.mark.parametrize("unit, multiplier", [
+    ("₹ in crore", 1.0), ("(₹ in thousands)", 1e-4), ("Rs. in Lakh", 0.01), ("₹ '000", 1e-4),
+    ("in millions", 0.1), ("USD", None), (None, None),
+])
+def test_statement_units(unit, multiplier):
+    assert validation.unit_to_crore(unit) == multiplier
+
+
+def test_balance_sheet_amounts_are_converted_from_its_unit():
+    in_thousands = {"unit": "₹ in thousands", "total_assets": 10_000_000, "total_liabilities": 9_000_000,
+                    "total_shareholders_equity": "100 crore"}
+    normalized, issues = check_section("balance_sheet", in_thousands)
+    assert issues == []
+    assert normalized["unit"] == "crore"
+    assert (normalized["total_assets"], normalized["total_liabilities"]) == (1000, 900)
+    assert normalized["total_shareholders_equity"] == 100
+    # Saved in crore, it validates the same when checked again.
+    assert check_section("balance_sheet", normalized) == (normalized, [])
+
+
+def test_amounts_mixing_units_without_a_statement_unit_are_flagged():
+    mixed = dict(BALANCED, total_assets="1000 crore", total_liabilities=9_000_000, total_shareholders_equity=1_000_000)
+    _, issues = check_section("balance_sheet", mixed)
+    assert issues == ["balance_sheet.mixed_units"]
+    _, issues = check_section("balance_sheet", dict(mixed, unit="crore"))
+    assert "balance_sheet.mixed_units" not in issues and "balance_sheet.totals_do_not_balance" in issues
@@ -0,0 +1,98 @@
+"""
+Content-addressed storage for uploaded reports. Uploads are written to disk
+in chunks as they arrive while being hashed, then stored once under their
+SHA-256, so re-uploading the same PDF neither overwrites another upload
+with the same name nor adds a second copy.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+TEMP_PREFIX = ".upload-"
+# Unfinished temp files older than this are left over from failed requests.
+STALE_UPLOAD_SECONDS = 3600
+
+
+def stored_path(upload_dir, content_hash, extension):
+    """uploads/ab/abcdef....pdf: sharded by the first two hex digits."""
+    return os.path.join(upload_dir, content_hash[:2], f"{content_hash}.{extension}")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashingUpload:
+    """
+    A temp file in upload_dir that hashes every byte written to it. Flask
+    writes the multipart file body straight into it (see app.py), so the
+    upload is streamed to disk and hashed in one pass, with no second copy.
+    """
+
+    def __init__(self, upload_dir):
+        os.makedirs(upload_dir, exist_ok=True)
+        self.upload_dir = upload_dir
+        self.file = tempfile.NamedTemporaryFile(dir=upload_dir, prefix=TEMP_PREFIX, delete=False)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def commit(self, extension):
+        """
+        Moves the upload to its content-addressed path and returns
+        (content_hash, path). If that content is already stored, the new
+        copy is dropped.
+        """
+        content_hash = self.digest.hexdigest()
+        path = stored_path(self.upload_dir, content_hash, extension)
+        self.file.close()
+        if os.path.exists(path):
+            os.remove(self.file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.file.name, path)
+        return content_hash, path
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+def save_stream(stream, upload_dir, extension):
+    """Copies a readable stream into the store in chunks. Returns (content_hash, path)."""
+    upload = HashingUpload(upload_dir)
+    try:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+            upload.write(chunk)
+    except Exception:
+        upload.discard()
+        raise
+    return upload.commit(extension)
+
+
+def remove_stale_uploads(upload_dir, max_age=STALE_UPLOAD_SECONDS):
+    """Deletes temp files left behind by requests that never committed."""
+    if not os.path.isdir(upload_dir):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        if name.startswith(TEMP_PREFIX) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
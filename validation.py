@@ -0,0 +1,436 @@
+"""
+Post-extraction validation. Extracted values are normalized to numbers
+(amounts to crore, from the unit written with a value or, for a balance
+sheet, the unit its statement is in) and checked
+against accounting identities and plausibility rules. Everything works on
+whole batches at once as pandas columns, so the same code checks one fresh
+extraction or every stored report.
+
+    python validation.py                 # check every stored report
+    python validation.py --bank HDFC --write
+"""
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+VALIDATION_ENABLED = os.getenv("VALIDATION_ENABLED", "1") == "1"
+# Relative difference allowed before two figures count as not matching,
+# enough for rounding in the report itself.
+VALIDATION_TOLERANCE = float(os.getenv("VALIDATION_TOLERANCE", "0.01"))
+# Re-extract a window whose values fail a check (once).
+VALIDATION_REEXTRACT = os.getenv("VALIDATION_REEXTRACT", "1") == "1"
+# Net profit above this share of the balance sheet is almost certainly a unit mix-up.
+MAX_PROFIT_TO_ASSETS = 0.1
+VALIDATION_BATCH_SIZE = 5000
+
+SUMMARY_FIELDS = (
+    "balance_sheet_size_cr", "profit_after_tax_cr", "deposits_cr", "advances_cr",
+    "return_on_equity_percent", "dividend_per_share_inr",
+)
+SUMMARY_AMOUNT_FIELDS = ("balance_sheet_size_cr", "profit_after_tax_cr", "deposits_cr", "advances_cr")
+
+BALANCE_SHEET_TOTALS = ("total_assets", "total_liabilities", "total_shareholders_equity")
+BALANCE_SHEET_BREAKDOWNS = {
+    "asset_breakdown": ("total_assets", (
+        "cash_and_cash_equivalents", "loans_receivable", "investments", "property_plant_equipment", "other_assets",
+    )),
+    "liability_breakdown": ("total_liabilities", ("deposits", "borrowings", "other_liabilities")),
+    "equity_breakdown": ("total_shareholders_equity", ("equity_share_capital", "reserves_and_surplus", "other_equity")),
+}
+BALANCE_SHEET_FIELDS = BALANCE_SHEET_TOTALS + tuple(
+    f"{breakdown}.{field}" for breakdown, (_, fields) in BALANCE_SHEET_BREAKDOWNS.items() for field in fields
+)
+
+# Multipliers to crore for the units reports and models write amounts in.
+UNIT_TO_CRORE = {
+    "crore": 1.0, "crores": 1.0, "cr": 1.0, "cr.": 1.0,
+    "lakh": 0.01, "lakhs": 0.01, "lac": 0.01, "lacs": 0.01,
+    "million": 0.1, "millions": 0.1, "mn": 0.1,
+    "billion": 100.0, "billions": 100.0, "bn": 100.0,
+    "thousand": 1e-4, "thousands": 1e-4,
+    "lakhcrore": 1e5, "lakhcrores": 1e5, "lakhcr": 1e5, "thousandcr": 1e3, "thousandcrore": 1e3, "thousandcrores": 1e3,
+    "000": 1e-4, "000s": 1e-4,
+}
+# What surrounds the unit in a statement's heading: "(₹ in '000s)", "Rs. in Crore".
+UNIT_NOISE_RE = re.compile(r"\b(?:rs|inr|in|amounts?)\b|[\s,.'’()₹]")
+NULL_MARKERS = ("", "-", "--", "na", "n/a", "nil", "null", "none", "not available")
+AMOUNT_RE = (
+    r"^(?P<open>\()?(?P<sign>[-−])?(?P<number>\d*\.?\d+)"
+    r"(?P<unit>(?:lakh|thousand)cr(?:ores?)?|crores?|cr\.?|lakhs?|lacs?|millions?|mn|billions?|bn|thousands?|%)?\)?$"
+)
+
+CHECK_DESCRIPTIONS = {
+    "summary.missing_data": "the summary values (\"data\") are missing",
+    "summary.unparseable_values": "some values are not numbers",
+    "summary.negative_amounts": "balance sheet size, deposits or advances is negative",
+    "summary.deposits_exceed_balance_sheet": "deposits are larger than the balance sheet size",
+    "summary.advances_exceed_balance_sheet": "advances are larger than the balance sheet size",
+    "summary.profit_implausible": "profit after tax is implausibly large for the balance sheet size",
+    "summary.return_on_equity_out_of_range": "return on equity is outside -100% to 100%",
+    "balance_sheet.unparseable_values": "some values are not numbers",
+    "balance_sheet.mixed_units": "some amounts are written with a unit and others without, and the statement's unit is not given",
+    "balance_sheet.negative_totals": "a total is negative",
+    "balance_sheet.totals_do_not_balance": "total assets do not equal total liabilities plus shareholders' equity",
+    "balance_sheet.asset_breakdown_sum": "the asset breakdown does not add up to total assets",
+    "balance_sheet.liability_breakdown_sum": "the liability breakdown does not add up to total liabilities",
+    "balance_sheet.equity_breakdown_sum": "the equity breakdown does not add up to shareholders' equity",
+}
+
+
+def unit_to_crore(unit):
+    """The multiplier to crore for a statement's unit ("₹ in thousands", "Rs. crore"), or None if unknown."""
+    if not isinstance(unit, str):
+        return None
+    return UNIT_TO_CRORE.get(UNIT_NOISE_RE.sub("", unit.lower()))
+
+
+def parse_column(values, amounts=True, scale=1.0):
+    """
+    Converts a column of extracted values to floats. Strings such as
+    "1,23,456", "(1,234)", "Rs. 12.5 lakh" or "45 mn" are parsed, and for
+    amounts the unit written with a value is converted to crore; `amounts`
+    is a bool or one bool per value. Amounts written without a unit are
+    multiplied by `scale` (one float per value, NaN for unknown: left as
+    they are), the multiplier of the unit they are known to be in.
+    Returns (numbers, unparseable, has_unit): NaN where a value is missing,
+    True where one was present but could not be read (including objects and
+    lists), and True where an amount was converted from its own unit.
+    """
+    series = pd.Series(values, dtype=object)
+    amounts = pd.Series(amounts, index=series.index, dtype=bool)
+    scale = pd.Series(scale, index=series.index, dtype=float).fillna(1.0).where(amounts, 1.0)
+    is_text = series.map(type).eq(str)
+    # An object or list where a figure belongs cannot be read as one.
+    is_nested = series.map(lambda value: isinstance(value, (dict, list, tuple, set)))
+    # Numbers (and numbers sent as plain strings) need no parsing.
+    numbers = pd.to_numeric(series.where(~series.map(type).eq(bool) & ~is_nested), errors="coerce").astype(float)
+
+    text = series[is_text & numbers.isna()].astype(str).str.lower()
+    numbers = numbers * scale
+    text = text.str.replace(r"[\s,₹]", "", regex=True).str.replace(r"^(?:rs\.?|inr)", "", regex=True)
+    parts = text.str.extract(AMOUNT_RE)
+    parsed = pd.to_numeric(parts["number"], errors="coerce")
+    multipliers = parts["unit"].map(UNIT_TO_CRORE)
+    own_unit = multipliers.notna() & amounts.loc[parts.index]
+    parsed = parsed * multipliers.where(own_unit, scale.loc[parts.index])
+    negative = parts["open"].notna() | parts["sign"].notna()
+    parsed = parsed.where(~negative, -parsed)
+    numbers.loc[parsed.index] = parsed
+
+    unparseable = is_nested.copy()
+    unparseable.loc[text.index] = parsed.isna() & ~text.isin(NULL_MARKERS)
+    has_unit = pd.Series(False, index=series.index)
+    has_unit.loc[parts.index] = own_unit & parsed.notna()
+    return numbers, unparseable, has_unit
+
+
+def normalize_column(values, amounts=True, scale=1.0):
+    """(numbers, unparseable) for a column of extracted values, as parse_column."""
+    numbers, unparseable, _ = parse_column(values, amounts, scale)
+    return numbers, unparseable
+
+
+def normalize_frame(records, fields, amount_fields, scales=None):
+    """
+    Builds (values, unparseable, has_unit) frames, one row per record and
+    one column per field; `scales` is the unit multiplier of each record
+    (see parse_column). All fields are normalized together as one long column.
+    """
+    raw = pd.DataFrame.from_records(records, columns=list(fields))
+    amounts = np.tile([field in amount_fields for field in fields], len(raw))
+    scale = 1.0 if scales is None else np.repeat(np.asarray(scales, dtype=float), len(fields))
+    columns = parse_column(raw.to_numpy(dtype=object).ravel(), amounts, scale)
+    shape = (len(raw), len(fields))
+    return tuple(pd.DataFrame(column.to_numpy().reshape(shape), index=raw.index, columns=list(fields))
+                 for column in columns)
+
+
+def flatten_balance_sheet(balance_sheet):
+    """The balance sheet fields of one extraction as a flat dict ("asset_breakdown.investments": ...)."""
+    if not isinstance(balance_sheet, dict):
+        return {}
+    flat = {total: balance_sheet.get(total) for total in BALANCE_SHEET_TOTALS}
+    for breakdown, (_, fields) in BALANCE_SHEET_BREAKDOWNS.items():
+        parts = balance_sheet.get(breakdown)
+        if isinstance(parts, dict):
+            for field in fields:
+                flat[f"{breakdown}.{field}"] = parts.get(field)
+    return flat
+
+
+def is_legacy_balance_sheet(data):
+    """
+    Reports saved before the balance sheet got its own field have it under
+    "data", where it overwrote the summary.
+    """
+    return (isinstance(data, dict) and any(field in data for field in BALANCE_SHEET_TOTALS)
+            and not any(field in data for field in SUMMARY_FIELDS))
+
+
+def summary_data(document):
+    """The summary values of a document, or None if it has none."""
+    data = document.get("data") if isinstance(document, dict) else None
+    return data if isinstance(data, dict) and not is_legacy_balance_sheet(data) else None
+
+
+def balance_sheet_data(document):
+    """The stored balance sheet, from "balance_sheet" or the legacy "data"."""
+    if not isinstance(document, dict):
+        return None
+    balance_sheet = document.get("balance_sheet")
+    if balance_sheet is None and is_legacy_balance_sheet(document.get("data")):
+        return document["data"]
+    return balance_sheet
+
+
+def upgrade_legacy_layout(document):
+    """A report in the legacy layout, with its balance sheet moved out of "data"."""
+    if document.get("balance_sheet") is not None or not is_legacy_balance_sheet(document.get("data")):
+        return document
+    upgraded = {key: value for key, value in document.items() if key != "data"}
+    upgraded["balance_sheet"] = document["data"]
+    return upgraded
+
+
+def close_to(a, b, tolerance):
+    return (a - b).abs() <= tolerance * np.maximum(np.maximum(a.abs(), b.abs()), 1.0)
+
+
+def check_summary(values, unparseable, tolerance=VALIDATION_TOLERANCE):
+    """Returns one boolean column per summary check; True means the check failed."""
+    size = values["balance_sheet_size_cr"]
+    checks = {
+        "summary.unparseable_values": unparseable.any(axis=1),
+        "summary.negative_amounts": (values[["balance_sheet_size_cr", "deposits_cr", "advances_cr"]] < 0).any(axis=1),
+        "summary.deposits_exceed_balance_sheet": values["deposits_cr"] > size * (1 + tolerance),
+        "summary.advances_exceed_balance_sheet": values["advances_cr"] > size * (1 + tolerance),
+        "summary.profit_implausible": values["profit_after_tax_cr"].abs() > size * MAX_PROFIT_TO_ASSETS,
+        "summary.return_on_equity_out_of_range": values["return_on_equity_percent"].abs() > 100,
+    }
+    return pd.DataFrame(checks, index=values.index)
+
+
+def breakdown_mismatch(parts, total, tolerance):
+    """
+    A complete breakdown must add up to its total; a partial one (some
+    items not found) must at least not exceed it.
+    """
+    present = parts.notna().sum(axis=1)
+    parts_sum = parts.sum(axis=1, min_count=1)
+    complete = present == parts.shape[1]
+    mismatch = np.where(complete, ~close_to(parts_sum, total, tolerance), parts_sum > total * (1 + tolerance))
+    return total.notna() & (present > 0) & mismatch
+
+
+def check_balance_sheet(values, unparseable, tolerance=VALIDATION_TOLERANCE):
+    """Returns one boolean column per balance sheet check; True means the check failed."""
+    assets = values["total_assets"]
+    liabilities = values["total_liabilities"]
+    equity = values["total_shareholders_equity"]
+
+    balances = close_to(assets, liabilities + equity, tolerance)
+    # Indian bank balance sheets total "Capital and Liabilities", so the
+    # extracted total_liabilities often already includes equity.
+    includes_equity = equity.notna() & close_to(assets, liabilities, tolerance) & ~balances
+    liabilities_only = liabilities.where(~includes_equity, liabilities - equity)
+    totals = {"total_assets": assets, "total_liabilities": liabilities_only, "total_shareholders_equity": equity}
+
+    checks = {
+        "balance_sheet.unparseable_values": unparseable.any(axis=1),
+        "balance_sheet.negative_totals": (values[list(BALANCE_SHEET_TOTALS)] < 0).any(axis=1),
+        "balance_sheet.totals_do_not_balance": (
+            assets.notna() & liabilities.notna() & equity.notna() & ~balances & ~includes_equity
+        ),
+    }
+    for breakdown, (total, fields) in BALANCE_SHEET_BREAKDOWNS.items():
+        parts = values[[f"{breakdown}.{field}" for field in fields]]
+        checks[f"balance_sheet.{breakdown}_sum"] = breakdown_mismatch(parts, totals[total], tolerance)
+    return pd.DataFrame(checks, index=values.index)
+
+
+def validate_reports(reports, tolerance=VALIDATION_TOLERANCE):
+    """
+    Normalizes and checks a batch of reports in the stored shape (summary
+    values under "data", the balance sheet under "balance_sheet"). Returns
+    (summary_values, balance_sheet_values, failures), with one row per report.
+    """
+    summary_values, summary_failures = validate_summaries([summary_data(report) for report in reports], tolerance)
+    balance_sheet_values, balance_sheet_failures = validate_balance_sheets(
+        [balance_sheet_data(report) for report in reports], tolerance
+    )
+    return summary_values, balance_sheet_values, pd.concat([summary_failures, balance_sheet_failures], axis=1)
+
+
+def validate_summaries(summaries, tolerance=VALIDATION_TOLERANCE):
+    """
+    (values, failures) for a batch of summary "data" dicts (None where there
+    is none). Amounts without a unit are in crore, as their field names say.
+    """
+    present = [isinstance(summary, dict) for summary in summaries]
+    values, unparseable, _ = normalize_frame(
+        [summary if is_present else {} for summary, is_present in zip(summaries, present)],
+        SUMMARY_FIELDS, SUMMARY_AMOUNT_FIELDS
+    )
+    failures = check_summary(values, unparseable, tolerance)
+    failures.insert(0, "summary.missing_data", ~np.array(present, dtype=bool))
+    return values, failures
+
+
+def balance_sheet_scale(balance_sheet):
+    """The multiplier to crore of the unit a balance sheet states its amounts in, or None."""
+    return unit_to_crore(balance_sheet.get("unit")) if isinstance(balance_sheet, dict) else None
+
+
+def validate_balance_sheets(balance_sheets, tolerance=VALIDATION_TOLERANCE):
+    """
+    (values, failures) for a batch of balance sheet extractions. Amounts
+    without a unit are in the balance sheet's "unit"; if it has none, they
+    are left as they are, and mixing them with amounts that have a unit
+    fails "balance_sheet.mixed_units" instead of the sum checks.
+    """
+    scales = [balance_sheet_scale(balance_sheet) for balance_sheet in balance_sheets]
+    values, unparseable, has_unit = normalize_frame(
+        [flatten_balance_sheet(balance_sheet) for balance_sheet in balance_sheets],
+        BALANCE_SHEET_FIELDS, BALANCE_SHEET_FIELDS, [np.nan if scale is None else scale for scale in scales]
+    )
+    unknown_unit = np.array([scale is None for scale in scales], dtype=bool)
+    mixed = unknown_unit & has_unit.any(axis=1) & (values.notna() & ~has_unit).any(axis=1)
+    failures = check_balance_sheet(values, unparseable, tolerance)
+    sums = [column for column in failures.columns if column.endswith(("_sum", "do_not_balance"))]
+    failures.loc[mixed, sums] = False
+    failures.insert(1, "balance_sheet.mixed_units", mixed)
+    return values, failures
+
+
+def failed_checks(failures):
+    """The names of the failed checks, one list per row of `failures`."""
+    names = np.array(failures.columns)
+    return [list(names[row]) for row in failures.to_numpy(dtype=bool)]
+
+
+def stored_value(original, value):
+    """
+    A normalized number as it is saved: an int when whole, None when
+    missing. Text, objects and lists that could not be read are kept as
+    they were for review.
+    """
+    if isinstance(original, (dict, list, tuple, set)):
+        return original
+    if pd.isna(value):
+        if isinstance(original, str) and original.strip().lower() not in NULL_MARKERS:
+            return original
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def check_section(section, extracted, tolerance=VALIDATION_TOLERANCE):
+    """
+    Normalizes one fresh extraction, "summary" (the whole summary document)
+    or "balance_sheet". Returns (normalized copy, names of failed checks).
+    """
+    if section == "summary":
+        summary_values, failures = validate_summaries([summary_data(extracted)], tolerance)
+        normalized = dict(extracted)
+        if summary_data(extracted) is not None:
+            normalized["data"] = dict(summary_data(extracted))
+            for field in SUMMARY_FIELDS:
+                if field in normalized["data"]:
+                    normalized["data"][field] = stored_value(normalized["data"][field], summary_values.at[0, field])
+    else:
+        balance_sheet_values, failures = validate_balance_sheets([extracted], tolerance)
+        normalized = dict(extracted)
+        if balance_sheet_scale(extracted) is not None:
+            # The amounts below are now in crore.
+            normalized["unit"] = "crore"
+        for field in BALANCE_SHEET_TOTALS:
+            if field in normalized:
+                normalized[field] = stored_value(normalized[field], balance_sheet_values.at[0, field])
+        for breakdown, (_, fields) in BALANCE_SHEET_BREAKDOWNS.items():
+            if isinstance(normalized.get(breakdown), dict):
+                normalized[breakdown] = dict(normalized[breakdown])
+                for field in fields:
+                    if field in normalized[breakdown]:
+                        normalized[breakdown][field] = stored_value(
+                            normalized[breakdown][field], balance_sheet_values.at[0, f"{breakdown}.{field}"]
+                        )
+    return normalized, failed_checks(failures)[0]
+
+
+def reextract_hint(issues):
+    """A note put before the window text when re-extracting, naming what was wrong."""
+    problems = "; ".join(CHECK_DESCRIPTIONS.get(issue, issue) for issue in issues)
+    return (f"Note: an earlier extraction from these pages failed validation ({problems}). "
+            "Re-read the figures and their units carefully.\n\n")
+
+
+def validate_stored_reports(reports_collection, mongo_filter=None, write=False, batch_size=VALIDATION_BATCH_SIZE):
+    """
+    Runs the checks over stored reports in batches. Returns (checked, counts):
+    the number of reports checked and a Series of failure counts per check.
+    With write=True each report's `validation` field is updated.
+    """
+    from pymongo import UpdateOne
+
+    projection = {"data": 1, "balance_sheet": 1}
+    cursor = reports_collection.find(mongo_filter or {}, projection).batch_size(batch_size)
+    counts = None
+    checked = 0
+    batch = []
+
+    def flush():
+        nonlocal counts, checked
+        _, _, failures = validate_reports(batch)
+        counts = failures.sum() if counts is None else counts + failures.sum()
+        checked += len(batch)
+        if write:
+            updates = []
+            for report, issues in zip(batch, failed_checks(failures)):
+                updates.append(UpdateOne({"_id": report["_id"]}, {"$set": {
+                    "validation.summary": [issue for issue in issues if issue.startswith("summary.")],
+                    "validation.balance_sheet": [issue for issue in issues if issue.startswith("balance_sheet.")],
+                }}))
+            reports_collection.bulk_write(updates, ordered=False)
+        batch.clear()
+
+    for report in cursor:
+        batch.append(report)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return checked, counts if counts is not None else pd.Series(dtype=int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate stored reports")
+    parser.add_argument("--bank", help="Only reports of this bank")
+    parser.add_argument("--year", help="Only reports for this year (e.g. 2024-25)")
+    parser.add_argument("--write", action="store_true", help="Store the failed checks on each report")
+    parser.add_argument("--batch-size", type=int, default=VALIDATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    import db
+    from bank_names import normalize_bank_name
+
+    mongo_filter = {}
+    if args.bank:
+        mongo_filter["bank_key"] = normalize_bank_name(args.bank)[0]
+    if args.year:
+        mongo_filter["report_year"] = args.year
+
+    started = time.perf_counter()
+    checked, counts = validate_stored_reports(db.get_reports_collection(), mongo_filter, args.write, args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"[Validation] Checked {checked} report(s) in {elapsed:.2f}s.")
+    for check, count in counts.items():
+        if count:
+            print(f"  {check:<45} {int(count):>7}  {CHECK_DESCRIPTIONS[check]}")
+
+
+if __name__ == "__main__":
+    main()